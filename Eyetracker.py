@@ -1,12 +1,21 @@
-import cv2
-import dlib
-import numpy as np
-import time
+from startup import StartupTimer
+
 import tkinter as tk
 from tkinter import messagebox, ttk
-from PIL import Image, ImageTk
-import threading
+import importlib
 import os
+import threading
+import time
+
+# OpenCV, dlib, NumPy and PIL are imported by the model loader thread (see
+# load_models) so the window comes up before they are ready
+from capture import CAPTURE_BACKENDS, CaptureSettings, CaptureThread, LatestFrameQueue, open_capture
+from dispatch import SINKS_CONFIG, EventDispatcher, SelectionEvent, load_sinks
+from dwell import NEXT_PAGE, PREVIOUS_PAGE, board_pages
+from power import POWER_MODES, PowerScheduler
+from widgets import WidgetUpdater
+from metrics import (DEFAULT_METRICS_PORT, MetricsDumper, MetricsServer, PipelineMetrics,
+                     describe_pipeline_metrics)
 
 class EyeTrackingUI:
     def __init__(self, root):
@@ -86,7 +95,19 @@ class EyeTrackingUI:
         
         self.fps_info = ttk.Label(self.debug_frame, text="FPS: 0")
         self.fps_info.pack(anchor='w', pady=2)
+
+        self.drops_info = ttk.Label(self.debug_frame, text="Dropped: 0 capture / 0 render / 0 undecoded")
+        self.drops_info.pack(anchor='w', pady=2)
+        
+        self.debug_cost_info = ttk.Label(self.debug_frame, text="Debug Cost: 0.00 ms")
+        self.debug_cost_info.pack(anchor='w', pady=2)
+        
+        self.latency_info = ttk.Label(self.debug_frame, text="Latency: 0 ms")
+        self.latency_info.pack(anchor='w', pady=2)
         
+        self.power_info = ttk.Label(self.debug_frame, text="Power: active")
+        self.power_info.pack(anchor='w', pady=2)
+
         # Settings with improved layout
         self.settings_frame = ttk.LabelFrame(self.control_frame, text="Settings")
         self.settings_frame.pack(fill=tk.X, pady=10, padx=5)
@@ -132,6 +153,128 @@ class EyeTrackingUI:
         self.region_size_slider.bind("<Motion>", self.update_region_size_value)
         self.region_size_slider.bind("<ButtonRelease-1>", self.update_regions)
         
+        # Face tracking setting - how often the full face detector runs
+        ttk.Label(self.settings_frame, text="Face Tracking:").grid(row=4, column=0, sticky='w', pady=5, padx=5)
+        self.face_tracking_var = tk.StringVar(value="landmarks")
+        self.face_tracking_combo = ttk.Combobox(self.settings_frame, textvariable=self.face_tracking_var,
+                                                state="readonly", width=12)
+        self.face_tracking_combo.grid(row=4, column=1, columnspan=2, sticky='ew', pady=5, padx=5)
+        
+        ttk.Label(self.settings_frame, text="Re-detect Every:").grid(row=5, column=0, sticky='w', pady=5, padx=5)
+        self.redetect_interval_var = tk.IntVar(value=10)
+        self.redetect_interval_slider = ttk.Scale(self.settings_frame, from_=1, to=30, 
+                                                 orient=tk.HORIZONTAL, variable=self.redetect_interval_var)
+        self.redetect_interval_slider.grid(row=5, column=1, sticky='ew', pady=5, padx=5)
+        self.redetect_interval_value = ttk.Label(self.settings_frame, text="10")
+        self.redetect_interval_value.grid(row=5, column=2, sticky='w', pady=5, padx=5)
+        self.redetect_interval_slider.bind("<Motion>", self.update_redetect_interval_value)
+        
+        # Preview settings - video is the most expensive thing the UI draws
+        ttk.Label(self.settings_frame, text="Preview FPS:").grid(row=6, column=0, sticky='w', pady=5, padx=5)
+        self.preview_rate_var = tk.IntVar(value=15)
+        self.preview_rate_slider = ttk.Scale(self.settings_frame, from_=1, to=30, 
+                                            orient=tk.HORIZONTAL, variable=self.preview_rate_var)
+        self.preview_rate_slider.grid(row=6, column=1, sticky='ew', pady=5, padx=5)
+        self.preview_rate_value = ttk.Label(self.settings_frame, text="15")
+        self.preview_rate_value.grid(row=6, column=2, sticky='w', pady=5, padx=5)
+        self.preview_rate_slider.bind("<Motion>", self.update_preview_rate_value)
+        
+        self.kiosk_mode_var = tk.BooleanVar(value=False)
+        self.kiosk_mode_check = ttk.Checkbutton(self.settings_frame, text="Kiosk Mode (no video preview)",
+                                                variable=self.kiosk_mode_var)
+        self.kiosk_mode_check.grid(row=7, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+        
+        # Debug drawing level - "off" for deployed units
+        ttk.Label(self.settings_frame, text="Debug Level:").grid(row=8, column=0, sticky='w', pady=5, padx=5)
+        self.debug_level_var = tk.StringVar(value="full")
+        self.debug_level_combo = ttk.Combobox(self.settings_frame, textvariable=self.debug_level_var,
+                                              state="readonly", width=12)
+        self.debug_level_combo.grid(row=8, column=1, columnspan=2, sticky='ew', pady=5, padx=5)
+        
+        # Gaze smoothing filter
+        ttk.Label(self.settings_frame, text="Smoothing:").grid(row=9, column=0, sticky='w', pady=5, padx=5)
+        self.smoothing_var = tk.StringVar(value="moving_average")
+        self.smoothing_combo = ttk.Combobox(self.settings_frame, textvariable=self.smoothing_var,
+                                            state="readonly", width=12)
+        self.smoothing_combo.grid(row=9, column=1, columnspan=2, sticky='ew', pady=5, padx=5)
+        self.smoothing_var.trace_add("write", self.update_smoothing)
+        
+        # Patient whose calibration profile is loaded and saved
+        ttk.Label(self.settings_frame, text="Patient:").grid(row=10, column=0, sticky='w', pady=5, padx=5)
+        self.patient_var = tk.StringVar(value="default")
+        self.patient_entry = ttk.Entry(self.settings_frame, textvariable=self.patient_var, width=12)
+        self.patient_entry.grid(row=10, column=1, sticky='ew', pady=5, padx=5)
+        self.load_profile_button = ttk.Button(self.settings_frame, text="Load", width=5,
+                                              command=self.load_patient_profile)
+        self.load_profile_button.grid(row=10, column=2, sticky='w', pady=5, padx=5)
+        
+        # Session recording of landmarks and gaze for offline replay (recording.py)
+        self.record_session_var = tk.BooleanVar(value=False)
+        self.record_session_check = ttk.Checkbutton(self.settings_frame, text="Record Session",
+                                                    variable=self.record_session_var)
+        self.record_session_check.grid(row=11, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+        
+        # Low frame rate while nobody is in front of the camera (power.py)
+        self.power_saving_var = tk.BooleanVar(value=True)
+        self.power_saving_check = ttk.Checkbutton(self.settings_frame, text="Power Saving When Idle",
+                                                  variable=self.power_saving_var)
+        self.power_saving_check.grid(row=12, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+        
+        # Pupil locator - "gradient" gives sub-pixel centres and needs less smoothing
+        ttk.Label(self.settings_frame, text="Pupil Locator:").grid(row=13, column=0, sticky='w', pady=5, padx=5)
+        self.pupil_method_var = tk.StringVar(value="threshold")
+        self.pupil_method_combo = ttk.Combobox(self.settings_frame, textvariable=self.pupil_method_var,
+                                               state="readonly", width=12)
+        self.pupil_method_combo.grid(row=13, column=1, columnspan=2, sticky='ew', pady=5, padx=5)
+        
+        # Reuse landmarks and gaze while the eyes don't change (long fixations)
+        self.motion_gating_var = tk.BooleanVar(value=True)
+        self.motion_gating_check = ttk.Checkbutton(self.settings_frame, text="Skip Unchanged Frames",
+                                                   variable=self.motion_gating_var)
+        self.motion_gating_check.grid(row=14, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+        
+        # Follow the eye landmarks with optical flow between shape predictor runs (steadier blinks)
+        self.landmark_flow_var = tk.BooleanVar(value=False)
+        self.landmark_flow_check = ttk.Checkbutton(self.settings_frame, text="Optical-Flow Eye Landmarks",
+                                                   variable=self.landmark_flow_var)
+        self.landmark_flow_check.grid(row=15, column=0, columnspan=3, sticky='w', pady=5, padx=5)
+        
+        # Camera settings, applied when tracking starts and remembered in camera.json
+        camera = CaptureSettings.load()
+        self.camera_frame = ttk.LabelFrame(self.control_frame, text="Camera")
+        self.camera_frame.pack(fill=tk.X, pady=10, padx=5)
+        
+        ttk.Label(self.camera_frame, text="Device:").grid(row=0, column=0, sticky='w', pady=2, padx=5)
+        self.camera_device_var = tk.StringVar(value=str(camera.device))
+        ttk.Entry(self.camera_frame, textvariable=self.camera_device_var, width=6).grid(
+            row=0, column=1, sticky='ew', pady=2, padx=5)
+        self.camera_backend_var = tk.StringVar(value=camera.backend)
+        ttk.Combobox(self.camera_frame, textvariable=self.camera_backend_var, values=CAPTURE_BACKENDS,
+                     state="readonly", width=10).grid(row=0, column=2, sticky='ew', pady=2, padx=5)
+        
+        ttk.Label(self.camera_frame, text="Size / FPS:").grid(row=1, column=0, sticky='w', pady=2, padx=5)
+        resolution = f"{camera.width}x{camera.height}" if camera.width and camera.height else "default"
+        self.camera_resolution_var = tk.StringVar(value=resolution)
+        ttk.Combobox(self.camera_frame, textvariable=self.camera_resolution_var, width=10,
+                     values=("default", "640x480", "1280x720", "1920x1080")).grid(
+            row=1, column=1, sticky='ew', pady=2, padx=5)
+        self.camera_fps_var = tk.StringVar(value=str(int(camera.fps)) if camera.fps else "default")
+        ttk.Combobox(self.camera_frame, textvariable=self.camera_fps_var, width=10,
+                     values=("default", "15", "30", "60")).grid(row=1, column=2, sticky='ew', pady=2, padx=5)
+        
+        self.camera_mjpeg_var = tk.BooleanVar(value=camera.mjpeg)
+        ttk.Checkbutton(self.camera_frame, text="MJPEG", variable=self.camera_mjpeg_var).grid(
+            row=2, column=0, sticky='w', pady=2, padx=5)
+        ttk.Label(self.camera_frame, text="Buffer:").grid(row=2, column=1, sticky='e', pady=2, padx=5)
+        self.camera_buffer_var = tk.IntVar(value=camera.buffer_size)
+        ttk.Spinbox(self.camera_frame, from_=1, to=10, textvariable=self.camera_buffer_var, width=4).grid(
+            row=2, column=2, sticky='w', pady=2, padx=5)
+        
+        self.camera_newest_only_var = tk.BooleanVar(value=camera.newest_only)
+        ttk.Checkbutton(self.camera_frame, text="Decode newest frame only",
+                        variable=self.camera_newest_only_var).grid(
+            row=3, column=0, columnspan=3, sticky='w', pady=2, padx=5)
+        
         # Available options for eye selection
         self.options_frame = ttk.LabelFrame(self.control_frame, text="Available Options")
         self.options_frame.pack(fill=tk.X, pady=10, padx=5)
@@ -174,40 +317,71 @@ class EyeTrackingUI:
         self.cap = None
         self.running = False
         self.thread = None
-        self.calibration_mode = False
-        
-        # Initialize the regions (will be updated based on screen size)
+        self.capture_thread = None
+        self.frame_queue = None
+        self.publisher = None
+        self.recorder = None
+        self.remote_inference = os.environ.get("EYETRACKER_INFERENCE_PROCESS") == "1"
+        self.render_interval_ms = 10  # how often the Tk main loop polls for results
+        self.status_interval = 0.05   # status widgets are refreshed at most 20 times a second
+        self.last_status_time = 0
+        self.latest_result = None
+        self.power = PowerScheduler()
+        self.power_saving_var.trace_add("write", self.update_power_saving)
+        
+        # Unchanged values are never re-sent to Tk
+        self.set_widget = WidgetUpdater()
+        self.highlighted_region = None
+        
+        # Startup milestones, reported once the first gaze estimate arrives
+        self.startup = StartupTimer()
+        
+        # Runtime telemetry for remote monitoring
+        self.metrics = None
+        self.metrics_server = None
+        self.metrics_dumper = None
+        self.start_metrics()
+        
+        # Selections are delivered to the configured sinks (log, webhook, nurse
+        # call...) on their own threads, so a slow sink never holds up tracking
+        self.dispatcher = EventDispatcher(load_sinks(os.environ.get("EYETRACKER_SINKS_FILE", SINKS_CONFIG)))
+        for key in ("delivered", "failed", "dropped"):
+            self.metrics.add_source("selection_events_total", lambda key=key: self.dispatcher.stats()[key], outcome=key)
+        self.metrics.describe("selection_events_total", "Selection events handed to sinks, by outcome")
+        
+        # Video preview (created once the libraries are loaded), plus the
+        # markers used in its place in kiosk mode
+        self.preview = None
+        self.gaze_cursor = tk.Frame(self.video_label, width=20, height=20, background="red")
+        self.calibration_marker = tk.Frame(self.video_label, width=40, height=40, background="#00CC00")
+        for var in (self.preview_rate_var, self.kiosk_mode_var):
+            var.trace_add("write", self.sync_preview_settings)
+        self.sync_preview_settings()
+        
+        # Tk-free tracking engine; the UI is just one consumer of its results.
+        # It is built by the model loader thread.
+        self.pipeline = None
+        self.loader_progress = (0, "")
+        self.loader_result = None
+        self.loader_error = None
+        for var in (self.lock_time_var, self.ear_threshold_var, self.gaze_sensitivity_var,
+                    self.face_tracking_var, self.redetect_interval_var, self.debug_level_var,
+                    self.pupil_method_var, self.motion_gating_var, self.landmark_flow_var):
+            var.trace_add("write", self.sync_pipeline_settings)
+        self.sync_pipeline_settings()
+        
+        # Initialize the regions (will be updated based on screen size); with many
+        # custom regions the board becomes a grid, in pages if it doesn't fit one screen
+        self.custom_regions = []
+        self.region_pages = []
+        self.region_page = 0
         self.update_regions()
         
         # Add overlay regions directly on the video frame
         self.region_labels = {}
         self.create_region_overlays()
         
-        # Eye tracking variables
-        self.face_detector = None
-        self.landmark_predictor = None
-        self.lock_start_time = None
-        self.locked_region = None
-        self.last_eye_open_time = None
-        self.eye_closed_duration = 0
-        self.current_ear = 0
-        
-        # New variables for improved gaze tracking
-        self.gaze_history = []
-        self.gaze_history_max = 10  # frames to average
-        self.last_frame_time = time.time()
-        self.fps = 0
-        
-        # Calibration variables
-        self.calibration_points = [(0.1, 0.1), (0.9, 0.1), (0.5, 0.5), (0.1, 0.9), (0.9, 0.9)]
-        self.calibration_current = 0
-        self.calibration_data = {}
-        self.calibration_offset_x = 0
-        self.calibration_offset_y = 0
-        self.calibration_scale_x = 1.0
-        self.calibration_scale_y = 1.0
-        
-        # Initialize the detector and predictor
+        # Initialize the detector and predictor in the background
         self.initialize_detector()
         
         # Key bindings
@@ -219,6 +393,8 @@ class EyeTrackingUI:
     
     def toggle_tracking(self):
         """Toggle tracking on/off with spacebar"""
+        if self.pipeline is None:
+            return  # models still loading
         if self.running:
             self.stop_tracking()
         else:
@@ -226,111 +402,220 @@ class EyeTrackingUI:
     
     def update_regions(self, event=None):
         """Update regions based on screen size and region size setting"""
-        region_size = self.region_size_var.get()
-        margin = 50  # margin from the edge of the screen
-        
-        # Calculate center region position and size
-        center_x = self.screen_width // 2
-        center_y = self.screen_height // 2
-        
-        # Define regions - positioned at corners and center of the screen
-        self.regions = {
-            "Food": (self.screen_width - margin - region_size, margin, 
-                    self.screen_width - margin, margin + region_size),  # Top right
-                    
-            "Water": (margin, margin, 
-                     margin + region_size, margin + region_size),  # Top left
-                     
-            "Medicine": (self.screen_width - margin - region_size, self.screen_height - margin - region_size, 
-                        self.screen_width - margin, self.screen_height - margin),  # Bottom right
-                        
-            "Help": (margin, self.screen_height - margin - region_size, 
-                    margin + region_size, self.screen_height - margin),  # Bottom left
-                    
-            "Rest": (center_x - region_size//2, center_y - region_size//2, 
-                    center_x + region_size//2, center_y + region_size//2),  # Center
-        }
+        # Regions positioned at the corners and center of the screen
+        # (custom ones at the edges, then in a paged grid once they don't fit)
+        self.region_pages = board_pages(self.custom_regions, self.screen_width, self.screen_height,
+                                        self.region_size_var.get())
+        self.region_page %= len(self.region_pages)
+        self.regions = self.region_pages[self.region_page]
+        
+        if self.pipeline is not None:
+            self.pipeline.regions = dict(self.regions)
         
         # Update regions listbox
         self.regions_listbox.delete(0, tk.END)
-        for region in self.regions.keys():
-            self.regions_listbox.insert(tk.END, region)
+        for page in self.region_pages:
+            for region in page:
+                if region not in (PREVIOUS_PAGE, NEXT_PAGE):
+                    self.regions_listbox.insert(tk.END, region)
             
         # Update region overlays
         self.update_region_overlays()
     
+    def turn_page(self, step):
+        """Show the next (step 1) or previous (step -1) page of a paged board"""
+        self.region_page = (self.region_page + step) % len(self.region_pages)
+        self.regions = self.region_pages[self.region_page]
+        if self.pipeline is not None:
+            self.pipeline.regions = dict(self.regions)
+        self.update_region_overlays()
+        self.update_status(f"Page {self.region_page + 1} of {len(self.region_pages)}")
+    
     def create_region_overlays(self):
         """Create overlay labels for regions"""
         for region_name in self.regions.keys():
-            label = ttk.Label(self.video_label, text=region_name, 
-                            style='RegionLabel.TLabel', background="#333333")
-            self.region_labels[region_name] = label
+            self.create_region_label(region_name)
+    
+    def create_region_label(self, region_name):
+        label = ttk.Label(self.video_label, text=region_name, 
+                        style='RegionLabel.TLabel', background="#333333")
+        self.region_labels[region_name] = label
     
     def update_region_overlays(self):
-        """Update position of region overlay labels"""
+        """Update position of region overlay labels, hiding those not on the current page"""
         if hasattr(self, 'region_labels'):
+            self.highlight_region(None)
+            for region_name, label in self.region_labels.items():
+                if region_name not in self.regions:
+                    label.place_forget()
             for region_name, (x1, y1, x2, y2) in self.regions.items():
-                if region_name in self.region_labels:
-                    self.region_labels[region_name].place(
-                        x=x1, y=y1, 
-                        width=x2-x1, height=y2-y1
-                    )
+                if region_name not in self.region_labels:
+                    self.create_region_label(region_name)
+                self.region_labels[region_name].place(
+                    x=x1, y=y1, 
+                    width=x2-x1, height=y2-y1
+                )
     
     def add_custom_region(self):
         """Add a custom region from user input"""
         new_region = self.new_region_var.get().strip()
-        if new_region and new_region not in self.regions:
-            # Calculate a position for the new region
-            # Place it in the middle left area
-            mid_height = self.screen_height // 2
-            region_size = self.region_size_var.get()
-            margin = 50  # Define margin here
-            
-            self.regions[new_region] = (
-                margin, 
-                mid_height - region_size//2, 
-                margin + region_size, 
-                mid_height + region_size//2
-            )
-            
-            # Add to listbox
-            self.regions_listbox.insert(tk.END, new_region)
-            
-            # Create overlay label
-            label = ttk.Label(self.video_label, text=new_region, 
-                            style='RegionLabel.TLabel', background="#333333")
-            self.region_labels[new_region] = label
-            self.update_region_overlays()
+        taken = set(self.regions_listbox.get(0, tk.END)) | {PREVIOUS_PAGE, NEXT_PAGE}
+        if new_region and new_region not in taken:
+            # The layout engine places it in the grid; show the page it landed on
+            self.custom_regions.append(new_region)
+            self.region_page = 0
+            self.update_regions()
+            page = next(i for i, regions in enumerate(self.region_pages) if new_region in regions)
+            if page != self.region_page:
+                self.turn_page(page - self.region_page)
             
             # Clear entry
             self.new_region_var.set("")
     
     def initialize_detector(self):
-        """Initialize the face detector and predictor"""
+        """Initialize the face detector and predictor on a background thread"""
+        self.startup.mark("window")
+        self.start_button.config(state=tk.DISABLED)
+        self.calibrate_button.config(state=tk.DISABLED)
+        self.loader_progress = (10, "Loading eye tracking libraries...")
+        
+        loader = threading.Thread(target=self.load_models)
+        loader.daemon = True
+        loader.start()
+        self.root.after(50, self.poll_model_loader)
+    
+    def load_models(self):
+        """Model loader - runs in a separate thread, must not touch Tk"""
         try:
-            self.face_detector = dlib.get_frontal_face_detector()
+            from gaze_pipeline import PREDICTOR_PATH, GazePipeline
+            importlib.import_module("preview")  # warm up OpenCV/PIL imports off the main thread
+            self.startup.mark("imports")
             
-            # Check if the shape predictor file exists, if not, show an error
-            predictor_path = "shape_predictor_68_face_landmarks.dat"
-            if not os.path.exists(predictor_path):
-                messagebox.showerror("File Not Found", 
-                                    f"Could not find the shape predictor file at: {predictor_path}\n\n"
-                                    "Please download it from:\n"
-                                    "http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2")
-                self.root.quit()
-                return
-                
-            self.landmark_predictor = dlib.shape_predictor(predictor_path)
-            self.update_status("Eye tracking system initialized successfully!")
-        
+            # Face detector backend and landmark model (68-point or eye-only) are picked at startup
+            detector = os.environ.get("EYETRACKER_FACE_DETECTOR", "hog")
+            predictor_path = os.environ.get("EYETRACKER_PREDICTOR", PREDICTOR_PATH)
+            
+            # Optionally keep dlib and NumPy work out of this process (and its GIL)
+            if self.remote_inference:
+                from remote_pipeline import RemotePipeline
+                pipeline = RemotePipeline(self.screen_width, self.screen_height, predictor_path, detector)
+            else:
+                pipeline = GazePipeline(self.screen_width, self.screen_height, predictor_path, detector)
+            pipeline.load_models(progress=self.report_loader_progress)
+            self.startup.mark("models")
+            self.loader_result = pipeline
         except Exception as e:
-            messagebox.showerror("Initialization Error", f"Failed to initialize trackers: {str(e)}")
+            self.loader_error = e
+    
+    def report_loader_progress(self, percent, message):
+        # Picked up by poll_model_loader on the Tk main thread
+        self.loader_progress = (percent, message)
+    
+    def poll_model_loader(self):
+        """Show loader progress and finish startup once the models are ready"""
+        percent, message = self.loader_progress
+        self.progress_bar['value'] = percent
+        self.update_status(message)
+        
+        if self.loader_error is not None:
+            if isinstance(self.loader_error, FileNotFoundError):
+                messagebox.showerror("File Not Found", str(self.loader_error))
+            else:
+                messagebox.showerror("Initialization Error",
+                                     f"Failed to initialize trackers: {str(self.loader_error)}")
             self.root.quit()
+        elif self.loader_result is not None:
+            self.on_models_ready(self.loader_result)
+        else:
+            self.root.after(50, self.poll_model_loader)
+    
+    def on_models_ready(self, pipeline):
+        """Hook the loaded pipeline up to the UI and enable tracking"""
+        from gaze_filters import GAZE_FILTERS
+        from gaze_pipeline import DEBUG_LEVELS, FACE_TRACKING_MODES, PUPIL_METHODS
+        from preview import PreviewRenderer
+        
+        self.pipeline = pipeline
+        self.pipeline.regions = dict(self.regions)
+        self.preview = PreviewRenderer(self.video_label)
+        
+        self.face_tracking_combo.config(values=FACE_TRACKING_MODES)
+        self.debug_level_combo.config(values=DEBUG_LEVELS)
+        self.pupil_method_combo.config(values=PUPIL_METHODS)
+        self.smoothing_combo.config(values=list(GAZE_FILTERS))
+        self.sync_pipeline_settings()
+        self.sync_preview_settings()
+        self.update_smoothing()
+        
+        self.progress_bar['value'] = 0
+        self.start_button.config(state=tk.NORMAL)
+        self.calibrate_button.config(state=tk.NORMAL)
+        self.update_status(f"Eye tracking system initialized successfully! "
+                           f"(ready in {self.startup.mark('ready'):.1f}s)")
+        
+        # Skip recalibration when this patient already has a profile
+        self.load_patient_profile()
     
     def update_status(self, message):
         """Update status message with optional auto clear"""
         self.status_message.config(text=message)
     
+    def update_power_saving(self, *args):
+        self.power.enabled = self.power_saving_var.get()
+    
+    def sync_pipeline_settings(self, *args):
+        """Copy the settings controls into the tracking pipeline"""
+        if self.pipeline is None:
+            return
+        self.pipeline.lock_time = self.lock_time_var.get()
+        self.pipeline.ear_threshold = self.ear_threshold_var.get()
+        self.pipeline.gaze_sensitivity = self.gaze_sensitivity_var.get()
+        self.pipeline.face_tracking = self.face_tracking_var.get()
+        self.pipeline.redetect_interval = max(1, self.redetect_interval_var.get())
+        self.pipeline.debug_level = self.debug_level_var.get()
+        self.pipeline.pupil_method = self.pupil_method_var.get()
+        self.pipeline.motion_gating = self.motion_gating_var.get()
+        self.pipeline.landmark_flow = self.landmark_flow_var.get()
+    
+    def load_patient_profile(self):
+        """Load the calibration profile of the patient named in Settings"""
+        from calibration import load_profile
+        
+        if self.pipeline is None:
+            return
+        patient = self.patient_var.get().strip() or "default"
+        try:
+            model = load_profile(patient)
+        except (OSError, ValueError, KeyError) as e:
+            self.update_status(f"Could not read calibration profile for {patient}: {e}")
+            return
+        
+        self.pipeline.calibration = model
+        if model is None:
+            self.update_status(f"No calibration profile for {patient} - please calibrate.")
+        else:
+            self.update_status(f"Loaded calibration for {patient} "
+                               f"(mean error {model.mean_error * 100:.1f}% of screen)")
+    
+    def save_patient_profile(self):
+        """Save the current calibration to the patient's profile"""
+        from calibration import save_profile
+        
+        patient = self.patient_var.get().strip() or "default"
+        try:
+            save_profile(patient, self.pipeline.calibration,
+                         screen=[self.screen_width, self.screen_height])
+        except OSError as e:
+            self.update_status(f"Could not save calibration profile: {e}")
+    
+    def update_smoothing(self, *args):
+        """Switch the pipeline to the selected gaze filter"""
+        if self.pipeline is None:
+            return
+        name = self.smoothing_var.get()
+        if name != self.pipeline.smoothing:
+            self.pipeline.set_smoothing(name)
+    
     def update_lock_time_value(self, event):
         """Update the lock time value label"""
         value = self.lock_time_var.get()
@@ -351,6 +636,48 @@ class EyeTrackingUI:
         value = self.region_size_var.get()
         self.region_size_value.config(text=f"{value}")
     
+    def update_redetect_interval_value(self, event):
+        """Update the re-detect interval value label"""
+        value = self.redetect_interval_var.get()
+        self.redetect_interval_value.config(text=f"{value}")
+    
+    def update_preview_rate_value(self, event):
+        """Update the preview rate value label"""
+        value = self.preview_rate_var.get()
+        self.preview_rate_value.config(text=f"{value}")
+    
+    def sync_preview_settings(self, *args):
+        """Apply the preview rate and kiosk mode settings"""
+        if self.preview is None:
+            return
+        self.preview.max_rate_hz = max(1, self.preview_rate_var.get())
+        self.preview.kiosk = self.kiosk_mode_var.get()
+        if self.preview.kiosk:
+            self.preview.clear()
+        else:
+            self.gaze_cursor.place_forget()
+            self.calibration_marker.place_forget()
+    
+    def camera_settings(self):
+        """CaptureSettings from the Camera panel; unparseable entries fall back to camera defaults"""
+        settings = CaptureSettings(device=self.camera_device_var.get().strip() or "0",
+                                   backend=self.camera_backend_var.get(),
+                                   mjpeg=self.camera_mjpeg_var.get(),
+                                   newest_only=self.camera_newest_only_var.get())
+        try:
+            settings.width, settings.height = (int(v) for v in self.camera_resolution_var.get().lower().split("x"))
+        except ValueError:
+            pass
+        try:
+            settings.fps = float(self.camera_fps_var.get())
+        except ValueError:
+            pass
+        try:
+            settings.buffer_size = max(1, self.camera_buffer_var.get())
+        except tk.TclError:
+            pass
+        return settings
+    
     def calibrate_tracking(self):
         """Start the calibration process"""
         if not self.running:
@@ -360,475 +687,327 @@ class EyeTrackingUI:
             self.start_tracking(calibration=True)
         else:
             # Switch to calibration mode if already running
-            self.calibration_mode = True
-            self.calibration_current = 0
-            self.calibration_data = {}
+            self.pipeline.start_calibration()
             self.update_status("Calibration started. Follow the points and blink to confirm.")
     
     def start_tracking(self, calibration=False):
         """Start the eye tracking process"""
+        from gaze_pipeline import ResultPublisher
+        
+        if self.pipeline is None:
+            return
         if not self.running:
-            self.cap = cv2.VideoCapture(0)
+            camera = self.camera_settings()
+            self.cap = open_capture(camera)
             if not self.cap.isOpened():
                 messagebox.showerror("Camera Error", "Could not access the webcam.")
                 return
+            camera.save()
+            self.update_status(f"Camera: {camera.describe(self.cap)}")
             
             self.running = True
-            self.calibration_mode = calibration
+            self.pipeline.reset()
+            self.power.reset(self.pipeline)
             
             if calibration:
-                self.calibration_current = 0
-                self.calibration_data = {}
+                self.pipeline.start_calibration()
                 self.update_status("Calibration started. Follow the points and blink to confirm.")
             
+            # Capture -> inference -> render, each stage only ever sees the newest item
+            self.frame_queue = self.pipeline.frames if self.remote_inference else LatestFrameQueue()
+            self.publisher = ResultPublisher()
+            self.latest_result = None
+            
+            if self.record_session_var.get():
+                self.start_recording()
+            
+            self.capture_thread = CaptureThread(self.cap, self.frame_queue, newest_only=camera.newest_only)
+            self.capture_thread.start()
+            
             self.thread = threading.Thread(target=self.tracking_loop)
             self.thread.daemon = True
             self.thread.start()
             
+            # Rendering happens on the Tk main thread
+            self.root.after(self.render_interval_ms, self.render_loop)
+            
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.calibrate_button.config(state=tk.DISABLED)
     
     def stop_tracking(self):
         """Stop the eye tracking process"""
-        self.running = False
-        self.calibration_mode = False
-        
-        if self.thread:
-            self.thread.join(timeout=1.0)
-        if self.cap:
-            self.cap.release()
+        self.shutdown_threads()
+        self.pipeline.stop_calibration()
         
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.calibrate_button.config(state=tk.NORMAL)
         
         # Reset the video label
-        self.video_label.config(image='')
+        if self.preview is not None:
+            self.preview.clear()
+        self.gaze_cursor.place_forget()
+        self.calibration_marker.place_forget()
         
         # Reset status indicators
-        self.face_status.config(text="Not Detected", foreground="red")
-        self.eye_status.config(text="Not Detected", foreground="red")
-        self.gaze_status.config(text="None", foreground="blue")
-        self.lock_status.config(text="None", foreground="blue")
+        self.set_widget(self.face_status, text="Not Detected", foreground="red")
+        self.set_widget(self.eye_status, text="Not Detected", foreground="red")
+        self.set_widget(self.gaze_status, text="None", foreground="blue")
+        self.set_widget(self.lock_status, text="None", foreground="blue")
+        self.highlight_region(None)
         
         # Reset progress bar
-        self.progress_bar['value'] = 0
+        self.set_widget(self.progress_bar, value=0)
         self.update_status("Tracking stopped")
     
-    def exit_program(self):
-        """Exit the program cleanly"""
+    def shutdown_threads(self):
+        """Stop the capture and inference threads and release the camera"""
         self.running = False
+        if self.capture_thread:
+            self.capture_thread.stop()
+            self.capture_thread.join(timeout=1.0)
+        if self.frame_queue:
+            self.frame_queue.close()
         if self.thread:
             self.thread.join(timeout=1.0)
         if self.cap:
             self.cap.release()
-        self.root.attributes('-fullscreen', False)  # Exit fullscreen mode
-        self.root.destroy()
+        if self.recorder:
+            self.recorder.close()
+            print(f"Recorded {self.recorder.written} frames to {self.recorder.path}")
+            self.recorder = None
     
-    def eye_aspect_ratio(self, landmarks):
-        """Calculate eye aspect ratio (EAR) for detecting eye closure"""
-        # Get the coordinates for the left eye (landmarks 36 to 41)
-        left_eye = [landmarks.part(i) for i in range(36, 42)]
-        # Get the coordinates for the right eye (landmarks 42 to 47)
-        right_eye = [landmarks.part(i) for i in range(42, 48)]
-        
-        # Convert points to tuples (x, y)
-        left_eye = [(point.x, point.y) for point in left_eye]
-        right_eye = [(point.x, point.y) for point in right_eye]
+    def start_recording(self):
+        """Record this tracking session's landmarks and gaze under recordings/"""
+        from recording import SessionRecorder, new_recording_path
+        
+        settings = {
+            "lock_time": self.pipeline.lock_time,
+            "ear_threshold": self.pipeline.ear_threshold,
+            "gaze_sensitivity": self.pipeline.gaze_sensitivity,
+            "smoothing": self.pipeline.smoothing,
+            "smoothing_params": self.pipeline.smoothing_params,
+            "region_hysteresis": self.pipeline.region_hysteresis,
+            "patient": self.patient_var.get(),
+        }
+        path = new_recording_path(self.patient_var.get())
+        self.recorder = SessionRecorder(path, self.screen_width, self.screen_height, settings)
+        self.update_status(f"Recording to {path}")
+    
+    def start_metrics(self):
+        """Serve metrics on localhost, and dump them to a file if configured
 
-        # Calculate the Euclidean distances between the vertical eye landmarks
-        A = np.linalg.norm(np.array(left_eye[1]) - np.array(left_eye[5]))
-        B = np.linalg.norm(np.array(left_eye[2]) - np.array(left_eye[4]))
-        C = np.linalg.norm(np.array(right_eye[1]) - np.array(right_eye[5]))
-        D = np.linalg.norm(np.array(right_eye[2]) - np.array(right_eye[4]))
-        
-        # Calculate the Eye Aspect Ratio (EAR) for both eyes
-        left_EAR = (A + B) / (2.0 * np.linalg.norm(np.array(left_eye[0]) - np.array(left_eye[3])) + 1e-6)
-        right_EAR = (C + D) / (2.0 * np.linalg.norm(np.array(right_eye[0]) - np.array(right_eye[3])) + 1e-6)
-        
-        # Average the two EARs
-        EAR = (left_EAR + right_EAR) / 2.0
-        return EAR
-    
-    def get_improved_gaze_direction(self, landmarks, gray, frame):
-        """Calculate gaze direction with improved algorithm"""
-        # Get left and right eye landmarks
-        left_eye = [landmarks.part(i) for i in range(36, 42)]
-        right_eye = [landmarks.part(i) for i in range(42, 48)]
-        
-        # Process both eyes and average the results
-        left_gaze = self.process_eye_for_gaze(left_eye, gray, frame)
-        right_gaze = self.process_eye_for_gaze(right_eye, gray, frame)
-        
-        # Get sensitivity factor
-        sensitivity = self.gaze_sensitivity_var.get()
-        
-        # Apply calibration and sensitivity
-        gaze_x = ((left_gaze[0] + right_gaze[0]) / 2) 
-        gaze_y = ((left_gaze[1] + right_gaze[1]) / 2)
-        
-        # Apply calibration offsets and scaling
-        gaze_x = (gaze_x * self.calibration_scale_x) + self.calibration_offset_x
-        gaze_y = (gaze_y * self.calibration_scale_y) + self.calibration_offset_y
-        
-        # Apply sensitivity factor - reduces the center bias
-        gaze_x = 0.5 + (gaze_x - 0.5) * sensitivity
-        gaze_y = 0.5 + (gaze_y - 0.5) * sensitivity
-        
-        # Ensure values are within 0-1 range
-        gaze_x = max(0, min(1, gaze_x))
-        gaze_y = max(0, min(1, gaze_y))
-        
-        return gaze_x, gaze_y
-    
-    def process_eye_for_gaze(self, eye_landmarks, gray, frame):
-        """Process a single eye for gaze estimation"""
-        # Convert landmarks to numpy array
-        eye_points = np.array([(point.x, point.y) for point in eye_landmarks])
-        
-        # Get eye region
-        x_min, y_min = np.min(eye_points, axis=0)
-        x_max, y_max = np.max(eye_points, axis=0)
-        
-        # Add padding
-        padding = 5
-        x_min = max(0, x_min - padding)
-        y_min = max(0, y_min - padding)
-        x_max = min(gray.shape[1], x_max + padding)
-        y_max = min(gray.shape[0], y_max + padding)
-        
-        # Check if dimensions are valid
-        if x_min >= x_max or y_min >= y_max:
-            return 0.5, 0.5
-        
-        # Extract eye region
-        eye_region = gray[y_min:y_max, x_min:x_max]
-        if eye_region.size == 0:
-            return 0.5, 0.5
-        
-        # Improve contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        eye_region = clahe.apply(eye_region)
-        
-        # Apply Gaussian blur
-        eye_region = cv2.GaussianBlur(eye_region, (7, 7), 0)
-        
-        # Use adaptive thresholding for better pupil detection
-        _, thresholded = cv2.threshold(eye_region, 30, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
-        
-        # Denoise
-        kernel = np.ones((3, 3), np.uint8)
-        thresholded = cv2.morphologyEx(thresholded, cv2.MORPH_OPEN, kernel, iterations=1)
-        thresholded = cv2.morphologyEx(thresholded, cv2.MORPH_CLOSE, kernel, iterations=1)
-        
-        # Find the darkest region (pupil)
-        contours, _ = cv2.findContours(thresholded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Draw the contours for debugging
-        eye_region_color = cv2.cvtColor(eye_region, cv2.COLOR_GRAY2BGR)
-        cv2.drawContours(eye_region_color, contours, -1, (0, 255, 0), 1)
-        
-        # Calculate relative position
-        eye_center_x = (x_max + x_min) / 2
-        eye_center_y = (y_max + y_min) / 2
-        
-        if contours:
-            # Find the largest contour
-            largest_contour = max(contours, key=cv2.contourArea)
-            
-            # Find the center of the contour
-            M = cv2.moments(largest_contour)
-            if M['m00'] != 0:
-                cx = int(M['m10'] / M['m00'])
-                cy = int(M['m01'] / M['m00'])
-                
-                # Draw the pupil center for debugging
-                cv2.circle(eye_region_color, (cx, cy), 3, (0, 0, 255), -1)
-                
-                # Calculate pupil position relative to eye center
-                pupil_x = x_min + cx
-                pupil_y = y_min + cy
-                
-                # Convert to relative coordinates (0-1)
-                rel_x = (pupil_x - eye_center_x) / (x_max - x_min) * 2
-                rel_y = (pupil_y - eye_center_y) / (y_max - y_min) * 2
-                
-                # Map to 0-1 range
-                # This inverts the direction because the pupil moves in the opposite direction of gaze
-                gaze_x = 0.5 - rel_x * 0.5
-                gaze_y = 0.5 - rel_y * 0.5
-                
-                # Display the processed eye region for debugging
-                height, width = eye_region_color.shape[:2]
-                scale_factor = 100 / height
-                resized = cv2.resize(eye_region_color, (int(width * scale_factor), 100))
-                
-                # Draw a debug overlay in the corner
-                h, w = frame.shape[:2]
-                frame[h-100:h, 0:resized.shape[1]] = resized
-                
-                return gaze_x, gaze_y
-        
-        return 0.5, 0.5
+        EYETRACKER_METRICS_PORT picks the port (0 turns the endpoint off),
+        EYETRACKER_METRICS_FILE a rotating file that gets a snapshot every minute.
+        """
+        self.metrics = describe_pipeline_metrics(PipelineMetrics())
+        queue_drops = lambda: self.frame_queue.dropped if self.frame_queue else 0
+        render_drops = lambda: self.publisher.dropped if self.publisher else 0
+        undecoded = lambda: self.capture_thread.skipped if self.capture_thread else 0
+        self.metrics.add_source("dropped_frames_total", queue_drops, stage="capture")
+        self.metrics.add_source("dropped_frames_total", render_drops, stage="render")
+        self.metrics.add_source("dropped_frames_total", undecoded, stage="undecoded")
+        self.metrics.describe("dropped_frames_total", "Frames dropped between stages in the current session")
+        for mode in POWER_MODES:
+            self.metrics.add_source("power_mode_seconds_total", lambda mode=mode: self.power.seconds[mode], mode=mode)
+        self.metrics.describe("power_mode_seconds_total", "Time spent tracking at full rate (active) or idling")
+        
+        port = int(os.environ.get("EYETRACKER_METRICS_PORT", DEFAULT_METRICS_PORT))
+        if port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port)
+                self.metrics_server.start()
+                print(f"Metrics at {self.metrics_server.address}")
+            except OSError as e:
+                print(f"Metrics endpoint disabled: {e}")
+        
+        path = os.environ.get("EYETRACKER_METRICS_FILE")
+        if path:
+            self.metrics_dumper = MetricsDumper(self.metrics, path)
+            self.metrics_dumper.start()
+    
+    def exit_program(self):
+        """Exit the program cleanly"""
+        self.shutdown_threads()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+        self.dispatcher.close()
+        if self.remote_inference and self.pipeline is not None:
+            self.pipeline.close()
+        self.root.attributes('-fullscreen', False)  # Exit fullscreen mode
+        self.root.destroy()
     
     def tracking_loop(self):
-        """Main eye tracking loop - runs in a separate thread"""
-        self.last_frame_time = time.time()
-        frame_count = 0
-        
+        """Inference stage - runs in a separate thread on the freshest captured frame"""
         while self.running:
-            ret, frame = self.cap.read()
-            if not ret:
-                self.update_status("Error reading from camera!")
-                self.stop_tracking()
-                return
-            
-            # Flip frame horizontally for a mirror effect
-            frame = cv2.flip(frame, 1)
-            
-            # Calculate FPS
-            current_time = time.time()
-            elapsed = current_time - self.last_frame_time
-            self.last_frame_time = current_time
-            
-            # Update FPS every 10 frames
-            frame_count += 1
-            if frame_count >= 10:
-                self.fps = 10 / elapsed
-                frame_count = 0
-                self.fps_info.config(text=f"FPS: {self.fps:.1f}")
-            
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_detector(gray, 0)
-            
-            # Update face status
-            if len(faces) > 0:
-                self.face_status.config(text="Detected", foreground="green")
-                
-                # Get the largest face
-                face = max(faces, key=lambda rect: rect.width() * rect.height())
-                
-                # Get landmarks
-                landmarks = self.landmark_predictor(gray, face)
-                
-                # Calculate eye aspect ratio
-                ear = self.eye_aspect_ratio(landmarks)
-                self.current_ear = ear
-                self.ear_info.config(text=f"EAR: {ear:.2f}")
-                
-                # Get ear threshold
-                ear_threshold = self.ear_threshold_var.get()
-                
-                # Detect if eyes are open or closed
-                if ear < ear_threshold:
-                    # Eyes closed
-                    if self.last_eye_open_time is not None:
-                        self.eye_closed_duration = current_time - self.last_eye_open_time
-                    self.eye_status.config(text="Closed", foreground="red")
-                    
-                    # Handle eye blink for calibration
-                    if self.calibration_mode and self.eye_closed_duration > 0.2:
-                        self.process_calibration_point()
-                else:
-                    # Eyes open
-                    self.last_eye_open_time = current_time
-                    self.eye_closed_duration = 0
-                    self.eye_status.config(text="Open", foreground="green")
-                
-                # Get gaze direction
-                gaze_x, gaze_y = self.get_improved_gaze_direction(landmarks, gray, frame)
-                
-                # Apply temporal smoothing
-                self.gaze_history.append((gaze_x, gaze_y))
-                if len(self.gaze_history) > self.gaze_history_max:
-                    self.gaze_history.pop(0)
-                
-                # Average the gaze positions
-                avg_gaze_x = sum(g[0] for g in self.gaze_history) / len(self.gaze_history)
-                avg_gaze_y = sum(g[1] for g in self.gaze_history) / len(self.gaze_history)
-                
-                # Map to screen coordinates
-                screen_x = int(avg_gaze_x * self.screen_width)
-                screen_y = int(avg_gaze_y * self.screen_height)
-                
-                # Update gaze coordinates display
-                self.gaze_coord_info.config(text=f"Gaze Coords: ({screen_x}, {screen_y})")
-                
-                # If in calibration mode, draw calibration point
-                if self.calibration_mode and self.calibration_current < len(self.calibration_points):
-                    calib_point = self.calibration_points[self.calibration_current]
-                    calib_x = int(calib_point[0] * self.screen_width)
-                    calib_y = int(calib_point[1] * self.screen_height)
-                    
-                    # Draw calibration point
-                    cv2.circle(frame, (calib_x, calib_y), 20, (0, 255, 0), -1)
-                    cv2.circle(frame, (calib_x, calib_y), 22, (255, 255, 255), 2)
-                    
-                    # Draw instruction text
-                    cv2.putText(frame, "Look at the green dot and blink", 
-                               (int(self.screen_width/2 - 200), 50), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                else:
-                    # Check which region is being gazed at
-                    current_region = None
-                    for name, (x1, y1, x2, y2) in self.regions.items():
-                        if x1 <= screen_x <= x2 and y1 <= screen_y <= y2:
-                            current_region = name
-                            break
-                    
-                    # Update gaze status
-                    if current_region:
-                        self.gaze_status.config(text=current_region, foreground="blue")
-                        
-                        # Highlight the current region
-                        for region_name, label in self.region_labels.items():
-                            if region_name == current_region:
-                                label.configure(background="#88CC88")  # Green background for active region
-                            else:
-                                label.configure(background="#333333")  # Default background (no alpha)
-
-                        
-                        # Check for gaze lock on region
-                        if self.locked_region != current_region:
-                            self.locked_region = current_region
-                            self.lock_start_time = current_time
-                        else:
-                            # Calculate progress towards selection
-                            if self.lock_start_time is not None:
-                                lock_duration = current_time - self.lock_start_time
-                                lock_time = self.lock_time_var.get()
-                                
-                                # Update progress bar
-                                progress = min(100, (lock_duration / lock_time) * 100)
-                                self.progress_bar['value'] = progress
-                                
-                                # Check if gaze lock is complete
-                                if lock_duration >= lock_time:
-                                    self.make_selection(current_region)
-                                    # Reset lock
-                                    self.lock_start_time = current_time
-                    else:
-                        self.gaze_status.config(text="None", foreground="blue")
-                        self.locked_region = None
-                        self.lock_start_time = None
-                        self.progress_bar['value'] = 0
-                        
-                        # Reset all region highlights
-                        for label in self.region_labels.values():
-                            label.configure(background="#333333")
-                
-                # Draw eye landmarks and gaze direction
-                self.draw_eye_tracking_debug(frame, landmarks, (avg_gaze_x, avg_gaze_y))
+            if self.remote_inference:
+                # Frames go to the inference process straight from the capture thread
+                result = self.pipeline.get_result(timeout=0.5)
+                if result is None:
+                    continue
+                captured_at = result.timestamp
             else:
-                self.face_status.config(text="Not Detected", foreground="red")
-                self.eye_status.config(text="Not Detected", foreground="red")
-                self.gaze_status.config(text="None", foreground="blue")
-                self.locked_region = None
-                self.lock_start_time = None
-                self.progress_bar['value'] = 0
+                item = self.frame_queue.get(timeout=0.5)
+                if item is None:
+                    if self.frame_queue.closed:
+                        break
+                    continue
+                frame, captured_at = item
+                result = self.pipeline.process(frame, captured_at)
             
-            # Convert frame to format for tkinter
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            imgtk = ImageTk.PhotoImage(image=img)
+            result.latency_ms = (time.time() - captured_at) * 1000
+            result.power_mode = self.power.update(result, self.pipeline, self.capture_thread)
+            self.metrics.observe_result(result)
+            if self.recorder:
+                self.recorder.record(result, self.pipeline.regions)
+            self.publisher.publish(result)
+    
+    def render_loop(self):
+        """Render stage - runs on the Tk main thread via root.after"""
+        if not self.running:
+            return
+        
+        result, events = self.publisher.collect()
+        
+        # Selections and calibration steps are handled as soon as they arrive
+        for event in events:
+            if event.kind == "selection":
+                self.make_selection(event.region)
+            else:
+                self.update_status(event.message)
+                if event.kind == "calibration_complete":
+                    self.save_patient_profile()
+        
+        if result is not None:
+            self.latest_result = result
+            self.report_startup(result)
             
-            # Update the video label
-            self.video_label.config(image=imgtk)
-            self.video_label.image = imgtk  # Keep a reference to prevent garbage collection
-    
-    def draw_eye_tracking_debug(self, frame, landmarks, gaze):
-        """Draw eye landmarks and gaze direction for debugging"""
-        # Draw face landmarks
-        for n in range(36, 48):  # Eye landmarks
-            x = landmarks.part(n).x
-            y = landmarks.part(n).y
-            cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-        
-        # Draw estimated gaze point
-        screen_x = int(gaze[0] * self.screen_width)
-        screen_y = int(gaze[1] * self.screen_height)
-        cv2.circle(frame, (screen_x, screen_y), 10, (0, 0, 255), -1)
+            # Video is rendered at its own capped rate, independent of tracking
+            if self.preview.kiosk:
+                self.show_kiosk_markers(result)
+            elif result.frame is not None and self.preview.due():
+                self.preview.render(result.frame)
+        
+        # Status widgets are refreshed at a fixed, lower rate
+        now = time.monotonic()
+        if self.latest_result is not None and now - self.last_status_time >= self.status_interval:
+            self.last_status_time = now
+            self.show_result(self.latest_result)
+            self.set_widget(self.drops_info, text=f"Dropped: {self.frame_queue.dropped} capture / "
+                                                  f"{self.publisher.dropped} render / "
+                                                  f"{self.capture_thread.skipped} undecoded")
+        
+        if self.capture_thread.failed:
+            self.stop_tracking()
+            self.update_status("Error reading from camera!")
+            return
+        if self.remote_inference and self.pipeline.failed:
+            self.stop_tracking()
+            self.update_status("Inference process stopped unexpectedly!")
+            return
+        
+        self.root.after(self.render_interval_ms, self.render_loop)
     
-    def make_selection(self, region):
-        """Handle selection of a region"""
-        self.lock_status.config(text=region, foreground="green")
-        self.update_status(f"Selected: {region}")
+    def report_startup(self, result):
+        """Log cold-start timings once the first gaze estimate comes through"""
+        self.startup.mark("first_frame")
+        if result.gaze is None or "first_gaze" in self.startup.marks:
+            return
+        self.startup.mark("first_gaze")
+        summary = self.startup.summary()
+        print(f"Startup: {summary}")
+        self.update_status(f"Startup: {summary}")
+    
+    def highlight_region(self, region):
+        """Move the region highlight, touching only the old and new labels"""
+        if region == self.highlighted_region:
+            return
+        if self.highlighted_region in self.region_labels:
+            self.region_labels[self.highlighted_region].configure(background="#333333")  # Default background (no alpha)
+        if region in self.region_labels:
+            self.region_labels[region].configure(background="#88CC88")  # Green background for active region
+        self.highlighted_region = region
+    
+    def show_result(self, result):
+        """Reflect the latest pipeline result in the status widgets"""
+        # Every result carries the latest FPS, so the sampled ones rendered keep it current
+        if result.fps is not None:
+            self.set_widget(self.fps_info, text=f"FPS: {result.fps:.1f}")
+        self.set_widget(self.debug_cost_info, text=f"Debug Cost: {result.debug_ms:.2f} ms")
+        if result.latency_ms is not None:
+            self.set_widget(self.latency_info, text=f"Latency: {result.latency_ms:.0f} ms")
+        if result.power_mode is not None:
+            idle_share = self.power.shares()["idle"]
+            self.set_widget(self.power_info, text=f"Power: {result.power_mode} (idle {idle_share:.0%} of the time)")
+        
+        if not result.face_detected:
+            self.set_widget(self.face_status, text="Not Detected", foreground="red")
+            self.set_widget(self.eye_status, text="Not Detected", foreground="red")
+            self.set_widget(self.gaze_status, text="None", foreground="blue")
+            self.set_widget(self.progress_bar, value=0)
+            self.highlight_region(None)
+            return
         
-        # Play a sound to indicate selection
-        self.root.bell()
+        self.set_widget(self.face_status, text="Detected", foreground="green")
+        self.set_widget(self.ear_info, text=f"EAR: {result.ear:.2f}")
+        if result.eyes_open:
+            self.set_widget(self.eye_status, text="Open", foreground="green")
+        else:
+            self.set_widget(self.eye_status, text="Closed", foreground="red")
+        
+        # Without a reliable pupil fix yet there is no gaze to show
+        if result.screen_point is None:
+            return
         
-        # Here you would add code to perform actions based on the selected region
-        # For example, send notifications, trigger events, etc.
+        screen_x, screen_y = result.screen_point
+        self.set_widget(self.gaze_coord_info, text=f"Gaze Coords: ({screen_x}, {screen_y})")
+        
+        # Region feedback is paused while calibrating
+        if result.calibrating:
+            return
+        
+        if result.region:
+            self.set_widget(self.gaze_status, text=result.region, foreground="blue")
+            self.set_widget(self.progress_bar, value=int(result.lock_progress))
+        else:
+            self.set_widget(self.gaze_status, text="None", foreground="blue")
+            self.set_widget(self.progress_bar, value=0)
+        
+        # Highlight the current region
+        self.highlight_region(result.region)
     
-    def process_calibration_point(self):
-        """Process the current calibration point"""
-        if self.calibration_current < len(self.calibration_points):
-            # Get the expected point
-            point = self.calibration_points[self.calibration_current]
-            
-            # Get the current gaze point (average of gaze history)
-            if self.gaze_history:
-                avg_gaze_x = sum(g[0] for g in self.gaze_history) / len(self.gaze_history)
-                avg_gaze_y = sum(g[1] for g in self.gaze_history) / len(self.gaze_history)
-                
-                # Store the calibration data
-                self.calibration_data[point] = (avg_gaze_x, avg_gaze_y)
-                
-                # Move to next point
-                self.calibration_current += 1
-                
-                if self.calibration_current < len(self.calibration_points):
-                    self.update_status(f"Calibration point {self.calibration_current+1}/{len(self.calibration_points)}. Look at the green dot and blink.")
-                else:
-                    # Calibration complete, calculate calibration parameters
-                    self.calculate_calibration_parameters()
-                    self.calibration_mode = False
-                    self.update_status("Calibration complete! Tracking resumed.")
-    
-    def calculate_calibration_parameters(self):
-        """Calculate calibration parameters from collected data"""
-        if len(self.calibration_data) < 3:
-            # Not enough data points
-            self.update_status("Calibration failed: Not enough data points!")
+    def show_kiosk_markers(self, result):
+        """Place the gaze cursor and calibration marker over the region overlays"""
+        if result.screen_point is not None:
+            x, y = result.screen_point
+            self.gaze_cursor.place(x=x - 10, y=y - 10)
+            self.gaze_cursor.lift()
+        else:
+            self.gaze_cursor.place_forget()
+        
+        if result.calibration_target is not None:
+            x, y = result.calibration_target
+            self.calibration_marker.place(x=x - 20, y=y - 20)
+        else:
+            self.calibration_marker.place_forget()
+    
+    def make_selection(self, region):
+        """Handle selection of a region"""
+        # Page turning targets only move through the board
+        if region in (PREVIOUS_PAGE, NEXT_PAGE):
+            self.turn_page(1 if region == NEXT_PAGE else -1)
             return
         
-        # Calculate average offsets and scaling
-        x_offsets = []
-        y_offsets = []
-        x_scales = []
-        y_scales = []
+        self.metrics.record_selection(region)
+        self.dispatcher.publish(SelectionEvent(region, time.time(), patient=self.patient_var.get()))
+        self.set_widget(self.lock_status, text=region, foreground="green")
+        self.update_status(f"Selected: {region}")
         
-        for (expected_x, expected_y), (actual_x, actual_y) in self.calibration_data.items():
-            # Calculate offset (difference between expected and actual)
-            x_offset = expected_x - actual_x
-            y_offset = expected_y - actual_y
-            
-            # Calculate scaling (ratio of expected to actual distance from center)
-            x_scale = abs(expected_x - 0.5) / (abs(actual_x - 0.5) + 1e-6)
-            y_scale = abs(expected_y - 0.5) / (abs(actual_y - 0.5) + 1e-6)
-            
-            x_offsets.append(x_offset)
-            y_offsets.append(y_offset)
-            x_scales.append(x_scale)
-            y_scales.append(y_scale)
-        
-        # Average the parameters
-        self.calibration_offset_x = sum(x_offsets) / len(x_offsets)
-        self.calibration_offset_y = sum(y_offsets) / len(y_offsets)
-        self.calibration_scale_x = sum(x_scales) / len(x_scales)
-        self.calibration_scale_y = sum(y_scales) / len(y_scales)
-        
-        # Log the calibration parameters
-        calibration_info = (
-            f"Calibration complete!\n"
-            f"X Offset: {self.calibration_offset_x:.3f}, Y Offset: {self.calibration_offset_y:.3f}\n"
-            f"X Scale: {self.calibration_scale_x:.3f}, Y Scale: {self.calibration_scale_y:.3f}"
-        )
-        print(calibration_info)
+        # Play a sound to indicate selection
+        self.root.bell()
 
 
 # If running directly, start the application
@@ -0,0 +1,528 @@
+from startup import StartupTimer  # first, see startup.PROCESS_START
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from dwell import grid_pages
+from face_models import EYES, FACE_DETECTORS
+from gaze_pipeline import (DEBUG_LEVELS, FACE_TRACKING_MODES, PIPELINE_STAGES, PREDICTOR_PATH, PUPIL_METHODS,
+                           GazePipeline, video_frames)
+from gaze_filters import GAZE_FILTERS
+from preview import PreviewRenderer
+from remote_pipeline import RemotePipeline
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Stages reported besides the pipeline's own, in the order they happen to a frame
+BENCHMARK_STAGES = (("decode", "handoff_write", "handoff_read") + PIPELINE_STAGES
+                    + ("handoff", "render", "total"))
+PERCENTILES = (50, 95, 99)
+REMOTE_RESULT_TIMEOUT = 30.0  # seconds the inference process gets to answer one frame
+
+
+def synthetic_frames(count, width=640, height=480, fps=30.0, seed=0):
+    """Yield (frame, timestamp) pairs of a drawn face drifting about and looking around
+
+    A real HOG detector may not find a face in it, in which case only the
+    stages up to detection get measured (main() fails the run then), so use
+    a recording for release numbers.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 80, size=(height, width, 3), dtype=np.uint8)
+    frame = np.empty_like(background)
+    for index in range(count):
+        t = index / fps
+        np.copyto(frame, background)
+
+        # Head drifts slowly, gaze follows a Lissajous path
+        cx = int(width / 2 + width * 0.08 * np.sin(t * 0.7))
+        cy = int(height / 2 + height * 0.05 * np.sin(t * 0.5))
+        face_w, face_h = int(width * 0.18), int(height * 0.32)
+        look_x, look_y = np.sin(t * 1.3), np.sin(t * 0.9 + 1.0)
+
+        cv2.ellipse(frame, (cx, cy), (face_w, face_h), 0, 0, 360, (150, 180, 220), -1)
+        for side in (-1, 1):
+            ex, ey = cx + side * face_w // 2, cy - face_h // 5
+            cv2.ellipse(frame, (ex, ey), (face_w // 5, face_h // 12), 0, 0, 360, (245, 245, 245), -1)
+            pupil = (int(ex + look_x * face_w // 10), int(ey + look_y * face_h // 30))
+            cv2.circle(frame, pupil, face_h // 20, (20, 20, 20), -1)
+            cv2.line(frame, (ex - face_w // 5, ey - face_h // 6), (ex + face_w // 5, ey - face_h // 6),
+                     (60, 60, 90), 4)
+        cv2.ellipse(frame, (cx, cy + face_h // 2), (face_w // 3, face_h // 10), 0, 0, 180, (60, 60, 160), 3)
+
+        # Blink for a few frames every ~4 seconds
+        if index % 120 < 4:
+            for side in (-1, 1):
+                ex, ey = cx + side * face_w // 2, cy - face_h // 5
+                cv2.ellipse(frame, (ex, ey), (face_w // 5 + 2, face_h // 12 + 2), 0, 0, 360,
+                            (150, 180, 220), -1)
+        yield frame, t
+
+
+def timed_frames(frames, decode_ms):
+    """Pass frames through, appending how long each took to produce to decode_ms"""
+    iterator = iter(frames)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        decode_ms.append((time.perf_counter() - start) * 1000)
+        yield item
+
+
+def wait_for_result(pipeline, timeout=REMOTE_RESULT_TIMEOUT):
+    """Next result from a RemotePipeline, exiting if its process dies or stops answering"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = pipeline.get_result(timeout=1.0)
+        if result is not None:
+            return result
+        if not pipeline.process.is_alive():
+            raise SystemExit(f"Inference process exited (exit code {pipeline.process.exitcode})")
+        if time.monotonic() >= deadline:
+            raise SystemExit(f"No result from the inference process in {timeout:.0f}s")
+
+
+def summarize(samples):
+    """Count, mean, max and PERCENTILES of a list of millisecond samples"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples)
+    summary = {"count": len(values), "mean": float(values.mean()), "max": float(values.max())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+    return summary
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, if the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def environment():
+    """Versions and machine details stored with every report so runs can be compared"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    try:
+        import dlib
+        dlib_version = getattr(dlib, "__version__", "unknown")
+    except ImportError:
+        dlib_version = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "dlib": dlib_version,
+    }
+
+
+def run_benchmark(pipeline, frames, warmup=10, render_size=(1280, 720), trace_memory=False, on_result=None):
+    """Push frames through pipeline (and the preview conversion) as fast as possible
+
+    Returns the report dict: per-stage latency summaries in milliseconds,
+    throughput and peak memory. The first `warmup` frames are not measured;
+    on_result, if given, is called with (index, result) for the others.
+    With a RemotePipeline each frame makes a full round trip to the inference
+    process; handoff_write/handoff_read are the shared-memory copies on either
+    side and handoff the whole round trip minus the pipeline stages.
+    """
+    remote = isinstance(pipeline, RemotePipeline)
+    renderer = PreviewRenderer(label=None) if render_size else None
+    samples = {stage: [] for stage in BENCHMARK_STAGES}
+    decode_ms = []
+    measured = 0
+    faces = 0
+    detector_runs = 0
+    reused = 0
+    flow_tracked = 0
+    # Blinks counted and frame-to-frame EAR change, to see how steady the landmarks are
+    blinks = 0
+    ear_changes = []
+    last_ear = None
+    eyes_open = None
+
+    if trace_memory:
+        tracemalloc.start()
+    wall_start = None
+    for index, (frame, timestamp) in enumerate(timed_frames(frames, decode_ms)):
+        start = time.perf_counter()
+        if remote:
+            pipeline.submit(frame, timestamp)
+            result = wait_for_result(pipeline)
+            round_trip_ms = (time.perf_counter() - start) * 1000
+            result.stage_ms["handoff_write"] = pipeline.put_ms
+            worker_ms = sum(ms for stage, ms in result.stage_ms.items() if stage in PIPELINE_STAGES)
+            result.stage_ms["handoff"] = round_trip_ms - worker_ms
+        else:
+            result = pipeline.process(frame, timestamp)
+        if renderer is not None:
+            render_start = time.perf_counter()
+            renderer.prepare(result.frame, *render_size)
+            result.stage_ms["render"] = (time.perf_counter() - render_start) * 1000
+        total_ms = (time.perf_counter() - start) * 1000
+
+        if index < warmup:
+            continue
+        if wall_start is None:
+            wall_start = start
+        if on_result is not None:
+            on_result(index, result)
+        measured += 1
+        faces += result.face_detected
+        detector_runs += result.face_detector_ran
+        reused += result.reused
+        flow_tracked += result.flow_tracked
+        if result.ear is not None:
+            if last_ear is not None:
+                ear_changes.append(abs(result.ear - last_ear))
+            last_ear = result.ear
+        if result.eyes_open is not None:
+            blinks += bool(eyes_open and not result.eyes_open)
+            eyes_open = result.eyes_open
+        samples["decode"].append(decode_ms[-1])
+        samples["total"].append(total_ms)
+        for stage, ms in result.stage_ms.items():
+            samples[stage].append(ms)
+    elapsed = time.perf_counter() - wall_start if wall_start is not None else 0.0
+
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        "frames": measured,
+        "warmup_frames": warmup,
+        "face_frames": faces,
+        "detector_runs": detector_runs,
+        "reused_frames": reused,
+        "flow_frames": flow_tracked,
+        "blinks": blinks,
+        "ear_jitter": float(np.mean(ear_changes)) if ear_changes else None,
+        "elapsed_s": elapsed,
+        "throughput_fps": measured / elapsed if elapsed > 0 else 0.0,
+        "pipeline_fps": 1000 / np.mean(samples["total"]) if samples["total"] else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_traced_mb": traced_peak,
+        "stages": {stage: summarize(samples[stage]) for stage in BENCHMARK_STAGES},
+    }
+
+
+def parse_backends(text, default_predictor):
+    """[(detector, predictor)] from "hog,haar,hog:eyes.dat"-style text"""
+    backends = []
+    for item in text.split(","):
+        detector, _, predictor = item.strip().partition(":")
+        if detector not in FACE_DETECTORS:
+            raise SystemExit(f"Unknown face detector {detector!r}, expected one of {', '.join(FACE_DETECTORS)}")
+        backends.append((detector, predictor or default_predictor))
+    return backends
+
+
+def compare_backends(backends, make_pipeline, make_frames, warmup=10):
+    """Run the same frames through each (detector, predictor) backend
+
+    Returns a row per backend with model load time, detector and landmark
+    timing and accuracy against the first backend: how many of its faces were
+    found, the eye landmark error normalised by its interocular distance (NME),
+    and the mean raw gaze difference.
+    """
+    rows = []
+    reference = None
+    for detector, predictor in backends:
+        load_start = time.perf_counter()
+        try:
+            pipeline = make_pipeline(detector, predictor)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {detector} + {os.path.basename(predictor)}: {e}\n")
+            continue
+        load_s = time.perf_counter() - load_start
+
+        outputs = {}
+
+        def keep(index, result):
+            if result.landmarks is not None:
+                outputs[index] = (result.landmarks[EYES].astype(np.float64), result.raw_gaze)
+
+        report = run_benchmark(pipeline, make_frames(), warmup, render_size=None, on_result=keep)
+        stages = report["stages"]
+        row = {
+            "detector": detector,
+            "predictor": os.path.basename(predictor),
+            "eyes_only": pipeline.landmark_predictor.eyes_only,
+            "model_mb": os.path.getsize(predictor) / (1024 * 1024),
+            "load_s": load_s,
+            "face_detector_p50": stages["face_detector"].get("p50"),
+            "landmark_predictor_p50": stages["landmark_predictor"].get("p50"),
+            "total_p95": stages["total"].get("p95"),
+            "pipeline_fps": report["pipeline_fps"],
+            "face_frames": report["face_frames"],
+            "detector_runs": report["detector_runs"],
+        }
+        if reference is None:
+            reference = outputs
+        else:
+            common = [index for index in reference if index in outputs]
+            row["recall"] = len(common) / len(reference) if reference else None
+            errors, gaze_errors = [], []
+            for index in common:
+                ref_eyes, ref_gaze = reference[index]
+                eyes, gaze = outputs[index]
+                interocular = np.linalg.norm(ref_eyes[:6].mean(axis=0) - ref_eyes[6:].mean(axis=0))
+                errors.append(np.linalg.norm(eyes - ref_eyes, axis=1).mean() / max(interocular, 1.0))
+                gaze_errors.append(np.hypot(gaze[0] - ref_gaze[0], gaze[1] - ref_gaze[1]))
+            row["eye_nme"] = float(np.mean(errors)) if errors else None
+            row["gaze_error"] = float(np.mean(gaze_errors)) if gaze_errors else None
+        rows.append(row)
+    return rows
+
+
+def print_backends(rows):
+    print(f"{'backend':<40}{'load s':>8}{'detect':>9}{'marks':>9}{'p95':>9}{'fps':>8}"
+          f"{'faces':>7}{'recall':>8}{'NME':>8}{'gaze':>8}")
+    for row in rows:
+        name = f"{row['detector']} + {row['predictor']}"
+        accuracy = ""
+        for key in ("recall", "eye_nme", "gaze_error"):
+            if key not in row:
+                accuracy += f"{'ref':>8}"
+            elif row[key] is None:
+                accuracy += f"{'-':>8}"
+            else:
+                accuracy += f"{row[key]:>8.3f}"
+        print(f"{name:<40}{row['load_s']:>8.2f}{row['face_detector_p50'] or 0:>9.2f}"
+              f"{row['landmark_predictor_p50'] or 0:>9.2f}{row['total_p95'] or 0:>9.2f}"
+              f"{row['pipeline_fps']:>8.1f}{row['face_frames']:>7}{accuracy}")
+    print("\nTimes are p50 ms (p95 for the total). Accuracy is against the first backend: recall of its\n"
+          "faces, eye landmark error / interocular distance, mean raw gaze difference.")
+
+
+def compare_reports(report, baseline, max_regression):
+    """Print how report differs from baseline, returning the list of regressions
+
+    A stage regresses when its p95 grows by more than max_regression percent,
+    throughput when it drops by more than that.
+    """
+    regressions = []
+    print(f"\n{'stage':<22}{'baseline p95':>14}{'p95':>10}{'change':>10}")
+    for stage, summary in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {})
+        if not summary.get("count") or not old.get("count"):
+            continue
+        change = (summary["p95"] - old["p95"]) / old["p95"] * 100 if old["p95"] > 0 else 0.0
+        flag = ""
+        # Ignore sub-0.05 ms stages, their percentiles are mostly timer noise
+        if change > max_regression and summary["p95"] - old["p95"] > 0.05:
+            regressions.append(f"{stage} p95 {old['p95']:.2f} -> {summary['p95']:.2f} ms")
+            flag = "  REGRESSION"
+        print(f"{stage:<22}{old['p95']:>14.2f}{summary['p95']:>10.2f}{change:>+9.1f}%{flag}")
+
+    old_fps = baseline.get("throughput_fps") or 0.0
+    if old_fps > 0:
+        change = (report["throughput_fps"] - old_fps) / old_fps * 100
+        print(f"{'throughput fps':<22}{old_fps:>14.1f}{report['throughput_fps']:>10.1f}{change:>+9.1f}%")
+        if -change > max_regression:
+            regressions.append(f"throughput {old_fps:.1f} -> {report['throughput_fps']:.1f} fps")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'stage':<22}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for stage, summary in report["stages"].items():
+        if not summary["count"]:
+            continue
+        print(f"{stage:<22}{summary['count']:>7}{summary['mean']:>9.2f}{summary['p50']:>9.2f}"
+              f"{summary['p95']:>9.2f}{summary['p99']:>9.2f}{summary['max']:>9.2f}")
+    print(f"\n{report['frames']} frames in {report['elapsed_s']:.2f}s: {report['throughput_fps']:.1f} fps "
+          f"end to end, {report['pipeline_fps']:.1f} fps pipeline only")
+    print(f"Face found in {report['face_frames']}, full detector ran on {report['detector_runs']}, "
+          f"landmarks and gaze reused on {report.get('reused_frames', 0)}, "
+          f"eye landmarks followed by flow on {report.get('flow_frames', 0)}")
+    if report.get("ear_jitter") is not None:
+        print(f"{report['blinks']} blinks, mean frame-to-frame EAR change {report['ear_jitter']:.4f}")
+    if report["peak_rss_mb"] is not None:
+        print(f"Peak RSS {report['peak_rss_mb']:.1f} MB", end="")
+        if report["peak_traced_mb"] is not None:
+            print(f", peak traced Python/NumPy allocations {report['peak_traced_mb']:.1f} MB", end="")
+        print()
+
+
+def main():
+    """Replay a recording or a synthetic face sequence through the pipeline and time each stage"""
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark for the gaze pipeline")
+    parser.add_argument("--video", help="recorded video to replay (default: synthetic face sequence)")
+    parser.add_argument("--frames", type=int, default=600,
+                        help="frames to measure (synthetic length, or a cap on the video)")
+    parser.add_argument("--warmup", type=int, default=10, help="initial frames left out of the numbers")
+    parser.add_argument("--synthetic-size", default="640x480", help="synthetic frame size WxH")
+    parser.add_argument("--screen", default="1920x1080", help="virtual screen size WxH")
+    parser.add_argument("--regions", type=int, default=9, help="number of targets on the board to hit-test")
+    parser.add_argument("--render-size", default="1280x720",
+                        help="preview size the render stage scales to, or 'off'")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="68-point or 12-point eye-only dlib shape predictor")
+    parser.add_argument("--detector", choices=tuple(FACE_DETECTORS), default="hog", help="face detector backend")
+    parser.add_argument("--backends",
+                        help="compare backends instead, e.g. hog,haar,lbp,dnn,hog:shape_predictor_eyes_12.dat "
+                             "(detector[:predictor], accuracy relative to the first)")
+    parser.add_argument("--detect-width", type=int, default=320)
+    parser.add_argument("--face-tracking", choices=FACE_TRACKING_MODES, default="landmarks")
+    parser.add_argument("--debug-level", choices=DEBUG_LEVELS, default="off")
+    parser.add_argument("--pupil", choices=PUPIL_METHODS, default="threshold", help="pupil locator")
+    parser.add_argument("--no-motion-gate", action="store_true",
+                        help="run landmarks and pupil search on every frame, even when the eyes haven't changed")
+    parser.add_argument("--landmark-flow", action="store_true",
+                        help="follow the eye landmarks with optical flow between shape predictor runs")
+    parser.add_argument("--smoothing", choices=tuple(GAZE_FILTERS), default="moving_average")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="run the pipeline in a separate process over shared memory, as the UI can")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also track peak Python/NumPy allocations (slows the run down)")
+    parser.add_argument("--output", help="write the JSON report here ('-' for stdout)")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="percent p95/throughput regression vs --compare that fails the run")
+    args = parser.parse_args()
+
+    startup = StartupTimer()
+    startup.mark("imports")
+
+    screen_width, screen_height = (int(v) for v in args.screen.lower().split("x"))
+
+    def make_pipeline(detector, predictor):
+        if args.inference_process:
+            pipeline = RemotePipeline(screen_width, screen_height, predictor, detector)
+        else:
+            pipeline = GazePipeline(screen_width, screen_height, predictor_path=predictor, detector=detector)
+        pipeline.detection_width = args.detect_width
+        pipeline.face_tracking = args.face_tracking
+        pipeline.debug_level = args.debug_level
+        pipeline.pupil_method = args.pupil
+        pipeline.motion_gating = not args.no_motion_gate
+        pipeline.landmark_flow = args.landmark_flow
+        # Laid out as the UI lays out a board; a board too big for one screen is hit-tested on its first page
+        pipeline.regions = grid_pages([f"R{i + 1}" for i in range(args.regions)], screen_width, screen_height)[0]
+        pipeline.load_models()
+        pipeline.set_smoothing(args.smoothing)
+        pipeline.reset()
+        return pipeline
+
+    total_frames = args.frames + args.warmup
+    capture = None
+
+    def make_frames():
+        nonlocal capture
+        if args.video:
+            if capture is not None:
+                capture.release()
+            capture = cv2.VideoCapture(args.video)
+            if not capture.isOpened():
+                raise SystemExit(f"Could not open {args.video}")
+            return video_frames(capture, total_frames, video_time=True)
+        width, height = (int(v) for v in args.synthetic_size.lower().split("x"))
+        return synthetic_frames(total_frames, width, height)
+
+    if args.backends:
+        if args.inference_process:
+            raise SystemExit("--backends runs in-process, leave out --inference-process")
+        rows = compare_backends(parse_backends(args.backends, args.predictor), make_pipeline, make_frames,
+                                args.warmup)
+        if capture is not None:
+            capture.release()
+        print_backends(rows)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"source": args.video or f"synthetic {args.synthetic_size}", "backends": rows,
+                           "environment": environment(), "created_at": time.time()}, f, indent=1)
+        return
+
+    pipeline = make_pipeline(args.detector, args.predictor)
+    startup.mark("models")
+    frames = make_frames()
+
+    render_size = None
+    if args.render_size.lower() != "off":
+        render_size = tuple(int(v) for v in args.render_size.lower().split("x"))
+
+    try:
+        report = run_benchmark(pipeline, frames, args.warmup, render_size, args.trace_memory)
+    finally:
+        if capture is not None:
+            capture.release()
+        if args.inference_process:
+            pipeline.close()
+
+    report["source"] = args.video or f"synthetic {args.synthetic_size}"
+    report["settings"] = {
+        "detector": args.detector,
+        "predictor": os.path.basename(args.predictor),
+        "detect_width": args.detect_width,
+        "face_tracking": args.face_tracking,
+        "debug_level": args.debug_level,
+        "pupil": args.pupil,
+        "motion_gate": not args.no_motion_gate,
+        "landmark_flow": args.landmark_flow,
+        "smoothing": args.smoothing,
+        "regions": args.regions,
+        "inference_process": args.inference_process,
+        "render_size": args.render_size,
+    }
+    report["startup_s"] = dict(startup.marks)
+    report["environment"] = environment()
+    report["created_at"] = time.time()
+
+    if args.output != "-":
+        print_report(report)
+    if args.output:
+        text = json.dumps(report, indent=1)
+        if args.output == "-":
+            print(text)
+        else:
+            with open(args.output, "w") as f:
+                f.write(text)
+            print(f"Report written to {args.output}")
+
+    # Without a face only preprocessing, detection and rendering were measured
+    if not report["face_frames"]:
+        print(f"\nNo face was found in any of the {report['frames']} frames from {report['source']}, "
+              f"so the landmark, gaze and hit-test stages weren't measured; "
+              f"benchmark a recording with --video", file=sys.stderr)
+        raise SystemExit(1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.max_regression)
+        if regressions:
+            print("\nRegressed beyond {:.0f}%:\n  {}".format(args.max_regression, "\n  ".join(regressions)))
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
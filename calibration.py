@@ -0,0 +1,126 @@
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+
+def polynomial_terms(points, degree):
+    """Design matrix of 2D polynomial terms up to `degree` for (N, 2) points
+
+    Degree 1 gives [1, x, y], degree 2 adds [xy, x^2, y^2].
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+    x, y = points[:, 0], points[:, 1]
+    terms = [np.ones_like(x)]
+    for total in range(1, degree + 1):
+        for power_y in range(total + 1):
+            terms.append(x ** (total - power_y) * y ** power_y)
+    return np.stack(terms, axis=1)
+
+
+def term_count(degree):
+    return (degree + 1) * (degree + 2) // 2
+
+
+class CalibrationModel:
+    """Least-squares polynomial mapping from raw eye gaze to screen position (both 0-1)"""
+
+    def __init__(self, coefficients, degree, residuals=None):
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)  # (terms, 2)
+        self.degree = degree
+        self.residuals = [] if residuals is None else list(residuals)
+
+    @classmethod
+    def fit(cls, raw_points, screen_points, max_degree=2):
+        """Fit the highest degree the number of points supports (at most max_degree)"""
+        raw_points = np.asarray(raw_points, dtype=np.float64)
+        screen_points = np.asarray(screen_points, dtype=np.float64)
+        if len(raw_points) < term_count(1):
+            raise ValueError(f"Need at least {term_count(1)} calibration points, got {len(raw_points)}")
+
+        degree = max_degree
+        while term_count(degree) > len(raw_points):
+            degree -= 1
+
+        terms = polynomial_terms(raw_points, degree)
+        coefficients, *_ = np.linalg.lstsq(terms, screen_points, rcond=None)
+
+        # Per-point distance between where the fit puts each sample and where it should be
+        residuals = np.linalg.norm(terms @ coefficients - screen_points, axis=1)
+        return cls(coefficients, degree, residuals)
+
+    def apply(self, x, y):
+        """Map one raw gaze sample to calibrated screen fractions"""
+        mapped = polynomial_terms((x, y), self.degree) @ self.coefficients
+        return float(mapped[0, 0]), float(mapped[0, 1])
+
+    @property
+    def mean_error(self):
+        return float(np.mean(self.residuals)) if len(self.residuals) else 0.0
+
+    @property
+    def max_error(self):
+        return float(np.max(self.residuals)) if len(self.residuals) else 0.0
+
+    def to_dict(self):
+        return {
+            "degree": self.degree,
+            "coefficients": self.coefficients.round(6).tolist(),
+            "residuals": [round(float(r), 6) for r in self.residuals],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["coefficients"], data["degree"], data.get("residuals"))
+
+
+def draw_calibration_target(frame, target, screen_width):
+    """Draw the current calibration point and instructions on a BGR frame"""
+    import cv2
+
+    calib_x, calib_y = target
+
+    # Draw calibration point
+    cv2.circle(frame, (calib_x, calib_y), 20, (0, 255, 0), -1)
+    cv2.circle(frame, (calib_x, calib_y), 22, (255, 255, 255), 2)
+
+    # Draw instruction text
+    cv2.putText(frame, "Look at the green dot and blink",
+               (int(screen_width/2 - 200), 50),
+               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+
+def profile_path(patient, directory=PROFILE_DIR):
+    """File holding a patient's calibration profile"""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", patient.strip()) or "default"
+    return os.path.join(directory, f"{safe_name}.json")
+
+
+def save_profile(patient, model, directory=PROFILE_DIR, **extra):
+    """Write a patient's calibration to disk, returning the file path"""
+    os.makedirs(directory, exist_ok=True)
+    path = profile_path(patient, directory)
+    data = {"patient": patient, "saved_at": time.time(), "calibration": model.to_dict()}
+    data.update(extra)
+
+    # Write to a temporary file first so a crash can't leave a truncated profile
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_profile(patient, directory=PROFILE_DIR):
+    """Load a patient's calibration, or None if they have no profile yet"""
+    path = profile_path(patient, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    return CalibrationModel.from_dict(data["calibration"])
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+
+CAMERA_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera.json")
+
+# OpenCV capture backends by name (cv2.CAP_<NAME>)
+CAPTURE_BACKENDS = ("any", "v4l2", "dshow", "msmf", "avfoundation", "gstreamer", "ffmpeg")
+
+
+@dataclass
+class CaptureSettings:
+    """How the camera is opened; zero width/height/fps keep the camera defaults"""
+    device: str = "0"          # camera index or a device path / URL
+    backend: str = "any"
+    width: int = 0
+    height: int = 0
+    fps: float = 0
+    mjpeg: bool = False        # ask for MJPEG instead of raw YUYV (more fps at high resolutions)
+    buffer_size: int = 1       # driver-side frame buffering; 1 keeps latency lowest
+    newest_only: bool = True   # only decode the frame a consumer is waiting for
+
+    @classmethod
+    def load(cls, path=CAMERA_CONFIG):
+        """Read settings from a JSON file, falling back to defaults"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        known = {key: value for key, value in data.items() if key in cls.__dataclass_fields__}
+        return cls(**known)
+
+    def save(self, path=CAMERA_CONFIG):
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=1)
+
+    def describe(self, capture):
+        """What the camera actually agreed to, e.g. '1280x720 @ 30 fps MJPG'"""
+        import cv2
+
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        code = int(capture.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\0 ") or "?"
+        return f"{width}x{height} @ {fps:.0f} fps {fourcc}"
+
+
+def open_capture(settings):
+    """Open and configure a cv2.VideoCapture from CaptureSettings"""
+    import cv2
+
+    device = settings.device
+    if isinstance(device, str) and device.strip().isdigit():
+        device = int(device)
+    backend = getattr(cv2, f"CAP_{settings.backend.upper()}", cv2.CAP_ANY)
+    capture = cv2.VideoCapture(device, backend)
+    if not capture.isOpened():
+        return capture
+
+    # The format has to be chosen before the resolution on most UVC drivers
+    if settings.mjpeg:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    if settings.width and settings.height:
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings.width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.height)
+    if settings.fps:
+        capture.set(cv2.CAP_PROP_FPS, settings.fps)
+    if settings.buffer_size:
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, settings.buffer_size)
+    return capture
+
+
+class LatestFrameQueue:
+    """Single-slot hand-off between pipeline stages that only keeps the newest item
+
+    A producer never blocks: putting a new item overwrites one the consumer has
+    not picked up yet, and the overwrite is counted as a dropped item.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.closed = False
+        self.waiting = 0
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        """Store an item, replacing (and counting) any stale one"""
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Take the newest item, waiting up to timeout; None if nothing arrived"""
+        with self._cond:
+            if self._item is None and not self.closed:
+                self.waiting += 1
+                self._cond.wait(timeout)
+                self.waiting -= 1
+            item, self._item = self._item, None
+            return item
+
+    def wanted(self):
+        """Whether a consumer is blocked in get() right now"""
+        with self._cond:
+            return self.waiting > 0
+
+    def get_nowait(self):
+        """Take the newest item if there is one"""
+        with self._cond:
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """Wake up any waiting consumer; later gets return immediately"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CaptureThread(threading.Thread):
+    """Reads a camera as fast as it delivers, keeping only the newest frame
+
+    With newest_only every frame is grabbed, which drains the driver buffer,
+    but a frame is only decoded when a consumer is already waiting for it, so
+    nothing decoded ever sits around going stale; skipped grabs are counted
+    in `skipped`. Otherwise every frame is read and decoded.
+
+    Frames are timestamped when grabbed, before decoding. Setting
+    frame_interval hands on at most one frame per that many seconds, the rest
+    are grabbed and skipped without decoding (used to idle at a low rate).
+
+    Frames are decoded into a ring of ring_size reused buffers (0 allocates a
+    new image per read); consumers must copy a frame before ring_size more
+    frames have been captured.
+    """
+
+    def __init__(self, capture, frames, ring_size=4, newest_only=True):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.frames = frames
+        self.newest_only = newest_only
+        self.failed = False
+        self.skipped = 0
+        self.frame_interval = 0.0
+        self.last_put = 0.0
+        self._ring = [None] * ring_size
+        self._stop_event = threading.Event()
+
+    def run(self):
+        index = 0
+        while not self._stop_event.is_set():
+            buffer = self._ring[index] if self._ring else None
+            throttled = time.time() - self.last_put < self.frame_interval
+            if self.newest_only or throttled:
+                if not self.capture.grab():
+                    self.failed = True
+                    break
+                captured_at = time.time()
+                if throttled or not self.frames.wanted():
+                    self.skipped += 1
+                    continue
+                ret, frame = self.capture.retrieve(buffer) if buffer is not None else self.capture.retrieve()
+            else:
+                ret, frame = self.capture.read(buffer) if buffer is not None else self.capture.read()
+                captured_at = time.time()
+            if not ret:
+                self.failed = True
+                break
+
+            if self._ring:
+                self._ring[index] = frame
+                index = (index + 1) % len(self._ring)
+            self.last_put = captured_at
+            self.frames.put((frame, captured_at))
+        self.frames.close()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,257 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass, field
+
+
+SINKS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sinks.json")
+
+
+@dataclass
+class SelectionEvent:
+    """A dwell selection, as handed to event sinks"""
+    region: str
+    timestamp: float                 # when the selection was made (time.time())
+    source: str = ""                 # bed or unit name
+    patient: str = ""
+    details: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class EventSink:
+    """Somewhere selection events are delivered to
+
+    send() gets a list of events and should raise on failure; it is always
+    called from the sink's own dispatcher thread, so it may block.
+    """
+    name = "sink"
+
+    def send(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LogFileSink(EventSink):
+    """Appends each event as a JSON line"""
+    name = "log"
+
+    def __init__(self, path="selections.log"):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event.to_dict()) + "\n")
+
+
+class WebhookSink(EventSink):
+    """POSTs each batch as a JSON list to an HTTP endpoint (nurse call gateway, etc.)"""
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+
+    def send(self, events):
+        body = json.dumps([event.to_dict() for event in events]).encode()
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class MqttSink(EventSink):
+    """Publishes each event as JSON to an MQTT topic (needs paho-mqtt)"""
+    name = "mqtt"
+
+    def __init__(self, host, topic="eyetracker/selections", port=1883, qos=1):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise ImportError("MqttSink needs paho-mqtt: pip install paho-mqtt")
+        self.topic = topic
+        self.qos = qos
+        self.client = mqtt.Client()
+        self.client.connect(host, port)
+        self.client.loop_start()
+
+    def send(self, events):
+        for event in events:
+            info = self.client.publish(self.topic, json.dumps(event.to_dict()), qos=self.qos)
+            info.wait_for_publish(timeout=5.0)
+            if not info.is_published():
+                raise IOError(f"MQTT publish to {self.topic} timed out")
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class MemorySink(EventSink):
+    """Keeps delivered events in a list; can be made slow or flaky to test the dispatcher"""
+    name = "memory"
+
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures  # number of send() calls that raise before it starts working
+        self.events = []
+        self.batches = 0
+
+    def send(self, events):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError("simulated sink failure")
+        self.events.extend(events)
+        self.batches += 1
+
+
+EVENT_SINKS = {
+    "log": LogFileSink,
+    "webhook": WebhookSink,
+    "mqtt": MqttSink,
+    "memory": MemorySink,
+}
+
+
+def create_sink(config):
+    """Build a sink from a config dict like {"type": "webhook", "url": ...}"""
+    config = dict(config)
+    kind = config.pop("type")
+    try:
+        sink_class = EVENT_SINKS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown event sink {kind!r}, expected one of {', '.join(EVENT_SINKS)}")
+    return sink_class(**config)
+
+
+class SinkWorker(threading.Thread):
+    """Delivers queued events to one sink in batches, retrying failures with backoff
+
+    Each sink has its own bounded queue, so a slow or unreachable sink only
+    ever delays itself. When the queue is full the oldest event is dropped.
+    """
+
+    def __init__(self, sink, max_pending=1000, max_batch=20, batch_window=0.05,
+                 max_retries=5, retry_delay=0.5, max_retry_delay=30.0):
+        super().__init__(daemon=True, name=f"sink-{sink.name}")
+        self.sink = sink
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.pending = queue.Queue(max_pending)
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self._stop_event = threading.Event()
+
+    def offer(self, event):
+        """Queue an event without ever blocking"""
+        while True:
+            try:
+                self.pending.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.pending.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def next_batch(self):
+        """Wait for an event, then collect more for up to batch_window seconds"""
+        try:
+            batch = [self.pending.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.pending.get(timeout=remaining) if remaining > 0
+                             else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def deliver(self, batch):
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.send(batch)
+                self.delivered += len(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Event sink {self.sink.name} gave up on {len(batch)} events: {e}", file=sys.stderr)
+                    break
+                self.retries += 1
+                # Still retry on shutdown, but without waiting
+                if self._stop_event.wait(delay):
+                    delay = 0
+                delay = min(delay * 2, self.max_retry_delay)
+        self.failed += len(batch)
+        return False
+
+    def run(self):
+        while not (self._stop_event.is_set() and self.pending.empty()):
+            batch = self.next_batch()
+            if batch:
+                self.deliver(batch)
+        self.sink.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class EventDispatcher:
+    """Fans selection events out to sinks without ever blocking the caller"""
+
+    def __init__(self, sinks=(), **worker_options):
+        self.workers = [SinkWorker(sink, **worker_options) for sink in sinks]
+        for worker in self.workers:
+            worker.start()
+
+    def publish(self, event):
+        for worker in self.workers:
+            worker.offer(event)
+
+    def stats(self):
+        """Totals over all sinks"""
+        return {key: sum(getattr(worker, key) for worker in self.workers)
+                for key in ("delivered", "failed", "dropped", "retries")}
+
+    def close(self, timeout=2.0):
+        """Try to flush what is queued for up to timeout seconds, then give up"""
+        for worker in self.workers:
+            worker.stop()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+
+def load_sinks(path=SINKS_CONFIG):
+    """Sinks listed in a JSON file ({"sinks": [{"type": ...}, ...]}); none if it doesn't exist"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        config = json.load(f)
+    sinks = []
+    for sink_config in config.get("sinks", []):
+        try:
+            sinks.append(create_sink(sink_config))
+        except Exception as e:
+            print(f"Skipping event sink {sink_config.get('type')}: {e}", file=sys.stderr)
+    return sinks
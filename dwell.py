@@ -0,0 +1,181 @@
+import math
+import statistics
+
+
+def find_region(regions, screen_x, screen_y):
+    """Return the name of the region (name -> (x1, y1, x2, y2)) containing a screen point, if any"""
+    for name, (x1, y1, x2, y2) in regions.items():
+        if x1 <= screen_x <= x2 and y1 <= screen_y <= y2:
+            return name
+    return None
+
+
+class RegionIndex:
+    """Uniform grid over the screen for constant-time gaze to region lookup
+
+    Every grid cell lists the regions overlapping it, in the regions' order,
+    so find() only tests the one or two regions near the point instead of
+    all of them and gives the same answer as find_region. The cell size
+    defaults to the median region side, so a cell overlaps a handful of
+    regions at most.
+    """
+
+    def __init__(self, regions, cell_size=None):
+        self.regions = regions
+        if cell_size is None:
+            sides = [min(x2 - x1, y2 - y1) for x1, y1, x2, y2 in regions.values()]
+            cell_size = int(statistics.median(sides)) if sides else 100
+        self.cell_size = max(1, cell_size)
+        self.cells = {}
+        for name, (x1, y1, x2, y2) in regions.items():
+            for cell_x in range(int(x1 // self.cell_size), int(x2 // self.cell_size) + 1):
+                for cell_y in range(int(y1 // self.cell_size), int(y2 // self.cell_size) + 1):
+                    self.cells.setdefault((cell_x, cell_y), []).append(name)
+
+    def find(self, screen_x, screen_y, current=None, hysteresis=0):
+        """Name of the region containing a screen point, if any
+
+        With hysteresis, the current region (the one the gaze was on) still
+        counts for points up to that many pixels outside it, so gaze jitter
+        along a border between two targets doesn't flip between them.
+        """
+        if hysteresis and current in self.regions:
+            x1, y1, x2, y2 = self.regions[current]
+            if (x1 - hysteresis <= screen_x <= x2 + hysteresis
+                    and y1 - hysteresis <= screen_y <= y2 + hysteresis):
+                return current
+        for name in self.cells.get((screen_x // self.cell_size, screen_y // self.cell_size), ()):
+            x1, y1, x2, y2 = self.regions[name]
+            if x1 <= screen_x <= x2 and y1 <= screen_y <= y2:
+                return name
+        return None
+
+
+class DwellTimer:
+    """Gaze lock timing: a region is selected once the gaze has stayed on it for lock_time seconds
+
+    Kept free of OpenCV and dlib so recorded sessions can be replayed through it.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.locked_region = None
+        self.lock_start_time = None
+
+    def update(self, region, current_time, lock_time):
+        """Advance the lock for the region under the gaze, returning (progress 0-100, selected)"""
+        if region is None:
+            self.reset()
+            return 0.0, False
+
+        # Check for gaze lock on region
+        if self.locked_region != region:
+            self.locked_region = region
+            self.lock_start_time = current_time
+            return 0.0, False
+
+        # Calculate progress towards selection
+        lock_duration = current_time - self.lock_start_time
+        progress = min(100, (lock_duration / lock_time) * 100)
+
+        # Check if gaze lock is complete
+        if lock_duration >= lock_time:
+            # Reset lock, holding the gaze selects again after another lock_time
+            self.lock_start_time = current_time
+            return progress, True
+        return progress, False
+
+
+def default_regions(screen_width, screen_height, region_size=150, margin=50):
+    """The standard five regions: one in each corner of the screen and one in the center"""
+    center_x = screen_width // 2
+    center_y = screen_height // 2
+    return {
+        "Food": (screen_width - margin - region_size, margin,
+                 screen_width - margin, margin + region_size),  # Top right
+        "Water": (margin, margin,
+                  margin + region_size, margin + region_size),  # Top left
+        "Medicine": (screen_width - margin - region_size, screen_height - margin - region_size,
+                     screen_width - margin, screen_height - margin),  # Bottom right
+        "Help": (margin, screen_height - margin - region_size,
+                 margin + region_size, screen_height - margin),  # Bottom left
+        "Rest": (center_x - region_size // 2, center_y - region_size // 2,
+                 center_x + region_size // 2, center_y + region_size // 2),  # Center
+    }
+
+
+# Page turning targets added to every page when a board doesn't fit on one screen
+PREVIOUS_PAGE = "< Previous"
+NEXT_PAGE = "Next >"
+
+
+def grid_pages(names, screen_width, screen_height, region_size=150, margin=50, gap=20):
+    """Arrange any number of named targets in grids of region_size squares, a page per screen
+
+    Returns a list of pages, each a regions dict (name -> (x1, y1, x2, y2)).
+    Targets that fit on one page get a grid of about the screen's shape
+    with only as many cells as they need; a board that doesn't fit gets the
+    most cells that fit with `gap` between them, and the bottom-left and
+    bottom-right cells of every page hold PREVIOUS_PAGE and NEXT_PAGE
+    targets (turning past either end wraps around). Either way the cells
+    are spread evenly over the screen inside margin.
+    """
+    names = list(names)
+    width, height = screen_width - 2 * margin, screen_height - 2 * margin
+    step = region_size + gap
+    columns = max(1, (width + gap) // step)
+    rows = max(1, (height + gap) // step)
+    if len(names) <= columns * rows:
+        # About sqrt(n) columns, stretched to the screen's aspect ratio
+        columns = max(1, min(columns, len(names), round(math.sqrt(len(names) * width / height))))
+        rows = max(1, math.ceil(len(names) / columns))
+
+    def cell(index):
+        row, column = divmod(index, columns)
+        x1 = margin + int((column + 0.5) * width / columns) - region_size // 2
+        y1 = margin + int((row + 0.5) * height / rows) - region_size // 2
+        return x1, y1, x1 + region_size, y1 + region_size
+
+    capacity = columns * rows
+    if len(names) <= capacity:
+        return [{name: cell(index) for index, name in enumerate(names)}]
+
+    # Paging: the two corner cells of the last row are reserved for navigation
+    if columns < 2 or capacity < 3:
+        raise ValueError(f"A {region_size} px grid on a {screen_width}x{screen_height} screen "
+                         f"has no room for page navigation")
+    navigation = {PREVIOUS_PAGE: capacity - columns, NEXT_PAGE: capacity - 1}
+    free_cells = [index for index in range(capacity) if index not in navigation.values()]
+    pages = []
+    for start in range(0, len(names), len(free_cells)):
+        page = {name: cell(index) for name, index in zip(names[start:start + len(free_cells)], free_cells)}
+        page.update((name, cell(index)) for name, index in navigation.items())
+        pages.append(page)
+    return pages
+
+
+def board_pages(custom_names, screen_width, screen_height, region_size=150, margin=50):
+    """Pages of the standard regions plus custom ones, widely spaced while they allow it
+
+    Up to four custom regions go in the middle of the screen edges that
+    default_regions leaves free (left, right, top, bottom), so the board
+    stays a 3x3 pattern that is easy to hit. Past that, everything is laid
+    out by grid_pages.
+    """
+    regions = default_regions(screen_width, screen_height, region_size, margin)
+    center_x, center_y = screen_width // 2, screen_height // 2
+    half = region_size // 2
+    edges = [
+        (margin, center_y - half, margin + region_size, center_y + half),  # Middle left
+        (screen_width - margin - region_size, center_y - half,
+         screen_width - margin, center_y + half),  # Middle right
+        (center_x - half, margin, center_x + half, margin + region_size),  # Top center
+        (center_x - half, screen_height - margin - region_size,
+         center_x + half, screen_height - margin),  # Bottom center
+    ]
+    if len(custom_names) > len(edges):
+        return grid_pages(list(regions) + list(custom_names), screen_width, screen_height, region_size, margin)
+    regions.update(zip(custom_names, edges))
+    return [regions]
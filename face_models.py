@@ -0,0 +1,180 @@
+import argparse
+import os
+import xml.etree.ElementTree as ET
+
+import cv2
+import numpy as np
+
+
+# Rows of the (68, 2) landmark array (iBUG 300-W numbering)
+LEFT_EYE = slice(36, 42)
+RIGHT_EYE = slice(42, 48)
+EYES = slice(36, 48)
+ALL_POINTS = slice(0, 68)
+
+CASCADES_URL = "https://github.com/opencv/opencv/tree/4.x/data"
+LBP_CASCADE_PATH = "lbpcascade_frontalface_improved.xml"
+DNN_PROTOTXT_PATH = "deploy.prototxt"
+DNN_MODEL_PATH = "res10_300x300_ssd_iter_140000.caffemodel"
+DNN_MODEL_URL = "https://github.com/opencv/opencv/tree/4.x/samples/dnn/face_detector"
+EYE_PREDICTOR_PATH = "shape_predictor_eyes_12.dat"
+
+
+def require_file(path, what, url):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Could not find the {what} at: {path}\n\nPlease download it from:\n{url}")
+
+
+def haar_cascade_path():
+    """The frontal face Haar cascade that ships with opencv-python, if it does"""
+    data = getattr(cv2, "data", None)
+    folder = data.haarcascades if data is not None else ""
+    return os.path.join(folder, "haarcascade_frontalface_default.xml")
+
+
+class HogFaceDetector:
+    """dlib's HOG + linear SVM frontal face detector, the box the 68-point model was trained on"""
+
+    def __init__(self, upsample=0):
+        import dlib
+        self.detector = dlib.get_frontal_face_detector()
+        self.upsample = upsample
+
+    def __call__(self, gray):
+        return [(r.left(), r.top(), r.right(), r.bottom()) for r in self.detector(gray, self.upsample)]
+
+
+class CascadeFaceDetector:
+    """OpenCV Haar or LBP cascade: cheaper than HOG, but looser boxes and more false positives"""
+
+    def __init__(self, path=None, scale_factor=1.1, min_neighbors=5, min_size=30):
+        path = path or haar_cascade_path()
+        require_file(path, "face cascade", CASCADES_URL)
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load the face cascade {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def __call__(self, gray):
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                              minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return [(int(x), int(y), int(x + w), int(y + h)) for x, y, w, h in boxes]
+
+
+class DnnFaceDetector:
+    """OpenCV's ResNet-10 SSD face detector: copes best with pose and lighting, slowest on a CPU"""
+
+    def __init__(self, prototxt=DNN_PROTOTXT_PATH, model=DNN_MODEL_PATH, confidence=0.5, input_size=300):
+        require_file(prototxt, "DNN face detector config", DNN_MODEL_URL)
+        require_file(model, "DNN face detector weights", DNN_MODEL_URL)
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+        self.input_size = (input_size, input_size)
+        self.color = None
+
+    def __call__(self, gray):
+        h, w = gray.shape[:2]
+        if self.color is None or self.color.shape[:2] != (h, w):
+            self.color = np.empty((h, w, 3), np.uint8)
+        cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=self.color)
+        self.net.setInput(cv2.dnn.blobFromImage(self.color, 1.0, self.input_size, (104.0, 177.0, 123.0)))
+        detections = self.net.forward()[0, 0]  # (N, 7): image, class, confidence, box
+        boxes = detections[detections[:, 2] >= self.confidence, 3:7] * (w, h, w, h)
+        return [tuple(int(v) for v in box) for box in boxes]
+
+
+FACE_DETECTORS = {
+    "hog": HogFaceDetector,
+    "haar": CascadeFaceDetector,
+    "lbp": lambda **params: CascadeFaceDetector(**{"path": LBP_CASCADE_PATH, **params}),
+    "dnn": DnnFaceDetector,
+}
+
+
+def create_face_detector(name, **params):
+    """Build a face detector by its FACE_DETECTORS name
+
+    A detector is called with a grayscale image and returns a list of
+    (left, top, right, bottom) boxes in that image's pixels.
+    """
+    try:
+        detector_class = FACE_DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown face detector {name!r}, expected one of {', '.join(FACE_DETECTORS)}")
+    return detector_class(**params)
+
+
+class ShapePredictorLandmarks:
+    """A dlib shape_predictor whose points are returned in the 68-point layout
+
+    The stock model fills every row. A model trained on just the 12 eye points
+    (36-47, in that order, see make_eye_dataset) fills the EYES rows and leaves
+    the rest zero; it is a fraction of the size and quicker to load and run.
+    `rows` says which rows are real.
+    """
+
+    def __init__(self, path):
+        import dlib
+        self.predictor = dlib.shape_predictor(path)
+        parts = self.predictor.num_parts
+        if parts == 68:
+            self.rows = ALL_POINTS
+        elif parts == 12:
+            self.rows = EYES
+        else:
+            raise ValueError(f"{path} predicts {parts} points, expected 68 or the 12 eye points")
+
+    @property
+    def eyes_only(self):
+        return self.rows == EYES
+
+    def __call__(self, gray, face):
+        """(68, 2) int32 landmarks for a dlib.rectangle face box"""
+        landmarks = np.zeros((68, 2), dtype=np.int32)
+        landmarks[self.rows] = [(p.x, p.y) for p in self.predictor(gray, face).parts()]
+        return landmarks
+
+
+def make_eye_dataset(source, destination):
+    """Copy a dlib/iBUG 68-point training XML keeping only the 12 eye points, renumbered 0-11"""
+    tree = ET.parse(source)
+    for box in tree.iter("box"):
+        for part in list(box.findall("part")):
+            index = int(part.get("name"))
+            if EYES.start <= index < EYES.stop:
+                part.set("name", f"{index - EYES.start:02d}")
+            else:
+                box.remove(part)
+    tree.write(destination)
+
+
+def train_eye_predictor(training_xml, output=EYE_PREDICTOR_PATH, threads=4):
+    """Train a 12-point eye predictor on an XML made by make_eye_dataset"""
+    import dlib
+    options = dlib.shape_predictor_training_options()
+    options.num_threads = threads
+    options.be_verbose = True
+    dlib.train_shape_predictor(training_xml, output, options)
+
+
+def main():
+    """Build a small eye-only landmark model from the iBUG 300-W training set"""
+    parser = argparse.ArgumentParser(description="Train a 12-point eye-only shape predictor")
+    parser.add_argument("training_xml", help="dlib training XML with 68-point annotations "
+                                             "(e.g. labels_ibug_300W_train.xml)")
+    parser.add_argument("--output", default=EYE_PREDICTOR_PATH)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    eye_xml = os.path.splitext(args.training_xml)[0] + "_eyes.xml"
+    make_eye_dataset(args.training_xml, eye_xml)
+    train_eye_predictor(eye_xml, args.output, args.threads)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
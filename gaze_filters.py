@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+
+
+class MovingAverageFilter:
+    """Average of the last `window` gaze samples, kept as a running sum over a ring buffer"""
+
+    def __init__(self, window=10):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.samples = np.zeros((self.window, 2))
+        self.total = np.zeros(2)
+        self.count = 0
+        self.index = 0
+        self.value = None
+
+    def update(self, x, y, timestamp):
+        sample = (x, y)
+
+        # Swap the oldest sample out of the running sum
+        self.total += sample
+        self.total -= self.samples[self.index]
+        self.samples[self.index] = sample
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+
+        # Re-sum once per lap of the ring so floating point error can't build up
+        if self.index == 0:
+            self.total = self.samples.sum(axis=0)
+
+        avg_x, avg_y = self.total / self.count
+        self.value = (float(avg_x), float(avg_y))
+        return self.value
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al.): heavy smoothing at rest, little lag on fast moves
+
+    min_cutoff sets the jitter removed during fixations (Hz), beta how quickly
+    the cutoff rises with gaze speed.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.5, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.position = None
+        self.speed = np.zeros(2)
+        self.value = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, x, y, timestamp):
+        sample = np.array((x, y))
+        if self.position is None:
+            self.position = sample
+            self.last_time = timestamp
+            self.value = (x, y)
+            return self.value
+
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            dt = 1 / 30  # repeated timestamps, assume a typical frame interval
+        self.last_time = timestamp
+
+        # Smoothed speed drives the cutoff of the position filter
+        raw_speed = (sample - self.position) / dt
+        a_d = self.alpha(self.d_cutoff, dt)
+        self.speed = a_d * raw_speed + (1 - a_d) * self.speed
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        a = np.array([self.alpha(c, dt) for c in cutoff])
+        self.position = a * sample + (1 - a) * self.position
+
+        self.value = (float(self.position[0]), float(self.position[1]))
+        return self.value
+
+
+class KalmanFilter:
+    """Constant-velocity Kalman filter, run independently on x and y
+
+    process_noise is the expected gaze acceleration variance, measurement_noise
+    the variance of a raw gaze sample, both in screen fractions.
+    """
+
+    def __init__(self, process_noise=10.0, measurement_noise=0.01):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.position = None
+        self.velocity = np.zeros(2)
+        # Covariance entries [[p_pp, p_pv], [p_pv, p_vv]] per axis
+        self.p_pp = np.ones(2)
+        self.p_pv = np.zeros(2)
+        self.p_vv = np.ones(2)
+        self.value = None
+
+    def update(self, x, y, timestamp):
+        measurement = np.array((x, y))
+        if self.position is None:
+            self.position = measurement
+            self.last_time = timestamp
+            self.value = (x, y)
+            return self.value
+
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            dt = 1 / 30
+        self.last_time = timestamp
+
+        # Predict
+        q = self.process_noise
+        self.position = self.position + self.velocity * dt
+        p_pp = self.p_pp + dt * (2 * self.p_pv + dt * self.p_vv) + q * dt ** 4 / 4
+        p_pv = self.p_pv + dt * self.p_vv + q * dt ** 3 / 2
+        p_vv = self.p_vv + q * dt ** 2
+
+        # Correct with the measured position
+        gain_p = p_pp / (p_pp + self.measurement_noise)
+        gain_v = p_pv / (p_pp + self.measurement_noise)
+        innovation = measurement - self.position
+        self.position = self.position + gain_p * innovation
+        self.velocity = self.velocity + gain_v * innovation
+
+        self.p_pp = (1 - gain_p) * p_pp
+        self.p_pv = (1 - gain_p) * p_pv
+        self.p_vv = p_vv - gain_v * p_pv
+
+        self.value = (float(self.position[0]), float(self.position[1]))
+        return self.value
+
+
+GAZE_FILTERS = {
+    "moving_average": MovingAverageFilter,
+    "one_euro": OneEuroFilter,
+    "kalman": KalmanFilter,
+}
+
+
+def create_filter(name, **params):
+    """Build a gaze filter by its GAZE_FILTERS name"""
+    try:
+        return GAZE_FILTERS[name](**params)
+    except KeyError:
+        raise ValueError(f"Unknown gaze filter {name!r}, expected one of {', '.join(GAZE_FILTERS)}")
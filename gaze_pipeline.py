@@ -0,0 +1,1025 @@
+from startup import StartupTimer  # first, see startup.PROCESS_START
+
+import cv2
+import dlib
+import numpy as np
+import time
+import os
+import argparse
+import json
+import threading
+from dataclasses import dataclass, field
+
+from calibration import CalibrationModel, draw_calibration_target, load_profile
+from dwell import DwellTimer, RegionIndex, default_regions
+from face_models import EYES, FACE_DETECTORS, ShapePredictorLandmarks, create_face_detector
+from capture import CAPTURE_BACKENDS, CaptureSettings, CaptureThread, LatestFrameQueue, open_capture
+from gaze_filters import create_filter
+from motion import EyeLandmarkFlow, MotionGate
+from power import PowerScheduler
+from pupil import GradientPupilLocator
+from metrics import MetricsDumper, MetricsServer, PipelineMetrics, describe_pipeline_metrics
+from recording import SessionRecorder
+
+
+PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+PREDICTOR_URL = "http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2"
+
+# Face tracking modes: run the face detector every frame, follow the face box
+# with the landmarks, or follow it with dlib's correlation tracker
+FACE_TRACKING_MODES = ("off", "landmarks", "correlation")
+
+# How much debug drawing goes into the frame: nothing, eye landmarks and gaze
+# point, or additionally the segmented eye crops
+DEBUG_LEVELS = ("off", "summary", "full")
+
+# Pupil locators: Otsu threshold and contour moments per eye, or the batched
+# means-of-gradients search in pupil.py with sub-pixel centres and a confidence
+PUPIL_METHODS = ("threshold", "gradient")
+
+# Stages timed into FrameResult.stage_ms, in pipeline order. face_detector also
+# covers frames where the face box only came from tracking; debug_draw totals all
+# debug drawing, part of which also falls inside the stage it was drawn in.
+PIPELINE_STAGES = ("preprocess", "face_detector", "landmark_predictor", "eye_aspect_ratio",
+                   "process_eye_for_gaze", "smoothing", "hit_test", "debug_draw")
+
+
+def batch_eye_aspect_ratio(points):
+    """Average EAR of both eyes for landmark arrays shaped (..., 68, 2)
+
+    Works on a single (68, 2) array or on (N, 68, 2) stacks for offline analysis.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    # (..., 2 eyes, 6 points, xy)
+    eyes = points[..., EYES, :].reshape(points.shape[:-2] + (2, 6, 2))
+
+    # Vertical distances p1-p5 and p2-p4, horizontal distance p0-p3
+    vertical = np.linalg.norm(eyes[..., [1, 2], :] - eyes[..., [5, 4], :], axis=-1).sum(axis=-1)
+    horizontal = np.linalg.norm(eyes[..., 0, :] - eyes[..., 3, :], axis=-1)
+
+    return (vertical / (2.0 * horizontal + 1e-6)).mean(axis=-1)
+
+
+def eye_aspect_ratio(points):
+    """Calculate eye aspect ratio (EAR) for detecting eye closure from a (68, 2) array"""
+    return float(batch_eye_aspect_ratio(points))
+
+
+def eye_boxes(points, shape, padding=5):
+    """Padded (x_min, y_min, x_max, y_max) boxes of both eyes, clipped to the frame
+
+    Returns a (2, 4) array: left eye then right eye.
+    """
+    eyes = points[EYES].reshape(2, 6, 2)
+    boxes = np.concatenate([eyes.min(axis=1) - padding, eyes.max(axis=1) + padding], axis=1)
+    return np.clip(boxes, 0, [shape[1], shape[0], shape[1], shape[0]])
+
+
+class BufferPool:
+    """Preallocated images reused across frames so memory use stays flat
+
+    Buffers are keyed by name and shape. Frame-sized buffers handed out in
+    FrameResult come from a small ring, so a result's frame stays intact until
+    ring_size more frames have been processed.
+    """
+
+    def __init__(self, ring_size=3, max_buffers=256):
+        self.ring_size = ring_size
+        self.max_buffers = max_buffers
+        self.enabled = True
+        self._buffers = {}
+        self._ring_index = 0
+
+    def next_frame(self):
+        """Move on to the next slot of the frame ring"""
+        self._ring_index = (self._ring_index + 1) % self.ring_size
+
+    def get(self, name, shape, dtype=np.uint8, ring=False):
+        """Return a buffer of the given shape, or None (let OpenCV allocate) when disabled"""
+        if not self.enabled:
+            return None
+
+        key = (name, self._ring_index if ring else None, tuple(shape), dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            # Eye crops change size slightly from frame to frame; cap the number kept
+            if len(self._buffers) >= self.max_buffers:
+                self._buffers.clear()
+            buffer = self._buffers[key] = np.empty(shape, dtype)
+        return buffer
+
+    def clear(self):
+        self._buffers.clear()
+
+
+@dataclass
+class PipelineEvent:
+    """Something noteworthy that happened while processing a frame"""
+    kind: str            # "selection", "calibration_point", "calibration_complete", "calibration_failed"
+    timestamp: float
+    region: str = None
+    message: str = ""
+
+
+@dataclass
+class FrameResult:
+    """Everything the pipeline computed for one frame"""
+    timestamp: float
+    frame: np.ndarray = None          # mirrored (and annotated) BGR frame
+    face: object = None               # dlib.rectangle of the tracked face
+    face_detector_ran: bool = False   # False when the face box came from tracking
+    reused: bool = False              # landmarks and raw gaze carried over by the motion gate
+    flow_tracked: bool = False        # eye landmarks followed by optical flow instead of the predictor
+    landmarks: np.ndarray = None      # (68, 2) landmark coordinates
+    ear: float = None
+    eyes_open: bool = None
+    raw_gaze: tuple = None            # gaze (0-1) before smoothing, None if the pupils weren't found
+    pupils: np.ndarray = None         # (2, 2) sub-pixel pupil centres, gradient locator only
+    pupil_confidence: float = None    # 0-1, gradient locator only
+    gaze: tuple = None                # smoothed gaze (0-1)
+    screen_point: tuple = None        # smoothed gaze in screen pixels
+    region: str = None
+    lock_progress: float = 0.0        # 0-100 towards a dwell selection
+    calibrating: bool = False
+    calibration_target: tuple = None  # screen pixels of the point to look at while calibrating
+    fps: float = None                 # over the last completed window of 10 frames
+    debug_ms: float = 0.0             # time spent drawing debug overlays
+    latency_ms: float = None          # camera capture to finished result, set by live callers
+    power_mode: str = None            # power.POWER_MODES mode, set by live callers
+    stage_ms: dict = field(default_factory=dict)  # wall time per pipeline stage, see PIPELINE_STAGES
+    events: list = field(default_factory=list)
+
+    @property
+    def face_detected(self):
+        return self.face is not None
+
+    @property
+    def selection(self):
+        """Region selected on this frame, if any"""
+        for event in self.events:
+            if event.kind == "selection":
+                return event.region
+        return None
+
+
+class ResultPublisher:
+    """Thread-safe mailbox between the tracking thread and a UI polling it
+
+    Only the newest FrameResult is kept (older ones are counted as dropped),
+    but the events of every published result are queued so a consumer that
+    polls slowly never misses a selection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._events = []
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, result):
+        with self._lock:
+            if self._latest is not None:
+                self.dropped += 1
+            self._latest = result
+            self._events.extend(result.events)
+            self.published += 1
+
+    def collect(self):
+        """Take the newest result (or None) and all events published since the last collect"""
+        with self._lock:
+            result, self._latest = self._latest, None
+            events, self._events = self._events, []
+            return result, events
+
+
+class GazePipeline:
+    def __init__(self, screen_width, screen_height, predictor_path=PREDICTOR_PATH, detector="hog"):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.predictor_path = predictor_path
+        self.detector = detector  # FACE_DETECTORS name
+
+        # Settings (the UI mirrors its controls into these)
+        self.lock_time = 2.0
+        self.ear_threshold = 0.2
+        self.gaze_sensitivity = 1.0
+        self.mirror = True
+        self.regions = {}              # assign a new dict to change the layout, the index follows
+        self.region_hysteresis = 30    # pixels the current region extends by before the gaze leaves it
+        self.region_index = None
+
+        # Face tracking: the full-frame detector scan only runs every redetect_interval
+        # frames, or sooner when the tracked box looks unreliable
+        self.face_tracking = "landmarks"
+        self.redetect_interval = 10
+        self.redetect_margin = 0.5     # ROI around the last box searched on re-detect, in box sizes
+        self.min_tracker_quality = 7.0  # correlation tracker peak-to-sidelobe ratio
+
+        # Multi-resolution: the detector sees a frame downscaled to this width
+        # (0 = full resolution) while landmarks and pupils use full-res pixels
+        self.detection_width = 320
+
+        self.debug_level = "full"
+
+        # Pupil localisation, see PUPIL_METHODS; with the gradient locator frames
+        # whose pupil confidence is below min_pupil_confidence hold the last gaze
+        self.pupil_method = "threshold"
+        self.min_pupil_confidence = 0.4
+        self.pupil_locator = GradientPupilLocator()
+
+        # Skip the landmark and pupil passes while the eyes look unchanged
+        self.motion_gating = True
+        self.motion_gate = MotionGate()
+
+        # Follow the eye landmarks with optical flow between shape predictor runs
+        self.landmark_flow = False
+        self.eye_flow = EyeLandmarkFlow()
+
+        # Models
+        self.face_detector = None
+        self.landmark_predictor = None
+
+        # OpenCV objects and per-frame images built once and reused
+        self.buffers = BufferPool()
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.morph_kernel = np.ones((3, 3), np.uint8)
+
+        # Calibration variables
+        # A 3x3 grid gives enough points for a quadratic fit
+        self.calibration_points = [(0.1, 0.1), (0.5, 0.1), (0.9, 0.1),
+                                   (0.1, 0.5), (0.5, 0.5), (0.9, 0.5),
+                                   (0.1, 0.9), (0.5, 0.9), (0.9, 0.9)]
+        self.calibration = None  # calibration.CalibrationModel, raw gaze -> screen
+        self.calibration_mode = False
+        self.calibration_current = 0
+        self.calibration_data = {}
+        self.calibration_blink_handled = False
+
+        # Temporal gaze smoothing, see gaze_filters.GAZE_FILTERS
+        self.smoothing = "moving_average"
+        self.smoothing_params = {"window": 10}  # frames to average
+        self.reset()
+
+    def load_models(self, progress=None):
+        """Load the face detector backend and the landmark predictor
+
+        progress, if given, is called with (percent, message) before each step.
+        """
+        if not os.path.exists(self.predictor_path):
+            raise FileNotFoundError(
+                f"Could not find the shape predictor file at: {self.predictor_path}\n\n"
+                f"Please download it from:\n{PREDICTOR_URL}")
+
+        if progress:
+            progress(40, "Loading face detector...")
+        self.face_detector = create_face_detector(self.detector)
+
+        if progress:
+            progress(60, "Loading landmark model...")
+        self.landmark_predictor = ShapePredictorLandmarks(self.predictor_path)
+
+        if progress:
+            progress(100, "Models loaded")
+
+    @property
+    def models_loaded(self):
+        return self.face_detector is not None and self.landmark_predictor is not None
+
+    def reset(self):
+        """Clear all per-session tracking state"""
+        self.dwell = DwellTimer()
+        self.last_eye_open_time = None
+        self.eye_closed_duration = 0
+        self.current_ear = 0
+        self.gaze_filter = create_filter(self.smoothing, **self.smoothing_params)
+        self.fps_window_start = None
+        self.frame_count = 0
+        self.fps = 0
+        self.clear_face_track()
+        self.motion_gate.reset()
+        self.eye_flow.reset()
+
+    def set_smoothing(self, name, **params):
+        """Switch to another gaze filter (GAZE_FILTERS name) with optional parameters"""
+        self.gaze_filter = create_filter(name, **params)
+        self.smoothing = name
+        self.smoothing_params = params
+
+    def clear_face_track(self):
+        """Forget the tracked face so the next frame runs the full detector"""
+        self.tracked_face = None
+        self.face_anchor = None        # face box center minus landmark centroid at detection
+        self.last_landmark_center = None
+        self.frames_since_detect = 0
+        self.correlation_tracker = None
+
+    def start_calibration(self):
+        """Begin collecting calibration points"""
+        self.calibration_mode = True
+        self.calibration_current = 0
+        self.calibration_data = {}
+        self.calibration_blink_handled = False
+        # Samples are collected uncalibrated, so drop the calibrated history
+        self.gaze_filter.reset()
+
+    def stop_calibration(self):
+        self.calibration_mode = False
+
+    def run(self, frames):
+        """Process an iterable of frames or (frame, timestamp) pairs, yielding a FrameResult for each"""
+        for item in frames:
+            if isinstance(item, tuple):
+                yield self.process(*item)
+            else:
+                yield self.process(item)
+
+    def process(self, frame, timestamp=None):
+        """Run detection, gaze estimation and dwell selection on one BGR frame"""
+        current_time = time.time() if timestamp is None else timestamp
+        stage_start = time.perf_counter()
+
+        # Flip frame horizontally for a mirror effect, into our own frame buffer
+        self.buffers.next_frame()
+        frame_buffer = self.buffers.get("frame", frame.shape, ring=True)
+        if self.mirror:
+            frame = cv2.flip(frame, 1, dst=frame_buffer)
+        elif frame_buffer is not None:
+            np.copyto(frame_buffer, frame)
+            frame = frame_buffer
+
+        result = FrameResult(timestamp=current_time, frame=frame,
+                             calibrating=self.calibration_mode)
+        self.debug_time = 0.0
+
+        # Calculate FPS over each window of 10 frames
+        if self.fps_window_start is None:
+            self.fps_window_start = current_time
+        self.frame_count += 1
+        if self.frame_count > 10:
+            elapsed = current_time - self.fps_window_start
+            if elapsed > 0:
+                self.fps = 10 / elapsed
+            self.fps_window_start = current_time
+            self.frame_count = 1
+        result.fps = self.fps
+
+        # Convert to grayscale for face detection
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", frame.shape[:2]))
+        stage_start = self.end_stage(result, "preprocess", stage_start)
+
+        # Find the face, reusing the tracked box on most frames
+        face = self.locate_face(gray, result)
+        stage_start = self.end_stage(result, "face_detector", stage_start)
+        if face is None:
+            self.dwell.reset()
+            self.motion_gate.reset()
+            self.eye_flow.reset()
+            return result
+        result.face = face
+
+        # While the eyes look as they did at the last full pass, its landmarks and gaze stand
+        result.reused = (self.motion_gating and not self.calibration_mode
+                         and self.motion_gate.unchanged(gray, face))
+
+        # Get landmarks as a single (68, 2) array shared by everything below; between
+        # predictor runs optical flow can carry the eye points on from the last frame
+        if result.reused:
+            landmarks = self.motion_gate.landmarks
+        else:
+            landmarks = None
+            if self.landmark_flow and not self.calibration_mode:
+                landmarks = self.eye_flow.track(gray)
+            result.flow_tracked = landmarks is not None
+            if landmarks is None:
+                landmarks = self.landmark_predictor(gray, face)
+            self.follow_face(landmarks, face, gray.shape)
+        if self.landmark_flow:
+            self.eye_flow.remember(gray, landmarks, predicted=not (result.reused or result.flow_tracked))
+        result.landmarks = landmarks
+        stage_start = self.end_stage(result, "landmark_predictor", stage_start)
+
+        # Calculate eye aspect ratio, from the sub-pixel eye points on optical flow frames
+        if result.reused:
+            ear = self.motion_gate.ear
+        elif result.flow_tracked:
+            ear = eye_aspect_ratio(self.eye_flow.precise(landmarks))
+        else:
+            ear = eye_aspect_ratio(landmarks)
+        self.current_ear = ear
+        result.ear = ear
+
+        # Detect if eyes are open or closed
+        if ear < self.ear_threshold:
+            # Eyes closed
+            if self.last_eye_open_time is not None:
+                self.eye_closed_duration = current_time - self.last_eye_open_time
+            result.eyes_open = False
+
+            # Handle eye blink for calibration, once per blink
+            if (self.calibration_mode and self.eye_closed_duration > 0.2
+                    and not self.calibration_blink_handled):
+                self.calibration_blink_handled = True
+                self.process_calibration_point(result)
+        else:
+            # Eyes open
+            self.last_eye_open_time = current_time
+            self.eye_closed_duration = 0
+            self.calibration_blink_handled = False
+            result.eyes_open = True
+        stage_start = self.end_stage(result, "eye_aspect_ratio", stage_start)
+
+        # Get gaze direction
+        if result.reused:
+            eye_gaze = self.motion_gate.eye_gaze
+            result.pupils = self.motion_gate.pupils
+            result.pupil_confidence = self.motion_gate.pupil_confidence
+        elif self.pupil_method == "gradient":
+            eye_gaze = self.gradient_gaze_direction(landmarks, gray, result)
+        else:
+            eye_gaze = self.get_improved_gaze_direction(landmarks, gray, frame)
+
+        # Calibration and sensitivity are applied afresh even to reused samples, as they may have changed
+        result.raw_gaze = self.map_gaze(*eye_gaze) if eye_gaze is not None else None
+        if self.motion_gating and not result.reused:
+            self.motion_gate.update(gray, face, eye_boxes(landmarks, gray.shape), result, eye_gaze)
+        stage_start = self.end_stage(result, "process_eye_for_gaze", stage_start)
+
+        # Apply temporal smoothing; without a reliable pupil fix the last gaze holds
+        if result.raw_gaze is not None:
+            result.gaze = self.gaze_filter.update(*result.raw_gaze, current_time)
+        else:
+            result.gaze = self.gaze_filter.value
+        stage_start = self.end_stage(result, "smoothing", stage_start)
+        if result.gaze is None:
+            return result
+        avg_gaze_x, avg_gaze_y = result.gaze
+
+        # Map to screen coordinates
+        screen_x = int(avg_gaze_x * self.screen_width)
+        screen_y = int(avg_gaze_y * self.screen_height)
+        result.screen_point = (screen_x, screen_y)
+
+        if self.calibration_mode and self.calibration_current < len(self.calibration_points):
+            result.calibration_target = self.calibration_target()
+            draw_calibration_target(frame, result.calibration_target, self.screen_width)
+        else:
+            self.update_dwell(result, screen_x, screen_y, current_time)
+        stage_start = self.end_stage(result, "hit_test", stage_start)
+
+        # Draw eye landmarks and gaze direction
+        if self.debug_level != "off":
+            start = time.perf_counter()
+            self.draw_eye_tracking_debug(frame, landmarks, result.gaze, result.pupils)
+            self.debug_time += time.perf_counter() - start
+        result.debug_ms = self.debug_time * 1000
+        result.stage_ms["debug_draw"] = result.debug_ms
+        return result
+
+    @staticmethod
+    def end_stage(result, name, start):
+        """Charge the time since start to a stage of result, returning the new start time"""
+        now = time.perf_counter()
+        result.stage_ms[name] = (now - start) * 1000
+        return now
+
+    def locate_face(self, gray, result):
+        """Return the face rectangle, only running the face detector when needed"""
+        if (self.face_tracking != "off" and self.tracked_face is not None
+                and self.frames_since_detect < self.redetect_interval):
+            face = self.tracked_face
+            if self.face_tracking == "correlation" and self.correlation_tracker is None:
+                face = None  # switched to correlation mid-track, it needs a detection to start from
+            elif self.face_tracking == "correlation":
+                quality = self.correlation_tracker.update(gray)
+                position = self.correlation_tracker.get_position()
+                face = dlib.rectangle(int(position.left()), int(position.top()),
+                                      int(position.right()), int(position.bottom()))
+                if quality < self.min_tracker_quality:
+                    face = None
+
+            if face is not None and self.box_inside(face, gray.shape):
+                self.frames_since_detect += 1
+                return face
+
+        result.face_detector_ran = True
+        previous = self.tracked_face
+        self.clear_face_track()
+
+        # Search around the last known position first, then the whole frame
+        faces = []
+        if previous is not None and self.face_tracking != "off":
+            faces = self.detect_faces_near(gray, previous)
+        if len(faces) == 0:
+            faces = self.detect_faces(gray)
+        if len(faces) == 0:
+            return None
+
+        # Get the largest face
+        face = max(faces, key=lambda rect: rect.width() * rect.height())
+        if self.face_tracking != "off":
+            self.tracked_face = face
+            if self.face_tracking == "correlation":
+                self.correlation_tracker = dlib.correlation_tracker()
+                self.correlation_tracker.start_track(gray, face)
+        return face
+
+    def detect_faces_near(self, gray, face):
+        """Run the detector on an ROI around a previous face box"""
+        margin_x = int(face.width() * self.redetect_margin)
+        margin_y = int(face.height() * self.redetect_margin)
+        x1 = max(0, face.left() - margin_x)
+        y1 = max(0, face.top() - margin_y)
+        x2 = min(gray.shape[1], face.right() + margin_x)
+        y2 = min(gray.shape[0], face.bottom() + margin_y)
+        if x2 <= x1 or y2 <= y1:
+            return []
+
+        return self.detect_faces(gray[y1:y2, x1:x2], offset=(x1, y1), frame_width=gray.shape[1])
+
+    def detect_faces(self, gray, offset=(0, 0), frame_width=None):
+        """Run the face detector on a downscaled copy of gray, returning full-res rectangles"""
+        frame_width = frame_width or gray.shape[1]
+        scale = 1.0
+        if 0 < self.detection_width < frame_width:
+            # Same pyramid level for ROIs and whole frames so face sizes stay comparable
+            scale = self.detection_width / frame_width
+            size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+            gray = cv2.resize(gray, size, dst=self.buffers.get("detect", size[::-1]),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            gray = np.ascontiguousarray(gray)
+
+        ox, oy = offset
+        return [dlib.rectangle(int(left / scale) + ox, int(top / scale) + oy,
+                               int(right / scale) + ox, int(bottom / scale) + oy)
+                for left, top, right, bottom in self.face_detector(gray)]
+
+    def follow_face(self, landmarks, face, shape):
+        """Move the tracked box with the landmarks, or drop it if they look unreliable"""
+        if self.tracked_face is None or self.face_tracking == "off":
+            return
+
+        # Only the rows the landmark model fills; the eyes alone span less of the box
+        points = landmarks[self.landmark_predictor.rows]
+        center = points.mean(axis=0)
+        extent = points.max(axis=0) - points.min(axis=0)
+        low, high = (0.3, 1.0) if self.landmark_predictor.eyes_only else (0.5, 1.5)
+
+        # Landmarks that have collapsed, blown up or jumped mean the box lost the face
+        width = face.width()
+        jumped = (self.last_landmark_center is not None
+                  and np.linalg.norm(center - self.last_landmark_center) > 0.25 * width)
+        if not low * width <= extent[0] <= high * width or jumped:
+            self.clear_face_track()
+            return
+        self.last_landmark_center = center
+
+        if self.face_tracking != "landmarks":
+            return
+
+        # Keep the detected box size, shifted so it follows the landmark centroid
+        box_center = np.array([(face.left() + face.right()) / 2, (face.top() + face.bottom()) / 2])
+        if self.face_anchor is None:
+            self.face_anchor = box_center - center
+        cx, cy = center + self.face_anchor
+        half_w, half_h = face.width() / 2, face.height() / 2
+        tracked = dlib.rectangle(int(cx - half_w), int(cy - half_h), int(cx + half_w), int(cy + half_h))
+        self.tracked_face = tracked if self.box_inside(tracked, shape) else None
+
+    @staticmethod
+    def box_inside(face, shape):
+        """Whether a face box lies fully inside the frame"""
+        return (face.left() >= 0 and face.top() >= 0
+                and face.right() < shape[1] and face.bottom() < shape[0])
+
+    def find_region(self, screen_x, screen_y):
+        """Return the name of the region containing a screen point, if any"""
+        if self.region_index is None or self.region_index.regions is not self.regions:
+            self.region_index = RegionIndex(self.regions)
+        return self.region_index.find(screen_x, screen_y, self.dwell.locked_region, self.region_hysteresis)
+
+    def update_dwell(self, result, screen_x, screen_y, current_time):
+        """Advance the gaze lock timer and emit a selection once it completes"""
+        current_region = self.find_region(screen_x, screen_y)
+        result.region = current_region
+        result.lock_progress, selected = self.dwell.update(current_region, current_time, self.lock_time)
+        if selected:
+            result.events.append(PipelineEvent("selection", current_time, region=current_region))
+
+    def get_improved_gaze_direction(self, landmarks, gray, frame):
+        """Calculate gaze direction with improved algorithm, before map_gaze"""
+        # Get left and right eye regions
+        left_box, right_box = eye_boxes(landmarks, gray.shape)
+
+        # Process both eyes and average the results
+        left_gaze = self.process_eye_for_gaze(left_box, gray, frame)
+        right_gaze = self.process_eye_for_gaze(right_box, gray, frame)
+
+        gaze_x = ((left_gaze[0] + right_gaze[0]) / 2)
+        gaze_y = ((left_gaze[1] + right_gaze[1]) / 2)
+        return gaze_x, gaze_y
+
+    def gradient_gaze_direction(self, landmarks, gray, result):
+        """Gaze (before map_gaze) from both pupils found in one batched search, None if neither is reliable"""
+        boxes = eye_boxes(landmarks, gray.shape)
+        pupils, confidence = self.pupil_locator.locate(gray, boxes)
+        result.pupils = pupils
+        result.pupil_confidence = float(confidence.max())
+
+        # Pupil offset from each box centre, as a fraction of the box half-size
+        centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+        half_sizes = np.maximum((boxes[:, 2:] - boxes[:, :2]) / 2, 1)
+        relative = (pupils - centres) / half_sizes
+
+        # Confidence-weighted average of the eyes that were found
+        weights = np.where(confidence >= self.min_pupil_confidence, confidence, 0.0)
+        if weights.sum() == 0:
+            return None
+        rel_x, rel_y = (relative * weights[:, None]).sum(axis=0) / weights.sum()
+
+        # The pupil moves the opposite way to the gaze, as in process_eye_for_gaze
+        return 0.5 - rel_x * 0.5, 0.5 - rel_y * 0.5
+
+    def map_gaze(self, gaze_x, gaze_y):
+        """Apply calibration and sensitivity to a raw eye gaze sample"""
+        # While calibrating the raw samples themselves are being measured
+        if self.calibration_mode:
+            return max(0, min(1, gaze_x)), max(0, min(1, gaze_y))
+
+        # Apply the fitted calibration mapping
+        if self.calibration is not None:
+            gaze_x, gaze_y = self.calibration.apply(gaze_x, gaze_y)
+
+        # Apply sensitivity factor - reduces the center bias
+        gaze_x = 0.5 + (gaze_x - 0.5) * self.gaze_sensitivity
+        gaze_y = 0.5 + (gaze_y - 0.5) * self.gaze_sensitivity
+
+        # Ensure values are within 0-1 range
+        gaze_x = max(0, min(1, gaze_x))
+        gaze_y = max(0, min(1, gaze_y))
+
+        return gaze_x, gaze_y
+
+    def process_eye_for_gaze(self, eye_box, gray, frame):
+        """Process a single eye (padded bounding box from eye_boxes) for gaze estimation"""
+        x_min, y_min, x_max, y_max = (int(v) for v in eye_box)
+
+        # Check if dimensions are valid
+        if x_min >= x_max or y_min >= y_max:
+            return 0.5, 0.5
+
+        # Extract eye region
+        eye_region = gray[y_min:y_max, x_min:x_max]
+        if eye_region.size == 0:
+            return 0.5, 0.5
+
+        # Improve contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        shape = eye_region.shape
+        eye_region = self.clahe.apply(eye_region, dst=self.buffers.get("eye_clahe", shape))
+
+        # Apply Gaussian blur
+        eye_region = cv2.GaussianBlur(eye_region, (7, 7), 0, dst=self.buffers.get("eye_blur", shape))
+
+        # Use adaptive thresholding for better pupil detection
+        _, thresholded = cv2.threshold(eye_region, 30, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU,
+                                       dst=self.buffers.get("eye_thresh", shape))
+
+        # Denoise
+        opened = cv2.morphologyEx(thresholded, cv2.MORPH_OPEN, self.morph_kernel, iterations=1,
+                                  dst=self.buffers.get("eye_open", shape))
+        thresholded = cv2.morphologyEx(opened, cv2.MORPH_CLOSE, self.morph_kernel, iterations=1,
+                                       dst=self.buffers.get("eye_thresh", shape))
+
+        # Find the darkest region (pupil)
+        contours, _ = cv2.findContours(thresholded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Calculate relative position
+        eye_center_x = (x_max + x_min) / 2
+        eye_center_y = (y_max + y_min) / 2
+
+        pupil = None
+        if contours:
+            # Find the largest contour
+            largest_contour = max(contours, key=cv2.contourArea)
+
+            # Find the center of the contour
+            M = cv2.moments(largest_contour)
+            if M['m00'] != 0:
+                pupil = int(M['m10'] / M['m00']), int(M['m01'] / M['m00'])
+
+        if self.debug_level == "full":
+            start = time.perf_counter()
+            self.draw_eye_crop_debug(frame, eye_region, contours, pupil)
+            self.debug_time += time.perf_counter() - start
+
+        if pupil is not None:
+            cx, cy = pupil
+
+            # Calculate pupil position relative to eye center
+            pupil_x = x_min + cx
+            pupil_y = y_min + cy
+
+            # Convert to relative coordinates (0-1)
+            rel_x = (pupil_x - eye_center_x) / (x_max - x_min) * 2
+            rel_y = (pupil_y - eye_center_y) / (y_max - y_min) * 2
+
+            # Map to 0-1 range
+            # This inverts the direction because the pupil moves in the opposite direction of gaze
+            gaze_x = 0.5 - rel_x * 0.5
+            gaze_y = 0.5 - rel_y * 0.5
+
+            return gaze_x, gaze_y
+
+        return 0.5, 0.5
+
+    def draw_eye_crop_debug(self, frame, eye_region, contours, pupil):
+        """Paste the segmented eye crop, with contours and pupil center, into the frame corner"""
+        # Draw the contours for debugging
+        eye_region_color = cv2.cvtColor(eye_region, cv2.COLOR_GRAY2BGR,
+                                        dst=self.buffers.get("eye_color", eye_region.shape + (3,)))
+        cv2.drawContours(eye_region_color, contours, -1, (0, 255, 0), 1)
+
+        # Draw the pupil center for debugging
+        if pupil is not None:
+            cv2.circle(eye_region_color, pupil, 3, (0, 0, 255), -1)
+
+        # Display the processed eye region for debugging
+        h, w = frame.shape[:2]
+        if h < 100:
+            return
+        height, width = eye_region_color.shape[:2]
+        size = (min(w, int(width * 100 / height)), 100)
+        resized = cv2.resize(eye_region_color, size, dst=self.buffers.get("eye_debug", size[::-1] + (3,)))
+
+        # Draw a debug overlay in the corner
+        frame[h-100:h, 0:resized.shape[1]] = resized
+
+    def calibration_target(self):
+        """Screen position of the current calibration point"""
+        calib_point = self.calibration_points[self.calibration_current]
+        return int(calib_point[0] * self.screen_width), int(calib_point[1] * self.screen_height)
+
+    def draw_eye_tracking_debug(self, frame, landmarks, gaze, pupils=None):
+        """Draw eye landmarks, pupil centres and gaze direction for debugging"""
+        # Draw eye landmarks
+        for x, y in landmarks[EYES]:
+            cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 0), -1)
+
+        # Sub-pixel pupil centres, drawn in quarter pixels
+        if pupils is not None:
+            for x, y in pupils:
+                cv2.circle(frame, (int(round(x * 4)), int(round(y * 4))), 8, (0, 0, 255), 1,
+                           cv2.LINE_AA, shift=2)
+
+        # Draw estimated gaze point
+        screen_x = int(gaze[0] * self.screen_width)
+        screen_y = int(gaze[1] * self.screen_height)
+        cv2.circle(frame, (screen_x, screen_y), 10, (0, 0, 255), -1)
+
+    def process_calibration_point(self, result):
+        """Process the current calibration point"""
+        if self.calibration_current >= len(self.calibration_points):
+            return
+
+        # Get the expected point
+        point = self.calibration_points[self.calibration_current]
+
+        # Get the current gaze point (smoothed)
+        if self.gaze_filter.value is None:
+            return
+        avg_gaze_x, avg_gaze_y = self.gaze_filter.value
+
+        # Store the calibration data
+        self.calibration_data[point] = (avg_gaze_x, avg_gaze_y)
+
+        # Move to next point
+        self.calibration_current += 1
+
+        if self.calibration_current < len(self.calibration_points):
+            result.events.append(PipelineEvent(
+                "calibration_point", result.timestamp,
+                message=f"Calibration point {self.calibration_current+1}/{len(self.calibration_points)}. "
+                        "Look at the green dot and blink."))
+        else:
+            # Calibration complete, calculate calibration parameters
+            self.calibration_mode = False
+            self.gaze_filter.reset()
+            if self.calculate_calibration_parameters():
+                result.events.append(PipelineEvent(
+                    "calibration_complete", result.timestamp,
+                    message=f"Calibration complete! Mean error {self.calibration.mean_error * 100:.1f}% "
+                            f"of screen. Tracking resumed."))
+            else:
+                result.events.append(PipelineEvent(
+                    "calibration_failed", result.timestamp,
+                    message="Calibration failed: Not enough data points!"))
+
+    def calculate_calibration_parameters(self):
+        """Fit the calibration mapping to the collected data by least squares"""
+        screen_points = list(self.calibration_data.keys())
+        raw_points = list(self.calibration_data.values())
+        try:
+            self.calibration = CalibrationModel.fit(raw_points, screen_points)
+        except ValueError:
+            # Not enough data points
+            return False
+
+        # Log the calibration fit and its error at each point
+        lines = [f"Calibration complete! Degree {self.calibration.degree} fit, "
+                 f"mean error {self.calibration.mean_error:.3f}, max {self.calibration.max_error:.3f}"]
+        for (expected_x, expected_y), error in zip(screen_points, self.calibration.residuals):
+            lines.append(f"  Point ({expected_x:.1f}, {expected_y:.1f}): error {error:.3f}")
+        print("\n".join(lines))
+        return True
+
+
+def video_frames(capture, max_frames=None, video_time=False):
+    """Yield (frame, timestamp) pairs from a cv2.VideoCapture until it runs dry
+
+    With video_time the timestamps come from the file position rather than the
+    wall clock, so dwell timing stays correct when replaying faster than real time.
+    Otherwise frames are stamped with the wall clock as soon as they are read.
+    """
+    count = 0
+    while max_frames is None or count < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        count += 1
+        timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if video_time else time.time()
+        yield frame, timestamp
+
+
+def queued_frames(frames, max_frames=None):
+    """Yield (frame, timestamp) pairs from a LatestFrameQueue until it is closed"""
+    count = 0
+    while max_frames is None or count < max_frames:
+        item = frames.get(timeout=0.5)
+        if item is None:
+            if frames.closed:
+                break
+            continue
+        count += 1
+        yield item
+
+
+def main():
+    """Run the pipeline headlessly on a camera or a recorded video"""
+    parser = argparse.ArgumentParser(description="Headless gaze tracking pipeline")
+    parser.add_argument("--video", help="recorded video file to process instead of the camera")
+    parser.add_argument("--camera", help="camera index or device path (default: camera.json, else 0)")
+    parser.add_argument("--backend", choices=CAPTURE_BACKENDS, help="OpenCV capture backend")
+    parser.add_argument("--resolution", help="requested camera resolution WxH")
+    parser.add_argument("--fps", type=float, help="requested camera frame rate")
+    parser.add_argument("--mjpeg", action="store_true", help="ask the camera for MJPEG frames")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--screen", default="1920x1080", help="virtual screen size WxH")
+    parser.add_argument("--regions", help="JSON file of {name: [x1, y1, x2, y2]} screen regions "
+                                          "(default: the standard five for --screen)")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="68-point or 12-point eye-only dlib shape predictor")
+    parser.add_argument("--detector", choices=tuple(FACE_DETECTORS), default="hog", help="face detector backend")
+    parser.add_argument("--patient", help="load this patient's calibration profile")
+    parser.add_argument("--detect-width", type=int, default=320,
+                        help="width of the downscaled frame used for face detection (0 = full resolution)")
+    parser.add_argument("--pupil", choices=PUPIL_METHODS, default="threshold", help="pupil locator")
+    parser.add_argument("--no-motion-gate", action="store_true",
+                        help="run landmarks and pupil search on every frame, even when the eyes haven't changed")
+    parser.add_argument("--landmark-flow", action="store_true",
+                        help="follow the eye landmarks with optical flow between shape predictor runs")
+    parser.add_argument("--debug-level", choices=DEBUG_LEVELS, default="off",
+                        help="debug drawing to do on each frame (default off when headless)")
+    parser.add_argument("--no-buffer-pool", action="store_true",
+                        help="allocate fresh images every frame instead of reusing buffers")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve Prometheus metrics on this localhost port (default off)")
+    parser.add_argument("--metrics-file", help="append a metrics snapshot to this rotating file every minute")
+    parser.add_argument("--record", help="record landmarks and gaze to this .gaze file for replay")
+    parser.add_argument("--idle-after", type=float, default=30.0,
+                        help="camera only: seconds without a face before dropping to a low frame rate (0 = never)")
+    args = parser.parse_args()
+    if args.record and os.path.exists(args.record):
+        raise SystemExit(f"{args.record} already exists, record to a new file")
+
+    startup = StartupTimer()
+    startup.mark("imports")
+
+    width, height = (int(v) for v in args.screen.lower().split("x"))
+    pipeline = GazePipeline(width, height, predictor_path=args.predictor, detector=args.detector)
+    pipeline.detection_width = args.detect_width
+    if args.regions:
+        with open(args.regions) as f:
+            pipeline.regions = {name: tuple(box) for name, box in json.load(f).items()}
+    else:
+        pipeline.regions = default_regions(width, height)
+    pipeline.buffers.enabled = not args.no_buffer_pool
+    pipeline.debug_level = args.debug_level
+    pipeline.pupil_method = args.pupil
+    pipeline.motion_gating = not args.no_motion_gate
+    pipeline.landmark_flow = args.landmark_flow
+    if args.patient:
+        pipeline.calibration = load_profile(args.patient)
+    pipeline.load_models()
+    startup.mark("models")
+
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+    else:
+        settings = CaptureSettings.load()
+        if args.camera is not None:
+            settings.device = args.camera
+        if args.backend:
+            settings.backend = args.backend
+        if args.resolution:
+            settings.width, settings.height = (int(v) for v in args.resolution.lower().split("x"))
+        if args.fps:
+            settings.fps = args.fps
+        settings.mjpeg = settings.mjpeg or args.mjpeg
+        cap = open_capture(settings)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open {args.video or f'camera {settings.device}'}")
+    capture_thread = None
+    power = PowerScheduler(idle_after=args.idle_after)
+    power.enabled = bool(args.idle_after) and not args.video
+    if args.video:
+        source = video_frames(cap, args.max_frames, video_time=True)
+    else:
+        print(f"Camera: {settings.describe(cap)}")
+        frame_queue = LatestFrameQueue()
+        capture_thread = CaptureThread(cap, frame_queue, newest_only=settings.newest_only)
+        capture_thread.start()
+        source = queued_frames(frame_queue, args.max_frames)
+
+    metrics = describe_pipeline_metrics(PipelineMetrics())
+    services = []
+    if args.metrics_port:
+        services.append(MetricsServer(metrics, args.metrics_port))
+        print(f"Metrics at {services[-1].address}")
+    if args.metrics_file:
+        services.append(MetricsDumper(metrics, args.metrics_file))
+    for service in services:
+        service.start()
+    recorder = None
+    if args.record:
+        recorder = SessionRecorder(args.record, width, height, {
+            "lock_time": pipeline.lock_time, "ear_threshold": pipeline.ear_threshold,
+            "gaze_sensitivity": pipeline.gaze_sensitivity, "smoothing": pipeline.smoothing,
+            "smoothing_params": pipeline.smoothing_params, "region_hysteresis": pipeline.region_hysteresis,
+            "source": args.video or "camera"})
+
+    frames = 0
+    faces = 0
+    reused = 0
+    flow_tracked = 0
+    debug_ms = 0.0
+    latency_ms = 0.0
+    start = time.perf_counter()
+    try:
+        for result in pipeline.run(source):
+            frames += 1
+            startup.mark("first_frame")
+            if result.gaze is not None and "first_gaze" not in startup.marks:
+                startup.mark("first_gaze")
+                print(f"Startup: {startup.summary()}")
+            if result.face_detected:
+                faces += 1
+            reused += result.reused
+            flow_tracked += result.flow_tracked
+            debug_ms += result.debug_ms
+            if not args.video:
+                result.latency_ms = (time.time() - result.timestamp) * 1000
+                latency_ms += result.latency_ms
+                result.power_mode = power.update(result, pipeline, capture_thread)
+            metrics.observe_result(result)
+            if recorder:
+                recorder.record(result, pipeline.regions)
+            for event in result.events:
+                print(f"{event.timestamp:.3f} {event.kind} {event.region or event.message}")
+                if event.kind == "selection":
+                    metrics.record_selection(event.region, event.timestamp)
+    finally:
+        if capture_thread:
+            capture_thread.stop()
+            capture_thread.join(timeout=1.0)
+        cap.release()
+        for service in services:
+            service.stop()
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.written} frames to {args.record}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {frames} frames in {elapsed:.2f}s "
+          f"({frames / elapsed if elapsed > 0 else 0:.1f} fps), face found in {faces}")
+    print(f"Landmarks and gaze reused on {reused} frames by the motion gate")
+    if args.landmark_flow:
+        print(f"Eye landmarks followed by optical flow on {flow_tracked} frames")
+    print(f"Debug level '{args.debug_level}' cost {debug_ms / max(frames, 1):.3f} ms per frame")
+    if not args.video:
+        print(f"Mean capture-to-result latency {latency_ms / max(frames, 1):.1f} ms")
+        print(f"Power modes: {power.describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import bisect
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_METRICS_PORT = 9464
+
+# Histogram upper bounds in seconds, the last bucket (+Inf) is implicit
+STAGE_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
+LATENCY_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+SELECTION_BUCKETS = (0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, cheap enough to observe from the tracking loop"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs as Prometheus expects them"""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None when empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+def escape_label_value(value):
+    """Escape a label value as the text format requires (region names are user-supplied)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+class PipelineMetrics:
+    """Runtime telemetry for one tracker, exposed as Prometheus text
+
+    observe_result is called from the tracking thread for every FrameResult,
+    record_selection from the UI when a selection is acted on; all counters
+    and histograms sit behind one lock. Sources registered with add_source
+    (e.g. queue drop counters) are only read when metrics are exported.
+    """
+
+    def __init__(self, prefix="eyetracker"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.help = {}
+        self.sources = []     # (name, labels, kind, callable)
+
+        self.face_present = False
+        self.eyes_open = True
+        self.glance_region = None
+        self.glance_start = None
+        self.fps = None
+        self.last_timestamp = None
+
+    # Registration and low-level updates, callers must hold self.lock
+
+    def _inc(self, name, amount=1, labels=()):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def _observe(self, name, value, buckets, labels=()):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def add_source(self, name, read, kind="counter", **labels):
+        """Export the value read() returns at scrape time as a counter or gauge"""
+        self.sources.append((name, tuple(sorted(labels.items())), kind, read))
+
+    # Hot path
+
+    def observe_result(self, result):
+        """Fold one FrameResult into the metrics"""
+        with self.lock:
+            self._inc("frames_total")
+            for stage, ms in result.stage_ms.items():
+                self._observe("stage_seconds", ms / 1000, STAGE_BUCKETS, (("stage", stage),))
+            self._observe("frame_seconds", sum(result.stage_ms.values()) / 1000, STAGE_BUCKETS)
+            if result.latency_ms is not None:
+                self._observe("capture_latency_seconds", result.latency_ms / 1000, LATENCY_BUCKETS)
+
+            # Frame rate as an exponential average of frame intervals
+            if self.last_timestamp is not None and result.timestamp > self.last_timestamp:
+                rate = 1.0 / (result.timestamp - self.last_timestamp)
+                self.fps = rate if self.fps is None else 0.9 * self.fps + 0.1 * rate
+            self.last_timestamp = result.timestamp
+
+            if result.face_detected:
+                self._inc("face_frames_total")
+            elif self.face_present:
+                self._inc("face_lost_total")
+            self.face_present = result.face_detected
+            if result.face_detector_ran:
+                self._inc("detector_runs_total")
+            if result.reused:
+                self._inc("reused_frames_total")
+            if result.flow_tracked:
+                self._inc("flow_frames_total")
+
+            if result.eyes_open is not None:
+                if self.eyes_open and not result.eyes_open:
+                    self._inc("blinks_total")
+                self.eyes_open = result.eyes_open
+
+            # A glance starts when the gaze moves onto a region
+            if result.region != self.glance_region:
+                self.glance_region = result.region
+                self.glance_start = result.timestamp if result.region else None
+
+    def record_selection(self, region, now=None):
+        """Count a selection acted on by the UI and how long since the glance that led to it"""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._inc("selections_total", labels=(("region", region),))
+            if self.glance_region == region and self.glance_start is not None:
+                self._observe("glance_to_selection_seconds", max(0.0, now - self.glance_start),
+                              SELECTION_BUCKETS)
+                # Holding the gaze selects again, timed from this selection
+                self.glance_start = now
+
+    # Export
+
+    def snapshot(self):
+        """Plain dict of every metric, for the file dump"""
+        with self.lock:
+            counters = {self.key_name(key): value for key, value in self.counters.items()}
+            histograms = {self.key_name(key): {"count": h.count, "sum": h.sum,
+                                               "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                                               "p99": h.quantile(0.99)}
+                          for key, h in self.histograms.items()}
+            fps = self.fps
+        for name, labels, kind, read in self.sources:
+            counters[self.key_name((name, labels))] = read()
+        return {"time": time.time(), "uptime_s": time.time() - self.started_at, "fps": fps,
+                "counters": counters, "histograms": histograms}
+
+    @staticmethod
+    def key_name(key):
+        name, labels = key
+        return name + format_labels(labels)
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                if name in self.help:
+                    lines.append(f"# HELP {full} {self.help[name]}")
+                lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                full = header(name, "counter")
+                lines.append(f"{full}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                full = header(name, "histogram")
+                for bound, total in histogram.cumulative():
+                    bucket_labels = labels + (("le", format_bound(bound)),)
+                    lines.append(f"{full}_bucket{format_labels(bucket_labels)} {total}")
+                lines.append(f"{full}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full}_count{format_labels(labels)} {histogram.count}")
+            gauges = dict(self.gauges)
+            if self.fps is not None:
+                gauges[("fps", ())] = self.fps
+            gauges[("uptime_seconds", ())] = time.time() - self.started_at
+
+        for name, labels, kind, read in self.sources:
+            full = header(name, kind)
+            lines.append(f"{full}{format_labels(labels)} {read()}")
+        for (name, labels), value in sorted(gauges.items()):
+            full = header(name, "gauge")
+            lines.append(f"{full}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def describe_pipeline_metrics(metrics):
+    """HELP text for the metrics PipelineMetrics records itself"""
+    metrics.describe("frames_total", "Frames processed by the tracking pipeline")
+    metrics.describe("face_frames_total", "Frames in which a face was found")
+    metrics.describe("face_lost_total", "Times a tracked face was lost")
+    metrics.describe("detector_runs_total", "Frames on which the full face detector ran")
+    metrics.describe("reused_frames_total", "Frames whose landmarks and gaze the motion gate carried over")
+    metrics.describe("flow_frames_total", "Frames whose eye landmarks were followed by optical flow")
+    metrics.describe("blinks_total", "Eye closures seen")
+    metrics.describe("selections_total", "Dwell selections acted on, by region")
+    metrics.describe("stage_seconds", "Time spent in each pipeline stage per frame")
+    metrics.describe("frame_seconds", "Pipeline time per frame")
+    metrics.describe("capture_latency_seconds", "Time from camera capture to finished result")
+    metrics.describe("glance_to_selection_seconds", "Time from the gaze reaching a region to its selection")
+    metrics.describe("fps", "Processed frames per second (exponential average)")
+    metrics.describe("uptime_seconds", "Seconds since metrics collection started")
+    return metrics
+
+
+class MetricsServer(threading.Thread):
+    """Serves PipelineMetrics as Prometheus text on http://host:port/metrics"""
+
+    def __init__(self, metrics, port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+        super().__init__(daemon=True)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # scrapes every few seconds would flood the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsDumper(threading.Thread):
+    """Appends a JSON snapshot of the metrics to a size-rotated file every interval seconds"""
+
+    def __init__(self, metrics, path, interval=60.0, max_bytes=5 * 1024 * 1024, backups=5):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        self._stop_event = threading.Event()
+
+    def dump(self):
+        text = json.dumps(self.metrics.snapshot())
+        self.handler.emit(logging.LogRecord("metrics", logging.INFO, "", 0, text, None, None))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        """Stop dumping, writing one last snapshot"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        self.dump()
+        self.handler.close()
@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+
+from face_models import EYES
+
+
+class MotionGate:
+    """Tells when the eyes look the same as at the last full evaluation
+
+    After every full landmark and pupil pass the gate keeps small
+    thumbnails of both eye boxes. On the next frames the same boxes are
+    thumbnailed again and compared (mean absolute difference in gray
+    levels); while that stays under `threshold` and the face box has not
+    moved, the earlier landmarks and eye gaze are still good and can be
+    reused. Comparing against the last full pass rather than the previous
+    frame means slow drift can't build up, and a full pass is forced at
+    least every `refresh` frames regardless. The eye gaze is kept from
+    before calibration and sensitivity are applied, so changes to those
+    take effect on reused frames straight away.
+    """
+
+    def __init__(self, threshold=1.5, refresh=10, thumb_size=(16, 8)):
+        self.threshold = threshold
+        self.refresh = refresh
+        self.thumb_size = thumb_size
+        self.reset()
+
+    def reset(self):
+        self.boxes = None
+        self.face = None
+        self.thumbs = None
+        self.landmarks = None
+        self.ear = None
+        self.eye_gaze = None
+        self.pupils = None
+        self.pupil_confidence = None
+        self.reused = 0
+        self.difference = None  # of the last check, for tuning
+
+    def thumbnails(self, gray, boxes):
+        thumbs = np.empty((len(boxes), self.thumb_size[1], self.thumb_size[0]), np.float32)
+        for index, (x_min, y_min, x_max, y_max) in enumerate(boxes):
+            if x_max - x_min < 1 or y_max - y_min < 1:
+                return None
+            thumbs[index] = cv2.resize(gray[y_min:y_max, x_min:x_max], self.thumb_size,
+                                       interpolation=cv2.INTER_AREA)
+        return thumbs
+
+    def unchanged(self, gray, face):
+        """Whether the previous evaluation can stand for this frame (counts it as reused if so)"""
+        self.difference = None
+        if self.thumbs is None or self.reused >= self.refresh:
+            return False
+
+        # A face box that moved (e.g. after a re-detect) means the eye boxes may be off
+        tolerance = 0.05 * face.width()
+        if (abs(face.left() - self.face.left()) > tolerance or abs(face.top() - self.face.top()) > tolerance
+                or abs(face.width() - self.face.width()) > tolerance):
+            return False
+
+        thumbs = self.thumbnails(gray, self.boxes)
+        if thumbs is None:
+            return False
+        self.difference = float(np.abs(thumbs - self.thumbs).mean())
+        if self.difference >= self.threshold:
+            return False
+        self.reused += 1
+        return True
+
+    def update(self, gray, face, boxes, result, eye_gaze):
+        """Remember a fully evaluated frame and its eye gaze (before map_gaze) as the new reference"""
+        self.boxes = np.asarray(boxes, dtype=np.int64)
+        self.face = face
+        self.thumbs = self.thumbnails(gray, self.boxes)
+        self.landmarks = result.landmarks
+        self.ear = result.ear
+        self.eye_gaze = eye_gaze
+        self.pupils = result.pupils
+        self.pupil_confidence = result.pupil_confidence
+        self.reused = 0
+
+
+class EyeLandmarkFlow:
+    """Carries the 12 eye landmarks from frame to frame with pyramidal Lucas-Kanade flow
+
+    After the shape predictor has run, the eye points are followed by optical
+    flow for up to `refresh` frames. Each point is tracked forwards and then
+    back again, and if any point is lost or returns more than `max_error`
+    pixels from where it started, tracking gives up and the predictor runs
+    again. Flow only looks at a crop around the eyes, and the other landmark
+    rows are shifted by the mean eye motion so the face box can keep
+    following them. The returned landmarks are rounded like the predictor's,
+    but the points are tracked at sub-pixel precision and precise() gives
+    them back for the EAR, which is steadier than re-predicting them.
+    """
+
+    def __init__(self, refresh=5, max_error=1.0, window=(15, 15), levels=2, margin=48):
+        self.refresh = refresh
+        self.max_error = max_error
+        self.window = window
+        self.levels = levels
+        self.margin = margin  # pixels around the eyes; the coarsest pyramid level must fit the motion
+        self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        self.previous = None
+        self.reset()
+
+    def reset(self):
+        self.points = None     # (12, 1, 2) float32 eye points in the previous frame
+        self.predicted = None  # the eye points and landmarks the predictor last gave
+        self.landmarks = None
+        self.tracked = 0       # frames since the predictor last ran
+        self.error = None      # worst forward-backward error of the last track, for tuning
+
+    def track(self, gray):
+        """(68, 2) landmarks for this frame from flow, or None if the predictor should run"""
+        self.error = None
+        if self.points is None or self.tracked >= self.refresh or self.previous.shape != gray.shape:
+            return None
+
+        # Both frames cropped to the eyes plus a margin, in crop coordinates
+        height, width = gray.shape
+        x_min, y_min = np.maximum(self.points.min(axis=(0, 1)).astype(int) - self.margin, 0)
+        x_max, y_max = np.minimum(self.points.max(axis=(0, 1)).astype(int) + self.margin + 1, (width, height))
+        offset = np.array([x_min, y_min], np.float32)
+        before = self.previous[y_min:y_max, x_min:x_max]
+        after = gray[y_min:y_max, x_min:x_max]
+        start = self.points - offset
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(before, after, start, None, winSize=self.window,
+                                                     maxLevel=self.levels, criteria=self.criteria)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(after, before, points, None, winSize=self.window,
+                                                        maxLevel=self.levels, criteria=self.criteria)
+        if not (status.all() and back_status.all()):
+            return None
+        self.error = float(np.linalg.norm(back - start, axis=2).max())
+        if self.error > self.max_error:
+            return None
+
+        self.points = points + offset
+        eye_points, landmarks = self.predicted
+        drift = (self.points - eye_points).reshape(-1, 2).mean(axis=0)
+        landmarks = landmarks + np.rint(drift).astype(np.int32)
+        landmarks[EYES] = np.rint(self.points.reshape(-1, 2))
+        self.tracked += 1
+        return landmarks
+
+    def precise(self, landmarks):
+        """Float copy of tracked landmarks with the eye rows at their sub-pixel positions"""
+        precise = landmarks.astype(np.float64)
+        precise[EYES] = self.points.reshape(-1, 2)
+        return precise
+
+    def remember(self, gray, landmarks, predicted):
+        """Keep this frame as the start of the next track; predicted resets the refresh count"""
+        if self.previous is None or self.previous.shape != gray.shape:
+            self.previous = np.empty_like(gray)
+        np.copyto(self.previous, gray)
+        if predicted or self.points is None:
+            self.points = landmarks[EYES].astype(np.float32).reshape(-1, 1, 2)
+            self.predicted = (self.points, landmarks)
+            self.tracked = 0
@@ -0,0 +1,89 @@
+import time
+
+
+POWER_MODES = ("active", "idle")
+
+
+class PowerScheduler:
+    """Lowers the frame rate and detection cost while there is nobody to track
+
+    Goes idle after idle_after seconds without a face, or sleep_after seconds
+    with the eyes closed: frames are then only taken idle_fps times a second
+    and the face detector runs on an idle_detection_width wide image. The
+    first frame with a face and open eyes switches straight back to active.
+    Time spent in each mode is kept in `seconds`.
+    """
+
+    # HOG finds faces of 80 px and up, so at 240 px a face must still span a third
+    # of the frame to wake the unit; a bedside camera comfortably does
+    def __init__(self, idle_after=30.0, sleep_after=120.0, idle_fps=4.0, idle_detection_width=240):
+        self.idle_after = idle_after
+        self.sleep_after = sleep_after
+        self.idle_fps = idle_fps
+        self.idle_detection_width = idle_detection_width
+        self.enabled = True
+        self.mode = "active"
+        self.seconds = dict.fromkeys(POWER_MODES, 0.0)
+        self.switches = 0
+        self.active_detection_width = None
+        self.last_attended = None  # last time a face with open eyes was seen
+        self.last_update = None
+
+    @property
+    def frame_interval(self):
+        """Minimum seconds between processed frames in the current mode"""
+        return 1.0 / self.idle_fps if self.mode == "idle" else 0.0
+
+    def update(self, result, pipeline, capture_thread=None, now=None):
+        """Account for one FrameResult and switch modes if due, returning the current mode
+
+        Applies the mode to the pipeline's detection width and to the capture
+        thread's frame interval (either may be a remote stand-in).
+        """
+        now = time.monotonic() if now is None else now
+        if self.last_update is not None:
+            self.seconds[self.mode] += now - self.last_update
+        self.last_update = now
+        if self.last_attended is None:
+            self.last_attended = now
+
+        attended = result.face_detected and result.eyes_open is not False
+        if attended or result.calibrating or not self.enabled:
+            self.last_attended = now
+            mode = "active"
+        else:
+            # No face for idle_after, or a face with the eyes closed for sleep_after
+            limit = self.sleep_after if result.face_detected else self.idle_after
+            mode = "idle" if now - self.last_attended >= limit else self.mode
+
+        if mode != self.mode:
+            self.switch(mode, pipeline, capture_thread)
+        return self.mode
+
+    def switch(self, mode, pipeline, capture_thread=None):
+        self.mode = mode
+        self.switches += 1
+        if mode == "idle":
+            self.active_detection_width = pipeline.detection_width
+            if 0 < self.idle_detection_width < pipeline.detection_width or pipeline.detection_width == 0:
+                pipeline.detection_width = self.idle_detection_width
+        elif self.active_detection_width is not None:
+            pipeline.detection_width = self.active_detection_width
+        if capture_thread is not None:
+            capture_thread.frame_interval = self.frame_interval
+
+    def reset(self, pipeline, capture_thread=None):
+        """Back to active with fresh timers, e.g. when tracking restarts"""
+        if self.mode != "active":
+            self.switch("active", pipeline, capture_thread)
+        self.last_attended = None
+        self.last_update = None
+
+    def shares(self):
+        """Fraction of the accounted time spent in each mode"""
+        total = sum(self.seconds.values())
+        return {mode: seconds / total if total else 0.0 for mode, seconds in self.seconds.items()}
+
+    def describe(self):
+        shares = self.shares()
+        return ", ".join(f"{mode} {self.seconds[mode]:.0f} s ({shares[mode]:.0%})" for mode in POWER_MODES)
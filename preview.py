@@ -0,0 +1,80 @@
+import time
+
+import cv2
+from PIL import Image, ImageTk
+
+
+class PreviewRenderer:
+    """Draws camera frames into a Tk label at a capped rate
+
+    One PhotoImage is reused for as long as the preview size stays the same,
+    frames are scaled down to fit the label before colour conversion, and in
+    kiosk mode no video is rendered at all.
+    """
+
+    def __init__(self, label, max_rate_hz=15, kiosk=False):
+        self.label = label
+        self.max_rate_hz = max_rate_hz
+        self.kiosk = kiosk
+        self.photo = None
+        self.last_render_time = 0
+        self.rendered = 0
+        self._scaled = None
+        self._rgb = None
+
+    def due(self, now=None):
+        """Whether enough time has passed since the last rendered frame"""
+        if self.kiosk:
+            return False
+        now = time.monotonic() if now is None else now
+        return self.max_rate_hz <= 0 or now - self.last_render_time >= 1.0 / self.max_rate_hz
+
+    def render(self, frame):
+        """Show a BGR frame, scaled down to the label size"""
+        if self.kiosk:
+            self.clear()
+            return
+        self.last_render_time = time.monotonic()
+        img = self.prepare(frame, self.label.winfo_width(), self.label.winfo_height())
+
+        # Paste into the existing PhotoImage when possible
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == img.size:
+            self.photo.paste(img)
+        else:
+            self.photo = ImageTk.PhotoImage(image=img)
+            self.label.config(image=self.photo)
+            self.label.image = self.photo  # Keep a reference to prevent garbage collection
+        self.rendered += 1
+
+    def prepare(self, frame, max_width, max_height):
+        """Scale a BGR frame to fit max_width x max_height and convert it to a PIL image
+
+        This is all of rendering except handing the image to Tk, so it can be
+        timed without a display.
+        """
+        # Fit inside the label, never scaling up
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if max_width > 1 and max_height > 1:
+            scale = min(1.0, max_width / width, max_height / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+
+        if scale < 1.0:
+            if self._scaled is None or self._scaled.shape[1::-1] != size:
+                self._scaled = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            else:
+                cv2.resize(frame, size, dst=self._scaled, interpolation=cv2.INTER_AREA)
+            frame = self._scaled
+
+        # Convert frame to format for tkinter
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = frame.copy()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return Image.fromarray(self._rgb)
+
+    def clear(self):
+        """Remove the video from the label"""
+        if self.photo is not None:
+            self.label.config(image='')
+            self.label.image = None
+            self.photo = None
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+
+# Eye crops are resized to this (width, height) so both eyes stack into one array
+PUPIL_CROP_SIZE = (32, 16)
+
+
+class GradientPupilLocator:
+    """Means-of-gradients pupil centre search (Timm & Barth), both eyes at once
+
+    Every eye crop is resized to crop_size and the centre is the point that
+    most image gradients point away from, weighted towards dark pixels. The
+    search is a dense dot product between every candidate pixel and the
+    strongest quarter of the gradients over the stacked crops, refined to
+    sub-pixel precision with a parabola through the peak and its
+    neighbours. The confidence is how far the peak stands above the average
+    of the objective, 0 for a closed eye or a flat crop.
+    """
+
+    def __init__(self, crop_size=PUPIL_CROP_SIZE, gradient_threshold=0.3, border=1):
+        self.crop_size = crop_size
+        self.gradient_threshold = gradient_threshold  # in standard deviations above the mean magnitude
+        width, height = crop_size
+        self.gradient_count = width * height // 4
+
+        # Unit displacement from every candidate centre to every pixel, (N, N) per axis
+        ys, xs = np.mgrid[0:height, 0:width]
+        points = np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float32)
+        offsets = points[None, :, :] - points[:, None, :]
+        norms = np.linalg.norm(offsets, axis=2)
+        norms[norms == 0] = 1.0
+        self.unit_x = offsets[..., 0] / norms
+        self.unit_y = offsets[..., 1] / norms
+
+        # Candidates on the crop border are ignored (eyelid corners, and no neighbours to refine with)
+        inside = np.zeros((height, width), bool)
+        inside[border:height - border, border:width - border] = True
+        self.inside = inside.ravel()
+        self.crops = None
+
+    def locate(self, gray, boxes):
+        """Pupil centres in gray's pixels and their confidences for (E, 4) eye boxes
+
+        Returns ((E, 2) float centres, (E,) confidences in 0-1); an empty box
+        gets the box centre with confidence 0.
+        """
+        width, height = self.crop_size
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        count = len(boxes)
+        if self.crops is None or len(self.crops) != count:
+            self.crops = np.empty((count, height, width), np.float32)
+        valid = np.zeros(count, bool)
+        for index, (x_min, y_min, x_max, y_max) in enumerate(boxes):
+            if x_max - x_min < 2 or y_max - y_min < 2:
+                self.crops[index] = 0
+                continue
+            cv2.resize(gray[y_min:y_max, x_min:x_max].astype(np.float32), self.crop_size,
+                       dst=self.crops[index], interpolation=cv2.INTER_AREA)
+            valid[index] = True
+
+        # Light smoothing, then gradients of the whole stack in one go
+        crops = self.crops.copy()
+        crops[:, 1:-1, 1:-1] = (crops[:, :-2, 1:-1] + crops[:, 2:, 1:-1] + crops[:, 1:-1, :-2]
+                                + crops[:, 1:-1, 2:] + 4 * crops[:, 1:-1, 1:-1]) / 8
+        grad_y, grad_x = np.gradient(crops, axis=(1, 2))
+        magnitude = np.hypot(grad_x, grad_y).reshape(count, -1)
+        threshold = (magnitude.mean(axis=1) + self.gradient_threshold * magnitude.std(axis=1))[:, None]
+        strong = (magnitude > threshold) & (magnitude > 1e-3)
+        scale = np.where(strong, 1.0 / np.maximum(magnitude, 1e-6), 0.0)
+
+        # Only the strongest gradients take part, as unit vectors
+        keep = np.argpartition(-magnitude, self.gradient_count, axis=1)[:, :self.gradient_count]
+        scale = np.take_along_axis(scale, keep, axis=1)
+        grad_x = np.take_along_axis(grad_x.reshape(count, -1), keep, axis=1) * scale
+        grad_y = np.take_along_axis(grad_y.reshape(count, -1), keep, axis=1) * scale
+        unit_x = self.unit_x[:, keep].transpose(1, 0, 2)  # (E, candidates, gradients)
+        unit_y = self.unit_y[:, keep].transpose(1, 0, 2)
+        used = np.count_nonzero(scale, axis=1)
+
+        # Objective per candidate: mean squared positive alignment of displacement and gradient
+        dots = unit_x * grad_x[:, None, :]
+        dots += unit_y * grad_y[:, None, :]
+        np.maximum(dots, 0, out=dots)
+        objective = np.einsum("eij,eij->ei", dots, dots) / np.maximum(used, 1)[:, None]
+
+        # Dark pixels are more likely pupil centres
+        darkness = 255.0 - crops.reshape(count, -1)
+        objective *= darkness / 255.0
+        objective[:, ~self.inside] = 0.0
+
+        peaks = objective.argmax(axis=1)
+        peak_values = objective[np.arange(count), peaks]
+        mean_values = objective[:, self.inside].mean(axis=1)
+        confidence = np.where(peak_values > 0, (peak_values - mean_values) / np.maximum(peak_values, 1e-9), 0.0)
+        confidence[~valid | (used < 4)] = 0.0
+
+        grid = objective.reshape(count, height, width)
+        py, px = np.divmod(peaks, width)
+        centres = np.empty((count, 2))
+        for index in range(count):
+            dx = self.refine(grid[index, py[index], px[index] - 1:px[index] + 2])
+            dy = self.refine(grid[index, py[index] - 1:py[index] + 2, px[index]])
+            x_min, y_min, x_max, y_max = boxes[index]
+            if not valid[index]:
+                centres[index] = (x_min + x_max) / 2, (y_min + y_max) / 2
+                continue
+            # Back from crop pixel centres to frame pixels
+            centres[index, 0] = x_min + (px[index] + dx + 0.5) * (x_max - x_min) / width - 0.5
+            centres[index, 1] = y_min + (py[index] + dy + 0.5) * (y_max - y_min) / height - 0.5
+        return centres, confidence
+
+    @staticmethod
+    def refine(values):
+        """Sub-pixel offset of a peak from three samples around it (parabola vertex)"""
+        if len(values) != 3:
+            return 0.0
+        left, centre, right = values
+        curvature = left - 2 * centre + right
+        if curvature >= 0:
+            return 0.0
+        return float(np.clip(0.5 * (left - right) / curvature, -0.5, 0.5))
@@ -0,0 +1,299 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from dwell import DwellTimer, RegionIndex
+from gaze_filters import GAZE_FILTERS, create_filter
+
+
+RECORDING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+RECORDING_VERSION = 1
+
+# One fixed-size record per processed frame. The .gaze file is nothing but these
+# records back to back, so it can be appended to and np.memmap'ed as it grows;
+# names and settings live in a JSON sidecar next to it.
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("flags", "u1"),               # FLAG_* bits
+    ("landmarks", "<i2", (68, 2)),
+    ("ear", "<f4"),
+    ("raw_gaze", "<f4", (2,)),     # calibrated gaze (0-1) before smoothing
+    ("gaze", "<f4", (2,)),         # smoothed gaze (0-1)
+    ("region", "<i2"),             # index into the sidecar's region_names, -1 for none
+    ("lock_progress", "<f4"),
+])
+
+FLAG_FACE = 1
+FLAG_EYES_OPEN = 2
+FLAG_CALIBRATING = 4
+FLAG_DETECTOR_RAN = 8
+FLAG_SELECTED = 16
+FLAG_REUSED = 32      # landmarks and raw gaze carried over by the motion gate
+FLAG_FLOW = 64        # eye landmarks followed by optical flow
+
+NO_LANDMARKS = np.zeros((68, 2), dtype=np.int16)
+
+
+def meta_path(path):
+    return path + ".json"
+
+
+def new_recording_path(patient="session", directory=RECORDING_DIR):
+    """Timestamped file name for a new recording, numbered if that second is already taken"""
+    os.makedirs(directory, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in patient.strip()) or "session"
+    stem = os.path.join(directory, f"{safe_name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    path = stem + ".gaze"
+    number = 1
+    while os.path.exists(path) or os.path.exists(meta_path(path)):
+        number += 1
+        path = f"{stem}-{number}.gaze"
+    return path
+
+
+class SessionRecorder:
+    """Appends FrameResults to a .gaze file from a background writer thread
+
+    record() only packs the frame into a tuple and queues it, so the tracking
+    loop never waits on the disk. If the writer falls more than max_pending
+    frames behind, new frames are dropped and counted in `dropped`. The file
+    must not exist yet (FileExistsError), see new_recording_path.
+    """
+
+    def __init__(self, path, screen_width, screen_height, settings=None, max_pending=1024,
+                 flush_interval=1.0):
+        self.path = path
+        self.meta = {
+            "version": RECORDING_VERSION,
+            "dtype": RECORD_DTYPE.descr,
+            "screen": [screen_width, screen_height],
+            "started_at": time.time(),
+            "settings": settings or {},
+            "region_names": [],
+            "layouts": [],   # {"from_frame": n, "regions": {...}}, one per region layout change
+        }
+        self.region_index = {}
+        self.regions = None
+        self.regions_source = None  # the dict last passed in, so unchanged layouts skip the comparison
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue(max_pending)
+        self._meta_lock = threading.Lock()
+        self._meta_changed = False  # set by set_regions, the writer thread rewrites the sidecar
+        self._file = open(path, "xb")  # never append to, or overwrite, an earlier session
+        self._write_meta()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def record(self, result, regions=None):
+        """Queue one FrameResult; regions is the layout the pipeline hit-tested against"""
+        if regions is not None and regions is not self.regions_source:
+            self.regions_source = regions
+            if regions != self.regions:
+                self.set_regions(regions)
+
+        flags = ((FLAG_FACE if result.face_detected else 0)
+                 | (FLAG_EYES_OPEN if result.eyes_open else 0)
+                 | (FLAG_CALIBRATING if result.calibrating else 0)
+                 | (FLAG_DETECTOR_RAN if result.face_detector_ran else 0)
+                 | (FLAG_SELECTED if result.selection else 0)
+                 | (FLAG_REUSED if result.reused else 0)
+                 | (FLAG_FLOW if result.flow_tracked else 0))
+        landmarks = result.landmarks.astype(np.int16) if result.landmarks is not None else NO_LANDMARKS
+        region = self.region_index.get(result.region, -1)
+        record = (result.timestamp, flags, landmarks,
+                  result.ear if result.ear is not None else np.nan,
+                  result.raw_gaze or (np.nan, np.nan), result.gaze or (np.nan, np.nan),
+                  region, result.lock_progress)
+        try:
+            self._pending.put_nowait(record)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def set_regions(self, regions):
+        """Start a new region layout from the next recorded frame (the sidecar is written later)"""
+        self.regions = dict(regions)
+        with self._meta_lock:
+            for name in regions:
+                if name not in self.region_index:
+                    self.region_index[name] = len(self.meta["region_names"])
+                    self.meta["region_names"].append(name)
+            self.meta["layouts"].append({"from_frame": self.queued,
+                                         "regions": {name: list(box) for name, box in regions.items()}})
+            self._meta_changed = True
+
+    def _write_meta(self):
+        with self._meta_lock:
+            self._meta_changed = False
+            self.meta["frames"] = self.written
+            self.meta["dropped"] = self.dropped
+            tmp_path = meta_path(self.path) + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.meta, f, indent=1)
+            os.replace(tmp_path, meta_path(self.path))
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None marks the end of the session
+            done = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                self._file.write(np.array(records, dtype=RECORD_DTYPE).tobytes())
+                self.written += len(records)
+            if self._meta_changed:
+                self._write_meta()
+            if done:
+                break
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+    def close(self):
+        """Write out everything queued and finish the sidecar"""
+        self._pending.put(None)
+        self._thread.join()
+        self._file.close()
+        self.meta["ended_at"] = time.time()
+        self._write_meta()
+
+
+def load_recording(path):
+    """Memory-map a .gaze file, returning (records, meta)
+
+    A partly written last record (e.g. after a crash) is ignored.
+    """
+    with open(meta_path(path)) as f:
+        meta = json.load(f)
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE), meta
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,)), meta
+
+
+def replay(records, meta, lock_time=2.0, ear_threshold=0.2, smoothing="moving_average",
+           smoothing_params=None, regions=None, region_hysteresis=None):
+    """Run recorded raw gaze through smoothing, hit-testing and dwell selection
+
+    Works the same way GazePipeline does from raw gaze onwards, with new
+    settings and no camera or dlib. regions overrides the recorded layouts,
+    region_hysteresis the recorded hysteresis (none for older recordings).
+    Returns a dict with the selections made and the blinks seen.
+    """
+    screen_width, screen_height = meta["screen"]
+    gaze_filter = create_filter(smoothing, **(smoothing_params or {}))
+    dwell = DwellTimer()
+
+    # Layout changes as (frame index, regions), consumed in order
+    layouts = [(layout["from_frame"], layout["regions"]) for layout in meta["layouts"]]
+    region_index = RegionIndex(regions if regions is not None else {})
+    next_layout = 0
+    if region_hysteresis is None:
+        region_hysteresis = meta["settings"].get("region_hysteresis", 0)
+
+    flags = np.asarray(records["flags"])
+    timestamps = np.asarray(records["timestamp"])
+    raw_gaze = np.asarray(records["raw_gaze"], dtype=np.float64)
+    ear = np.asarray(records["ear"])
+
+    face = (flags & FLAG_FACE) != 0
+    calibrating = (flags & FLAG_CALIBRATING) != 0
+    closed = face & (ear < ear_threshold)
+    blinks = int(np.count_nonzero(closed[1:] & ~closed[:-1]) + (len(closed) > 0 and closed[0]))
+
+    selections = []
+    for index in range(len(records)):
+        if regions is None:
+            while next_layout < len(layouts) and layouts[next_layout][0] <= index:
+                region_index = RegionIndex(layouts[next_layout][1])
+                next_layout += 1
+        if not face[index]:
+            dwell.reset()
+            continue
+
+        timestamp = timestamps[index]
+        if np.isnan(raw_gaze[index, 0]):
+            # No reliable pupil fix, the pipeline held the last gaze
+            if gaze_filter.value is None:
+                continue
+            gaze_x, gaze_y = gaze_filter.value
+        else:
+            gaze_x, gaze_y = gaze_filter.update(raw_gaze[index, 0], raw_gaze[index, 1], timestamp)
+        if calibrating[index]:
+            continue
+
+        region = region_index.find(int(gaze_x * screen_width), int(gaze_y * screen_height),
+                                   dwell.locked_region, region_hysteresis)
+        _, selected = dwell.update(region, timestamp, lock_time)
+        if selected:
+            selections.append((float(timestamp), region))
+
+    return {"frames": len(records), "face_frames": int(face.sum()), "blinks": blinks,
+            "selections": selections}
+
+
+def recorded_selections(records, meta):
+    """The (timestamp, region) selections made live while recording"""
+    names = meta["region_names"]
+    selected = np.flatnonzero(np.asarray(records["flags"]) & FLAG_SELECTED)
+    return [(float(records["timestamp"][i]), names[records["region"][i]]) for i in selected]
+
+
+def parse_values(text, convert=float):
+    return [convert(value) for value in text.split(",")]
+
+
+def main():
+    """Replay recordings with other settings, sweeping every combination given"""
+    parser = argparse.ArgumentParser(description="Replay recorded gaze sessions through dwell selection")
+    parser.add_argument("recordings", nargs="+", help=".gaze files")
+    parser.add_argument("--lock-time", default="2.0", help="seconds, or a comma-separated list to sweep")
+    parser.add_argument("--ear-threshold", default="0.2", help="value or comma-separated list")
+    parser.add_argument("--smoothing", default="moving_average",
+                        help=f"filter name(s), comma-separated, from: {', '.join(GAZE_FILTERS)}")
+    parser.add_argument("--smoothing-params", default="{}", help="JSON keyword arguments for the filter")
+    args = parser.parse_args()
+
+    smoothing_params = json.loads(args.smoothing_params)
+    sessions = []
+    for path in args.recordings:
+        records, meta = load_recording(path)
+        live = recorded_selections(records, meta)
+        duration = float(records["timestamp"][-1] - records["timestamp"][0]) if len(records) > 1 else 0.0
+        print(f"{path}: {len(records)} frames, {duration / 60:.1f} min, {len(live)} selections live")
+        sessions.append((records, meta))
+
+    print(f"\n{'lock_time':>9} {'ear':>6} {'smoothing':<16}{'selections':>11}{'blinks':>8}")
+    start = time.perf_counter()
+    frames = 0
+    for lock_time, ear_threshold, smoothing in itertools.product(
+            parse_values(args.lock_time), parse_values(args.ear_threshold), args.smoothing.split(",")):
+        selections = blinks = 0
+        for records, meta in sessions:
+            summary = replay(records, meta, lock_time, ear_threshold, smoothing, smoothing_params)
+            selections += len(summary["selections"])
+            blinks += summary["blinks"]
+            frames += summary["frames"]
+        print(f"{lock_time:>9.2f} {ear_threshold:>6.2f} {smoothing:<16}{selections:>11}{blinks:>8}")
+    elapsed = time.perf_counter() - start
+    print(f"\nReplayed {frames} frames in {elapsed:.2f}s ({frames / elapsed if elapsed > 0 else 0:.0f} fps)")
+
+
+if __name__ == "__main__":
+    main()
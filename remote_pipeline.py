@@ -0,0 +1,270 @@
+import multiprocessing
+import queue
+import time
+
+from shared_frames import SharedFrameRing
+
+
+# GazePipeline attributes copied to the inference process whenever they are set
+FORWARDED_SETTINGS = ("lock_time", "ear_threshold", "gaze_sensitivity", "mirror", "regions",
+                      "face_tracking", "redetect_interval", "detection_width", "calibration",
+                      "pupil_method", "motion_gating", "landmark_flow", "region_hysteresis")
+
+
+def inference_worker(screen_width, screen_height, predictor_path, detector, commands, results, waiting):
+    """Inference process: run GazePipeline on frames handed over through a SharedFrameRing
+
+    Messages in: ("ring", spec), ("frame", sequence), ("set", name, value),
+    ("call", name, args, kwargs), ("stop",). Messages out: ("ready",),
+    ("error", text), ("calibration", model), ("result", sequence, FrameResult).
+    """
+    from gaze_pipeline import GazePipeline
+
+    try:
+        pipeline = GazePipeline(screen_width, screen_height, predictor_path=predictor_path, detector=detector)
+        pipeline.debug_level = "off"  # overlays would be drawn on a copy nobody sees
+        pipeline.load_models()
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready",))
+
+    ring = None
+    frame = None
+    running = True
+    while running:
+        # Apply everything queued, keeping only the newest frame
+        waiting.value = 1
+        messages = [commands.get()]
+        waiting.value = 0
+        while True:
+            try:
+                messages.append(commands.get_nowait())
+            except queue.Empty:
+                break
+
+        sequence = None
+        for message in messages:
+            kind = message[0]
+            if kind == "frame":
+                sequence = message[1]
+            elif kind == "set":
+                setattr(pipeline, message[1], message[2])
+            elif kind == "call":
+                getattr(pipeline, message[1])(*message[2], **message[3])
+            elif kind == "ring":
+                if ring is not None:
+                    ring.close()
+                ring = SharedFrameRing.attach(message[1])
+                frame = None
+            elif kind == "stop":
+                running = False
+        if sequence is None or ring is None or not running:
+            continue
+
+        read_start = time.perf_counter()
+        if frame is None:
+            frame = ring.frames[0].copy()
+        item = ring.read(sequence, out=frame)
+        if item is None:
+            continue  # overwritten before we got to it
+        _, captured_at = item
+        read_ms = (time.perf_counter() - read_start) * 1000
+
+        result = pipeline.process(frame, captured_at)
+        result.stage_ms["handoff_read"] = read_ms
+        if any(event.kind == "calibration_complete" for event in result.events):
+            results.put(("calibration", pipeline.calibration))
+        result.frame = None  # the frame stays in the ring, only the small record goes back
+        results.put(("result", sequence, result))
+
+    if ring is not None:
+        ring.close()
+
+
+class RemotePipeline:
+    """GazePipeline stand-in that runs inference in a separate process
+
+    Frames go into a SharedFrameRing through `frames` (which CaptureThread
+    can write to like a LatestFrameQueue) and FrameResults come back without
+    images from get_result(), which re-attaches the frame from the ring. Setting
+    attributes in FORWARDED_SETTINGS and calling the calibration and smoothing
+    methods is passed on to the inference process, so the Tk process never
+    holds the GIL for detection or landmark work.
+    """
+
+    def __init__(self, screen_width, screen_height, predictor_path, detector="hog", ring_slots=4):
+        self._started = False
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.predictor_path = predictor_path
+        self.detector = detector
+        self.ring_slots = ring_slots
+
+        # Local copies of the pipeline state the UI reads
+        self.lock_time = 2.0
+        self.ear_threshold = 0.2
+        self.gaze_sensitivity = 1.0
+        self.mirror = True
+        self.regions = {}
+        self.region_hysteresis = 30
+        self.face_tracking = "landmarks"
+        self.redetect_interval = 10
+        self.detection_width = 320
+        self.pupil_method = "threshold"
+        self.motion_gating = True
+        self.landmark_flow = False
+        self.debug_level = "off"
+        self.calibration = None
+        self.calibration_mode = False
+        self.smoothing = "moving_average"
+        self.smoothing_params = {"window": 10}
+
+        self.context = multiprocessing.get_context("spawn")
+        self.commands = self.context.Queue()
+        self.results = self.context.Queue()
+        self.waiting = self.context.Value("b", 0, lock=False)
+        self.process = None
+        self.ring = None
+        self.frames = FrameSink(self)
+        self.put_ms = 0.0  # time spent writing the last frame into the ring
+        self.received = 0
+        self._scratch = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in FORWARDED_SETTINGS and self._started:
+            self.commands.put(("set", name, value))
+
+    def load_models(self, progress=None):
+        """Start the inference process and wait until it has loaded its models"""
+        if progress:
+            progress(40, "Starting inference process...")
+        self.process = self.context.Process(
+            target=inference_worker, name="inference", daemon=True,
+            args=(self.screen_width, self.screen_height, self.predictor_path, self.detector,
+                  self.commands, self.results, self.waiting))
+        self.process.start()
+        while True:
+            try:
+                message = self.results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    message = ("error", f"exit code {self.process.exitcode}")
+                    break
+        if message[0] == "error":
+            self.process.join(timeout=1.0)
+            raise RuntimeError(f"Inference process failed to start: {message[1]}")
+        self._started = True
+        for name in FORWARDED_SETTINGS:
+            self.commands.put(("set", name, getattr(self, name)))
+        if progress:
+            progress(100, "Models loaded")
+
+    @property
+    def models_loaded(self):
+        return self._started
+
+    @property
+    def failed(self):
+        return self._started and not self.process.is_alive()
+
+    def _call(self, name, *args, **kwargs):
+        self.commands.put(("call", name, args, kwargs))
+
+    def reset(self):
+        self._call("reset")
+
+    def set_smoothing(self, name, **params):
+        self.smoothing = name
+        self.smoothing_params = params
+        self._call("set_smoothing", name, **params)
+
+    def start_calibration(self):
+        self.calibration_mode = True
+        self._call("start_calibration")
+
+    def stop_calibration(self):
+        self.calibration_mode = False
+        self._call("stop_calibration")
+
+    def submit(self, frame, timestamp):
+        """Copy a frame into the ring and tell the inference process about it"""
+        start = time.perf_counter()
+        if self.ring is None or self.ring.shape != frame.shape:
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = SharedFrameRing.create(frame.shape, self.ring_slots)
+            self.commands.put(("ring", self.ring.spec))
+        sequence = self.ring.write(frame, timestamp)
+        self.commands.put(("frame", sequence))
+        self.put_ms = (time.perf_counter() - start) * 1000
+        return sequence
+
+    def get_result(self, timeout=None):
+        """Next FrameResult from the inference process (None on timeout), with its frame"""
+        import cv2
+        from calibration import draw_calibration_target
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                message = self.results.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if message[0] == "calibration":
+                object.__setattr__(self, "calibration", message[1])
+            elif message[0] == "result":
+                break
+
+        _, sequence, result = message
+        self.received += 1
+        self.calibration_mode = result.calibrating
+
+        # Give the result its (mirrored) frame back, if the ring still holds it. The
+        # worker's drawing is lost with it, so the calibration target is drawn again
+        if self._scratch is None or self._scratch.shape != self.ring.shape:
+            self._scratch = self.ring.frames[0].copy()
+        item = self.ring.read(sequence, out=self._scratch)
+        if item is not None:
+            result.frame = cv2.flip(self._scratch, 1) if self.mirror else self._scratch.copy()
+            if result.calibration_target is not None:
+                draw_calibration_target(result.frame, result.calibration_target, self.screen_width)
+        return result
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.commands.put(("stop",))
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class FrameSink:
+    """LatestFrameQueue-like producer side of a RemotePipeline, for CaptureThread"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.closed = False
+        self.put_count = 0
+
+    @property
+    def dropped(self):
+        """Frames the inference process skipped for a newer one (give or take one in flight)"""
+        return max(0, self.put_count - self.pipeline.received - 1)
+
+    def put(self, item):
+        frame, timestamp = item
+        self.pipeline.submit(frame, timestamp)
+        self.put_count += 1
+
+    def wanted(self):
+        return bool(self.pipeline.waiting.value)
+
+    def close(self):
+        self.closed = True
@@ -0,0 +1,112 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """Ring of fixed-size images in one multiprocessing.shared_memory block
+
+    One process writes, any number of others read the newest frame. Each slot
+    carries a sequence number that is cleared while the slot is being written
+    and set once it is complete, so a reader can tell when a frame it copied
+    was overwritten underneath it and try again (a seqlock). Pass `spec` to
+    another process and open the ring there with SharedFrameRing.attach.
+    """
+
+    def __init__(self, memory, shape, slots, dtype, owner):
+        self.memory = memory
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+
+        # Header: [latest sequence, per-slot sequence...] then per-slot timestamps
+        header = 8 * (1 + 2 * slots)
+        self._sequences = np.ndarray((1 + slots,), dtype=np.int64, buffer=memory.buf)
+        self._timestamps = np.ndarray((slots,), dtype=np.float64, buffer=memory.buf,
+                                      offset=8 * (1 + slots))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=memory.buf,
+                                 offset=header)
+        self.next_sequence = 1
+
+    @classmethod
+    def create(cls, shape, slots=3, dtype=np.uint8):
+        frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        memory = shared_memory.SharedMemory(create=True, size=8 * (1 + 2 * slots) + slots * frame_bytes)
+        ring = cls(memory, shape, slots, dtype, owner=True)
+        ring._sequences[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, slots, dtype = spec
+        ring = cls(shared_memory.SharedMemory(name=name), shape, slots, dtype, owner=False)
+        # A writer that replaces an earlier one (e.g. a restarted worker) carries on its
+        # numbering, so readers waiting for frames newer than the last one still get them
+        ring.next_sequence = ring.latest_sequence + 1
+        return ring
+
+    @property
+    def spec(self):
+        """Picklable description for SharedFrameRing.attach"""
+        return self.memory.name, self.shape, self.slots, self.dtype.str
+
+    @property
+    def latest_sequence(self):
+        return int(self._sequences[0])
+
+    # Writer side
+
+    def begin_write(self):
+        """Claim the next slot, returning (slot, writable view); finish with commit()"""
+        slot = self.next_sequence % self.slots
+        self._sequences[1 + slot] = 0
+        return slot, self.frames[slot]
+
+    def commit(self, slot, timestamp):
+        """Publish a slot filled after begin_write, returning its sequence number"""
+        sequence = self.next_sequence
+        self._timestamps[slot] = timestamp
+        self._sequences[1 + slot] = sequence
+        self._sequences[0] = sequence
+        self.next_sequence += 1
+        return sequence
+
+    def write(self, frame, timestamp):
+        slot, view = self.begin_write()
+        np.copyto(view, frame)
+        return self.commit(slot, timestamp)
+
+    # Reader side
+
+    def read(self, sequence, out=None):
+        """Copy out the frame with this sequence number, or None if it has been overwritten"""
+        slot = sequence % self.slots
+        if self._sequences[1 + slot] != sequence:
+            return None
+        timestamp = float(self._timestamps[slot])
+        if out is None:
+            out = self.frames[slot].copy()
+        else:
+            np.copyto(out, self.frames[slot])
+        if self._sequences[1 + slot] != sequence:
+            return None  # the writer lapped us mid-copy
+        return out, timestamp
+
+    def read_latest(self, after=0, out=None):
+        """(sequence, frame, timestamp) of the newest frame newer than `after`, else None"""
+        for _ in range(3):
+            sequence = self.latest_sequence
+            if sequence <= after:
+                return None
+            item = self.read(sequence, out)
+            if item is not None:
+                return (sequence,) + item
+        return None
+
+    def close(self):
+        """Detach; the creating process also frees the memory"""
+        self._sequences = self._timestamps = self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
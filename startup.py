@@ -0,0 +1,22 @@
+import time
+
+# Taken when this module is first imported. Entry points import it before
+# anything heavy, so their "imports" mark covers the time spent importing.
+PROCESS_START = time.perf_counter()
+
+
+class StartupTimer:
+    """Records how long startup milestones took, in seconds since PROCESS_START"""
+
+    def __init__(self, start=PROCESS_START):
+        self.start = start
+        self.marks = {}
+
+    def mark(self, name):
+        """Record a milestone the first time it is reached"""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.marks.items())
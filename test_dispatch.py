@@ -0,0 +1,92 @@
+import json
+import time
+
+import pytest
+
+from dispatch import EventDispatcher, MemorySink, SelectionEvent, create_sink, load_sinks
+
+
+def events(count):
+    return [SelectionEvent(f"R{i}", float(i)) for i in range(count)]
+
+
+def test_delivers_every_event_in_order():
+    sink = MemorySink()
+    dispatcher = EventDispatcher([sink])
+    for event in events(10):
+        dispatcher.publish(event)
+    dispatcher.close()
+    assert [event.region for event in sink.events] == [f"R{i}" for i in range(10)]
+    assert dispatcher.stats() == {"delivered": 10, "failed": 0, "dropped": 0, "retries": 0}
+
+
+def test_batches_events_published_together():
+    sink = MemorySink()
+    dispatcher = EventDispatcher([sink], max_batch=4, batch_window=0.2)
+    for event in events(8):
+        dispatcher.publish(event)
+    dispatcher.close()
+    assert len(sink.events) == 8
+    assert sink.batches <= 3  # the first event may go out alone, the rest in batches of up to 4
+
+
+def test_retries_a_failing_sink():
+    sink = MemorySink(failures=2)
+    dispatcher = EventDispatcher([sink], retry_delay=0.01)
+    dispatcher.publish(events(1)[0])
+    dispatcher.close()
+    assert len(sink.events) == 1
+    assert dispatcher.stats()["retries"] == 2
+    assert dispatcher.stats()["failed"] == 0
+
+
+def test_gives_up_after_max_retries():
+    sink = MemorySink(failures=10)
+    dispatcher = EventDispatcher([sink], max_retries=2, retry_delay=0.01)
+    dispatcher.publish(events(1)[0])
+    dispatcher.close()
+    assert sink.events == []
+    assert dispatcher.stats()["failed"] == 1
+    assert dispatcher.stats()["retries"] == 2
+
+
+def test_slow_sink_never_blocks_and_drops_oldest():
+    sink = MemorySink(delay=0.2)
+    dispatcher = EventDispatcher([sink], max_pending=5, max_batch=100, batch_window=0.0)
+    start = time.perf_counter()
+    for event in events(50):
+        dispatcher.publish(event)
+    assert time.perf_counter() - start < 0.1
+    dispatcher.close(timeout=5.0)
+
+    stats = dispatcher.stats()
+    assert stats["dropped"] > 0
+    assert stats["delivered"] + stats["dropped"] == 50
+    assert sink.events[-1].region == "R49"  # the newest events are the ones kept
+
+
+def test_one_slow_sink_does_not_delay_another():
+    slow, fast = MemorySink(delay=0.5), MemorySink()
+    dispatcher = EventDispatcher([slow, fast])
+    dispatcher.publish(events(1)[0])
+    deadline = time.monotonic() + 0.3
+    while not fast.events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(fast.events) == 1
+    assert slow.events == []
+    dispatcher.close()
+
+
+def test_create_sink_rejects_unknown_types():
+    assert isinstance(create_sink({"type": "memory", "delay": 0.1}), MemorySink)
+    with pytest.raises(ValueError):
+        create_sink({"type": "pager"})
+
+
+def test_load_sinks(tmp_path):
+    assert load_sinks(str(tmp_path / "missing.json")) == []
+
+    path = tmp_path / "sinks.json"
+    path.write_text(json.dumps({"sinks": [{"type": "memory"}, {"type": "pager"}]}))
+    sinks = load_sinks(str(path))
+    assert [type(sink) for sink in sinks] == [MemorySink]  # the unknown one is skipped with a warning
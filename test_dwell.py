@@ -0,0 +1,55 @@
+import random
+
+from dwell import NEXT_PAGE, PREVIOUS_PAGE, RegionIndex, board_pages, default_regions, find_region, grid_pages
+
+
+def test_region_index_matches_find_region():
+    rng = random.Random(1)
+    for _ in range(20):
+        regions = {}
+        for i in range(rng.randint(0, 60)):
+            x, y = rng.randint(-50, 1900), rng.randint(-50, 1000)
+            regions[f"R{i}"] = (x, y, x + rng.randint(0, 300), y + rng.randint(0, 300))
+        index = RegionIndex(regions)
+        for _ in range(500):
+            x, y = rng.randint(-100, 2000), rng.randint(-100, 1200)
+            assert index.find(x, y) == find_region(regions, x, y)
+
+
+def test_hysteresis_keeps_the_current_region():
+    regions = {"A": (0, 0, 100, 100), "B": (110, 0, 210, 100)}
+    index = RegionIndex(regions)
+    assert index.find(115, 50) == "B"
+    assert index.find(115, 50, current="A", hysteresis=30) == "A"
+    assert index.find(135, 50, current="A", hysteresis=30) == "B"
+
+
+def overlaps(a, b):
+    return not (a[2] < b[0] or b[2] < a[0] or a[3] < b[1] or b[3] < a[1])
+
+
+def test_grid_pages_fit_every_target_without_overlap():
+    names = [f"T{i}" for i in range(200)]
+    pages = grid_pages(names, 1920, 1080, region_size=150)
+    assert len(pages) > 1
+    assert [name for page in pages for name in page if name not in (PREVIOUS_PAGE, NEXT_PAGE)] == names
+    for page in pages:
+        assert PREVIOUS_PAGE in page and NEXT_PAGE in page
+        boxes = list(page.values())
+        for i, box in enumerate(boxes):
+            assert 0 <= box[0] and box[2] <= 1920 and 0 <= box[1] and box[3] <= 1080
+            assert not any(overlaps(box, other) for other in boxes[i + 1:])
+
+
+def test_small_grid_is_centred():
+    (page,) = grid_pages(["A"], 1920, 1080)
+    x1, y1, x2, y2 = page["A"]
+    assert (x1 + x2) // 2 == 960 and (y1 + y2) // 2 == 540
+
+
+def test_board_keeps_the_standard_layout_for_a_few_custom_regions():
+    standard = default_regions(1920, 1080)
+    (page,) = board_pages(["Yes", "No"], 1920, 1080)
+    assert {name: page[name] for name in standard} == standard
+    assert len(page) == 7
+    assert len(board_pages([f"C{i}" for i in range(5)], 1920, 1080)[0]) == 10  # a grid from the fifth
@@ -0,0 +1,19 @@
+from metrics import PipelineMetrics, format_labels
+
+
+def test_format_labels():
+    assert format_labels(()) == ""
+    assert format_labels((("stage", "render"), ("le", "0.5"))) == '{stage="render",le="0.5"}'
+
+
+def test_format_labels_escapes_values():
+    labels = (("region", 'say "hi"\nC:\\'),)
+    assert format_labels(labels) == '{region="say \\"hi\\"\\nC:\\\\"}'
+
+
+def test_selection_region_names_stay_on_one_line():
+    metrics = PipelineMetrics()
+    metrics.record_selection('Line one\nsays "hello"', now=1.0)
+    lines = [line for line in metrics.prometheus_text().splitlines()
+             if line.startswith("eyetracker_selections_total")]
+    assert lines == ['eyetracker_selections_total{region="Line one\\nsays \\"hello\\""} 1']
@@ -0,0 +1,76 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from dwell import DwellTimer, RegionIndex, default_regions
+from gaze_filters import create_filter
+from recording import SessionRecorder, load_recording, new_recording_path, recorded_selections, replay
+
+SCREEN = (1920, 1080)
+
+
+def live_session(frames=300, fps=30.0, lock_time=1.0):
+    """FrameResult-like records of gaze moving between regions, hit-tested the way GazePipeline does"""
+    regions = default_regions(*SCREEN)
+    index = RegionIndex(regions)
+    gaze_filter = create_filter("moving_average", window=10)
+    dwell = DwellTimer()
+    rng = np.random.default_rng(0)
+    targets = [(0.07, 0.11), (0.5, 0.5), (0.93, 0.89)]
+    results = []
+    for i in range(frames):
+        timestamp = i / fps
+        target = targets[(i // 100) % len(targets)]
+        raw = tuple(float(v) for v in np.clip(np.array(target) + rng.normal(0, 0.01, 2), 0, 1))
+        gaze = gaze_filter.update(*raw, timestamp)
+        region = index.find(int(gaze[0] * SCREEN[0]), int(gaze[1] * SCREEN[1]), dwell.locked_region, 30)
+        progress, selected = dwell.update(region, timestamp, lock_time)
+        results.append(SimpleNamespace(
+            timestamp=timestamp, face_detected=True, eyes_open=True, calibrating=False,
+            face_detector_ran=i == 0, reused=False, flow_tracked=False,
+            selection=region if selected else None, landmarks=np.zeros((68, 2), np.int32), ear=0.3,
+            raw_gaze=raw, gaze=gaze, region=region, lock_progress=progress))
+    return regions, results
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    path = str(tmp_path / "session.gaze")
+    regions, results = live_session()
+    settings = {"lock_time": 1.0, "smoothing": "moving_average", "smoothing_params": {"window": 10},
+                "region_hysteresis": 30}
+    recorder = SessionRecorder(path, *SCREEN, settings)
+    for result in results:
+        recorder.record(result, regions)
+    recorder.close()
+
+    records, meta = load_recording(path)
+    assert len(records) == meta["frames"] == len(results)
+    assert meta["layouts"][0]["from_frame"] == 0
+    live = [(r.timestamp, r.selection) for r in results if r.selection]
+    assert len(live) >= 3
+    assert recorded_selections(records, meta) == live
+
+    replayed = replay(records, meta, lock_time=1.0, smoothing="moving_average",
+                      smoothing_params={"window": 10})
+    assert [name for _, name in replayed["selections"]] == [name for _, name in live]
+    assert np.allclose([t for t, _ in replayed["selections"]], [t for t, _ in live])
+
+
+def test_recorder_refuses_an_existing_file(tmp_path):
+    path = str(tmp_path / "session.gaze")
+    SessionRecorder(path, *SCREEN).close()
+    with pytest.raises(FileExistsError):
+        SessionRecorder(path, *SCREEN)
+    records, meta = load_recording(path)  # the first session is left alone
+    assert len(records) == meta["frames"] == 0
+
+
+def test_new_recording_path_never_reuses_a_path(tmp_path):
+    paths = []
+    for _ in range(3):
+        paths.append(new_recording_path("Jo Smith", directory=str(tmp_path)))
+        open(paths[-1], "wb").close()
+    assert len(set(paths)) == 3
+    assert all(os.path.basename(path).startswith("Jo_Smith-") for path in paths)
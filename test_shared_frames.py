@@ -0,0 +1,34 @@
+import numpy as np
+
+from shared_frames import SharedFrameRing
+
+
+def test_reader_gets_the_newest_frame_and_detects_overwrites():
+    ring = SharedFrameRing.create((4, 4), slots=3)
+    try:
+        for value in range(5):
+            ring.write(np.full((4, 4), value, np.uint8), float(value))
+        sequence, frame, timestamp = ring.read_latest()
+        assert sequence == 5 and frame[0, 0] == 4 and timestamp == 4.0
+        assert ring.read(1) is None  # lapped by the writer
+        assert ring.read_latest(after=5) is None
+    finally:
+        ring.close()
+
+
+def test_restarted_writer_continues_the_numbering():
+    ring = SharedFrameRing.create((4, 4))
+    try:
+        writer = SharedFrameRing.attach(ring.spec)
+        for _ in range(100):
+            writer.write(np.zeros((4, 4), np.uint8), 0.0)
+        writer.close()
+        seen = ring.read_latest()[0]
+
+        writer = SharedFrameRing.attach(ring.spec)
+        writer.write(np.ones((4, 4), np.uint8), 1.0)
+        writer.close()
+        sequence, frame, _ = ring.read_latest(after=seen)
+        assert sequence == seen + 1 and frame[0, 0] == 1
+    finally:
+        ring.close()
@@ -0,0 +1,72 @@
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+import ward
+from ward import BedStatus, WardSupervisor
+
+
+class ExitedProcess:
+    exitcode = 1
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ward, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    supervisor = WardSupervisor([{"name": "Bed 1"}], preview_size=(8, 8))
+    supervisor.results = queue.Queue()
+
+    def start_worker(index):
+        supervisor.processes[index] = ExitedProcess()
+        supervisor.started_at[index] = clock[0]
+        supervisor.exited_at[index] = None
+        supervisor.worker_message[index] = None
+
+    supervisor.start_worker = start_worker
+    supervisor.clock = clock
+    yield supervisor
+    supervisor.stop()
+
+
+def test_restart_message_keeps_the_worker_message(supervisor):
+    supervisor.start_worker(0)
+    supervisor.results.put(BedStatus(0, 0.0, message="Could not open camera 0"))
+    supervisor.results.put(BedStatus(0, 0.0, message="Worker failed: no camera"))
+    supervisor.clock[0] += 1.0
+    supervisor.poll()
+    assert supervisor.latest[0].message.startswith("Worker failed: no camera | Worker exited (1)")
+
+
+def test_fast_failures_back_off_then_give_up(supervisor):
+    supervisor.start_worker(0)
+    delays = []
+    while supervisor.processes[0] is not None:
+        supervisor.clock[0] += 1.0
+        supervisor.poll()  # notices the exit
+        exited = supervisor.clock[0]
+        while supervisor.processes[0] is not None and supervisor.exited_at[0] is not None:
+            supervisor.clock[0] += 1.0
+            supervisor.poll()
+        if supervisor.processes[0] is not None:
+            delays.append(supervisor.clock[0] - exited)
+
+    assert delays == [5.0, 10.0, 20.0, 40.0]
+    assert supervisor.restarts[0] == ward.MAX_FAST_FAILURES - 1
+    assert "not restarting" in supervisor.latest[0].message
+
+
+def test_slow_failure_restarts_after_the_base_delay(supervisor):
+    supervisor.fast_failures[0] = 3
+    supervisor.start_worker(0)
+    supervisor.clock[0] += ward.FAST_FAILURE + 1
+    supervisor.poll()
+    assert supervisor.fast_failures[0] == 0
+    assert supervisor.restart_delay(0) == ward.RESTART_DELAY
@@ -0,0 +1,24 @@
+from widgets import WidgetUpdater
+
+
+class FakeWidget:
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def __str__(self):
+        return self.name
+
+    def configure(self, **options):
+        self.calls.append(options)
+
+
+def test_only_changed_options_are_sent():
+    set_widget = WidgetUpdater()
+    label, bar = FakeWidget(".label"), FakeWidget(".bar")
+    set_widget(label, text="FPS: 30.0", foreground="green")
+    set_widget(label, text="FPS: 30.0", foreground="green")
+    set_widget(label, text="FPS: 29.5", foreground="green")
+    set_widget(bar, value=0)
+    assert label.calls == [{"text": "FPS: 30.0", "foreground": "green"}, {"text": "FPS: 29.5"}]
+    assert bar.calls == [{"value": 0}]
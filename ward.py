@@ -0,0 +1,424 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from dispatch import SINKS_CONFIG, EventDispatcher, SelectionEvent, load_sinks
+from shared_frames import SharedFrameRing
+from startup import StartupTimer
+from widgets import WidgetUpdater
+
+
+RESTART_DELAY = 5.0  # seconds before a crashed bed worker is started again
+FAST_FAILURE = 60.0  # a worker exiting sooner than this after its start failed fast
+MAX_FAST_FAILURES = 5  # consecutive fast failures before a bed is given up on
+
+
+@dataclass
+class BedStatus:
+    """The small per-frame summary a bed worker sends to the dashboard"""
+    bed: int
+    timestamp: float
+    face: bool = False
+    eyes_open: bool = None
+    gaze: tuple = None
+    region: str = None
+    lock_progress: float = 0.0
+    selection: str = None
+    fps: float = None
+    latency_ms: float = None
+    power_mode: str = None
+    idle_share: float = 0.0       # fraction of the time the worker has spent idling
+    message: str = None  # startup progress or an error
+
+    @classmethod
+    def from_result(cls, bed, result):
+        return cls(bed, result.timestamp, result.face_detected, result.eyes_open, result.gaze,
+                   result.region, result.lock_progress, result.selection, latency_ms=result.latency_ms)
+
+
+def load_ward_config(path):
+    """Beds from a ward JSON file: {"beds": [{"name", "camera": {...}, "patient", ...}]}"""
+    with open(path) as f:
+        config = json.load(f)
+    return config["beds"]
+
+
+def assign_cores(count):
+    """A CPU core per bed, keeping the first core for the dashboard when there are spares"""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * count  # no affinity control on this platform
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) > count:
+        cores = cores[1:]
+    return [cores[i % len(cores)] for i in range(count)]
+
+
+def letterbox_into(frame, view, scratch=None):
+    """Scale frame to fit inside view, centred on black, returning the scratch buffer used"""
+    import cv2
+
+    height, width = frame.shape[:2]
+    view_height, view_width = view.shape[:2]
+    scale = min(view_width / width, view_height / height)
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    if scratch is None or scratch.shape[1::-1] != size:
+        scratch = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    else:
+        cv2.resize(frame, size, dst=scratch, interpolation=cv2.INTER_AREA)
+    x0, y0 = (view_width - size[0]) // 2, (view_height - size[1]) // 2
+    view[:] = 0
+    view[y0:y0 + size[1], x0:x0 + size[0]] = scratch
+    return scratch
+
+
+def bed_worker(index, bed, core, preview_spec, results, stop):
+    """Worker process: run the full tracking pipeline for one bed's camera"""
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+
+    import cv2
+    from calibration import load_profile
+    from capture import CaptureSettings, CaptureThread, LatestFrameQueue, open_capture
+    from dwell import default_regions
+    from gaze_pipeline import PREDICTOR_PATH, GazePipeline
+    from power import PowerScheduler
+
+    # One thread per process, the ward scales by processes instead
+    cv2.setNumThreads(1)
+
+    def report(message):
+        results.put(BedStatus(index, time.time(), message=message))
+
+    preview = SharedFrameRing.attach(preview_spec)
+    capture = capture_thread = None
+    try:
+        screen_width, screen_height = bed.get("screen", (1920, 1080))
+        pipeline = GazePipeline(screen_width, screen_height, predictor_path=bed.get("predictor", PREDICTOR_PATH),
+                                detector=bed.get("detector", "hog"))
+        pipeline.debug_level = "off"
+        pipeline.lock_time = bed.get("lock_time", pipeline.lock_time)
+        pipeline.ear_threshold = bed.get("ear_threshold", pipeline.ear_threshold)
+        pipeline.pupil_method = bed.get("pupil_method", pipeline.pupil_method)
+        pipeline.motion_gating = bed.get("motion_gating", pipeline.motion_gating)
+        pipeline.landmark_flow = bed.get("landmark_flow", pipeline.landmark_flow)
+        pipeline.region_hysteresis = bed.get("region_hysteresis", pipeline.region_hysteresis)
+        pipeline.regions = {name: tuple(box) for name, box in bed.get("regions", {}).items()} \
+            or default_regions(screen_width, screen_height)
+        if bed.get("patient"):
+            pipeline.calibration = load_profile(bed["patient"])
+        report("Loading models...")
+        pipeline.load_models()
+        pipeline.reset()
+        power = PowerScheduler(idle_after=bed.get("idle_after", 30.0))
+        power.enabled = bool(power.idle_after)
+
+        settings = CaptureSettings(**bed.get("camera", {}))
+        capture = open_capture(settings)
+        if not capture.isOpened():
+            report(f"Could not open camera {settings.device}")
+            return
+        frames = LatestFrameQueue()
+        capture_thread = CaptureThread(capture, frames, newest_only=settings.newest_only)
+        capture_thread.start()
+        report(f"Tracking on {settings.describe(capture)}")
+
+        preview_interval = 1.0 / bed.get("preview_fps", 5)
+        last_preview = 0.0
+        scratch = None
+        while not stop.is_set():
+            item = frames.get(timeout=0.5)
+            if item is None:
+                if frames.closed:
+                    report("Error reading from camera!")
+                    break
+                continue
+
+            frame, captured_at = item
+            result = pipeline.process(frame, captured_at)
+            result.latency_ms = (time.time() - captured_at) * 1000
+            status = BedStatus.from_result(index, result)
+            status.fps = pipeline.fps
+            status.power_mode = power.update(result, pipeline, capture_thread)
+            status.idle_share = power.shares()["idle"]
+
+            # Ordinary updates are dropped if the dashboard falls behind, selections never
+            if status.selection:
+                results.put(status)
+            else:
+                try:
+                    results.put_nowait(status)
+                except queue.Full:
+                    pass
+
+            if result.timestamp - last_preview >= preview_interval:
+                last_preview = result.timestamp
+                slot, view = preview.begin_write()
+                scratch = letterbox_into(result.frame, view, scratch)
+                preview.commit(slot, result.timestamp)
+    except Exception as e:
+        report(f"Worker failed: {e}")
+        raise
+    finally:
+        if capture_thread:
+            capture_thread.stop()
+            capture_thread.join(timeout=1.0)
+        if capture:
+            capture.release()
+        preview.close()
+
+
+class WardSupervisor:
+    """Runs one bed_worker process per bed and collects their statuses
+
+    Workers are spawned (not forked) so each gets a clean dlib/OpenCV state,
+    are pinned to their own core, and are restarted RESTART_DELAY seconds
+    after exiting unexpectedly. The delay doubles with every consecutive
+    fast failure, and after MAX_FAST_FAILURES the bed is left stopped.
+    Selections are also published to `dispatcher`.
+    """
+
+    def __init__(self, beds, preview_size=(320, 240), queue_size=256, dispatcher=None):
+        self.beds = beds
+        self.dispatcher = dispatcher or EventDispatcher()
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue(queue_size)
+        self.stop_event = self.context.Event()
+        self.cores = assign_cores(len(beds))
+        preview_shape = (preview_size[1], preview_size[0], 3)
+        self.previews = [SharedFrameRing.create(preview_shape, slots=2) for _ in beds]
+        self.processes = [None] * len(beds)
+        self.started_at = [None] * len(beds)
+        self.exited_at = [None] * len(beds)
+        self.restarts = [0] * len(beds)
+        self.fast_failures = [0] * len(beds)
+        self.worker_message = [None] * len(beds)  # the last message of the current worker
+        self.latest = [BedStatus(i, 0.0, message="Starting...") for i in range(len(beds))]
+
+    def start_worker(self, index):
+        process = self.context.Process(
+            target=bed_worker, name=f"bed-{index}", daemon=True,
+            args=(index, self.beds[index], self.cores[index], self.previews[index].spec,
+                  self.results, self.stop_event))
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        self.exited_at[index] = None
+        self.worker_message[index] = None
+
+    def restart_delay(self, index):
+        return RESTART_DELAY * 2 ** max(0, self.fast_failures[index] - 1)
+
+    def start(self):
+        for index in range(len(self.beds)):
+            self.start_worker(index)
+
+    def poll(self):
+        """Drain worker statuses, returning the selections among them; restarts dead workers"""
+        selections = []
+        while True:
+            try:
+                status = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if status.message is not None:
+                self.latest[status.bed].message = status.message
+                self.worker_message[status.bed] = status.message
+            else:
+                status.message = self.latest[status.bed].message
+                self.latest[status.bed] = status
+            if status.selection:
+                selections.append(status)
+                bed = self.beds[status.bed]
+                self.dispatcher.publish(SelectionEvent(status.selection, status.timestamp,
+                                                       bed.get("name", f"Bed {status.bed + 1}"),
+                                                       bed.get("patient", "")))
+
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process is None or process.is_alive() or self.stop_event.is_set():
+                continue
+            if self.exited_at[index] is None:
+                self.exited_at[index] = now
+                if now - self.started_at[index] < FAST_FAILURE:
+                    self.fast_failures[index] += 1
+                else:
+                    self.fast_failures[index] = 0
+
+                # Keep what the worker said last, it usually names the cause
+                message = f"Worker exited ({process.exitcode})"
+                if self.worker_message[index]:
+                    message = f"{self.worker_message[index]} | {message}"
+                if self.fast_failures[index] >= MAX_FAST_FAILURES:
+                    message += f", failed {self.fast_failures[index]} times in a row, not restarting"
+                    self.processes[index] = None
+                else:
+                    message += f", restarting in {self.restart_delay(index):.0f}s..."
+                self.latest[index] = BedStatus(index, 0.0, message=message)
+            elif now - self.exited_at[index] >= self.restart_delay(index):
+                self.restarts[index] += 1
+                self.start_worker(index)
+        return selections
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=3.0)
+                if process.is_alive():
+                    process.terminate()
+        for preview in self.previews:
+            preview.close()
+        self.dispatcher.close()
+
+
+class WardDashboard:
+    """Tk window with a tile per bed: preview, tracking state and selections"""
+
+    def __init__(self, root, supervisor):
+        import tkinter as tk
+        from tkinter import ttk
+
+        self.root = root
+        self.supervisor = supervisor
+        self.root.title("Ward Dashboard")
+        self.poll_interval_ms = 30
+        self.tiles = []
+        self.set_widget = WidgetUpdater()
+
+        columns = math.ceil(math.sqrt(len(supervisor.beds)))
+        for index, bed in enumerate(supervisor.beds):
+            frame = ttk.LabelFrame(root, text=bed.get("name", f"Bed {index + 1}"))
+            frame.grid(row=index // columns, column=index % columns, sticky='nsew', padx=5, pady=5)
+            tile = {
+                "preview": ttk.Label(frame),
+                "state": ttk.Label(frame, text="Starting...", font=('Arial', 11)),
+                "region": ttk.Label(frame, text="None", font=('Arial', 14, 'bold')),
+                "progress": ttk.Progressbar(frame, orient=tk.HORIZONTAL, mode='determinate'),
+                "last": ttk.Label(frame, text="No selections", foreground="green"),
+                "photo": None,
+                "rgb": None,
+                "sequence": 0,
+            }
+            for key in ("preview", "state", "region", "progress", "last"):
+                tile[key].pack(fill=tk.X, padx=5, pady=2)
+            self.tiles.append(tile)
+        for column in range(columns):
+            root.columnconfigure(column, weight=1)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(self.poll_interval_ms, self.poll)
+
+    def poll(self):
+        for status in self.supervisor.poll():
+            tile = self.tiles[status.bed]
+            self.set_widget(tile["last"], text=f"Selected {status.selection} at {time.strftime('%H:%M:%S')}")
+            self.root.bell()
+
+        for tile, status, preview in zip(self.tiles, self.supervisor.latest, self.supervisor.previews):
+            if status.timestamp:
+                state = "Face" if status.face else "No face"
+                if status.eyes_open is False:
+                    state += ", eyes closed"
+                if status.fps:
+                    state += f" | {status.fps:.0f} fps, {status.latency_ms:.0f} ms"
+                if status.power_mode == "idle":
+                    state += " | idle"
+                self.set_widget(tile["state"], text=state)
+                self.set_widget(tile["region"], text=status.region or "None")
+                self.set_widget(tile["progress"], value=int(status.lock_progress))
+            elif status.message:
+                self.set_widget(tile["state"], text=status.message)
+            self.show_preview(tile, preview)
+
+        self.root.after(self.poll_interval_ms, self.poll)
+
+    def show_preview(self, tile, preview):
+        """Paste the newest preview frame of a bed into its tile, if there is a new one"""
+        import cv2
+        from PIL import Image, ImageTk
+
+        latest = preview.read_latest(after=tile["sequence"])
+        if latest is None:
+            return
+        tile["sequence"], frame, _ = latest
+        if tile["rgb"] is None:
+            tile["rgb"] = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=tile["rgb"])
+        img = Image.fromarray(tile["rgb"])
+        if tile["photo"] is None:
+            tile["photo"] = ImageTk.PhotoImage(image=img)
+            tile["preview"].configure(image=tile["photo"])
+        else:
+            tile["photo"].paste(img)
+
+    def close(self):
+        self.supervisor.stop()
+        self.root.destroy()
+
+
+def run_headless(supervisor, duration=None):
+    """Log selections and a periodic per-bed summary instead of showing a dashboard"""
+    start = time.monotonic()
+    last_summary = start
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            for status in supervisor.poll():
+                bed = supervisor.beds[status.bed]
+                print(f"{time.strftime('%H:%M:%S')} {bed.get('name', status.bed)}: selected {status.selection}")
+            now = time.monotonic()
+            if now - last_summary >= 5.0:
+                last_summary = now
+                for bed, status in zip(supervisor.beds, supervisor.latest):
+                    fps = f"{status.fps:.1f} fps" if status.fps else "-"
+                    print(f"  {bed.get('name')}: {fps}, face {status.face}, {status.power_mode or '-'} "
+                          f"(idle {status.idle_share:.0%}), {status.message or ''}")
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+def main():
+    """Track several beds from one PC, one worker process per camera"""
+    parser = argparse.ArgumentParser(description="Multi-camera ward mode")
+    parser.add_argument("--config", help="ward JSON file listing the beds")
+    parser.add_argument("--camera", action="append", default=[],
+                        help="camera index or device path for a bed (repeat for more beds)")
+    parser.add_argument("--preview-size", default="320x240", help="dashboard tile preview size WxH")
+    parser.add_argument("--headless", action="store_true", help="log to the console instead of a dashboard")
+    parser.add_argument("--duration", type=float, help="headless only: stop after this many seconds")
+    parser.add_argument("--sinks", default=SINKS_CONFIG, help="JSON file listing where selections are sent")
+    args = parser.parse_args()
+
+    startup = StartupTimer()
+    if args.config:
+        beds = load_ward_config(args.config)
+    else:
+        beds = [{"name": f"Bed {i + 1}", "camera": {"device": device}}
+                for i, device in enumerate(args.camera or ["0"])]
+
+    preview_size = tuple(int(v) for v in args.preview_size.lower().split("x"))
+    supervisor = WardSupervisor(beds, preview_size, dispatcher=EventDispatcher(load_sinks(args.sinks)))
+    supervisor.start()
+    print(f"Started {len(beds)} bed workers on cores {supervisor.cores} ({startup.mark('workers'):.2f}s)")
+
+    if args.headless:
+        run_headless(supervisor, args.duration)
+        return
+
+    import tkinter as tk
+    root = tk.Tk()
+    WardDashboard(root, supervisor)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
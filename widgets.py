@@ -0,0 +1,17 @@
+class WidgetUpdater:
+    """Configures Tk widgets, sending only the options whose value changed
+
+    Call it like widget.configure. Tk redraws a widget on every configure
+    even when nothing changed, which adds up when labels are refreshed on
+    every frame.
+    """
+
+    def __init__(self):
+        self.applied = {}  # widget path -> options last sent
+
+    def __call__(self, widget, **options):
+        applied = self.applied.setdefault(str(widget), {})
+        changed = {key: value for key, value in options.items() if applied.get(key) != value}
+        if changed:
+            widget.configure(**changed)
+            applied.update(changed)